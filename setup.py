@@ -89,6 +89,8 @@ setup(
             'extras_calmjs.json = calmjs.dist:write_extras_calmjs',
             ('calmjs_module_registry.txt = '
                 'calmjs.dist:write_module_registry_names'),
+            ('calmjs_module_index.json = '
+                'calmjs.dist:write_module_index'),
         ],
         'calmjs.extras_keys': [
             'node_modules = enabled',
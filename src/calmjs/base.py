@@ -8,6 +8,7 @@ framework will inherit/extend from.
 
 from __future__ import absolute_import
 import os
+import sys
 
 import errno
 import json
@@ -22,21 +23,38 @@ from os.path import sep
 from collections import OrderedDict
 from collections import MutableMapping
 from logging import getLogger
+from types import ModuleType
 from pkg_resources import Distribution
 from pkg_resources import working_set
 from pkg_resources import safe_name
 
+from calmjs.epindex import iter_entry_points
+from calmjs.indexer import DEFAULT_PRUNE_RULES
+from calmjs.indexer import resource_filename_mod_entry_point
+from calmjs.snapshot import dir_stamps
+from calmjs.snapshot import entry_point_key
+from calmjs.snapshot import registry_snapshot
 from calmjs.utils import which
 from calmjs.utils import finalize_env
 from calmjs.utils import fork_exec
 from calmjs.utils import raise_os_error
 
+# if this environment variable is set to a true value (such as '1'),
+# the package reference registries constructed without an explicit
+# lazy argument will defer the registration of their entry points.
+CALMJS_LAZY_REGISTRY = 'CALMJS_LAZY_REGISTRY'
 NODE_PATH = 'NODE_PATH'
 NODE_MODULES = 'node_modules'
 # the usual path to binary within node modules.
 NODE_MODULES_BIN = '.bin'
 NODE = 'node'
 
+try:  # pragma: no cover
+    from importlib.util import find_spec
+except ImportError:  # pragma: no cover
+    # not available for Python 2.
+    find_spec = None
+
 logger = getLogger(__name__)
 _marker = object()
 
@@ -45,6 +63,82 @@ def _import_module(module_name):
     return __import__(module_name, fromlist=['__name__'], level=0)
 
 
+def _meta_path_find_spec(name, path):
+    for finder in sys.meta_path:
+        finder_find_spec = getattr(finder, 'find_spec', None)
+        if finder_find_spec is None:
+            continue
+        spec = finder_find_spec(name, path)
+        if spec is not None:
+            return spec
+    return None
+
+
+def _find_spec(module_name):
+    """
+    Find the spec for module_name through the finders in sys.meta_path,
+    resolving each of the parent packages in turn such that neither the
+    module nor any of its parent packages are executed.  Returns None if
+    the module cannot be found.
+    """
+
+    fragments = module_name.split('.')
+    path = None
+    spec = None
+    for idx in range(1, len(fragments) + 1):
+        name = '.'.join(fragments[:idx])
+        module = sys.modules.get(name)
+        if module is not None:
+            spec = getattr(module, '__spec__', None)
+            path = getattr(module, '__path__', None)
+        else:
+            spec = _meta_path_find_spec(name, path)
+            if spec is None:
+                return None
+            path = spec.submodule_search_locations
+        if path is None and idx < len(fragments):
+            # parent is not a package.
+            return None
+    return spec
+
+
+def _locate_module(module_name, entry_point=None):
+    """
+    Return the module for module_name if it was already imported, or
+    a stand-in module constructed from its spec such that the module is
+    not executed.  For namespace packages, the path will be located
+    through the distribution of the entry_point where available.  Falls
+    back to importing the module where specs are unavailable.
+
+    Will raise ImportError if the module cannot be found.
+    """
+
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    if find_spec is None:
+        return _import_module(module_name)
+
+    spec = _find_spec(module_name)
+    if spec is None:
+        raise ImportError("No module named '%s'" % module_name)
+
+    module = ModuleType(module_name)
+    module.__spec__ = spec
+    if spec.has_location:
+        module.__file__ = spec.origin
+    if spec.submodule_search_locations is not None:
+        module.__path__ = list(spec.submodule_search_locations)
+        if not spec.has_location and getattr(
+                entry_point, 'dist', None) is not None:
+            # a namespace package, where the path spans all of its
+            # portions, so only use the one for the distribution.
+            path = resource_filename_mod_entry_point(
+                module_name, entry_point, module)
+            if path:
+                module.__path__ = [path]
+    return module
+
+
 def _check_isdir_assign_key(d, key, value, error_msg=None):
     if isdir(value):
         d[key] = value
@@ -136,7 +230,7 @@ class BaseRegistry(object):
         self.registry_name = registry_name
         _working_set = kw.pop('_working_set', working_set)
         self.raw_entry_points = [] if _working_set is None else list(
-            _working_set.iter_entry_points(self.registry_name))
+            iter_entry_points(_working_set, self.registry_name))
         self._init(*a, **kw)
 
     def _init(self, *a, **kw):
@@ -198,10 +292,104 @@ class BasePkgRefRegistry(BaseRegistry):
     packages.
     """
 
+    # if true, the registration of the entry points will be deferred
+    # until the records for their packages are requested, instead of
+    # having all of them registered during construction.  May also be
+    # enabled for an instance through the lazy argument, or for all
+    # instances through the CALMJS_LAZY_REGISTRY environment variable.
+    lazy = False
+
     def __init__(self, registry_name, *a, **kw):
+        lazy = kw.pop('lazy', None)
+        if lazy is None and os.environ.get(CALMJS_LAZY_REGISTRY, '') not in (
+                '', '0'):
+            lazy = True
+        if lazy is not None:
+            self.lazy = lazy
         super(BasePkgRefRegistry, self).__init__(registry_name, *a, **kw)
         self.package_module_map = PackageKeyMapping()
-        self.register_entry_points(self.raw_entry_points)
+        self.pending_entry_points = []
+        # all the entry points that were deferred, including the ones
+        # that have since been registered.
+        self.deferred_entry_points = []
+        if self.lazy:
+            self.defer_entry_points(self.raw_entry_points)
+        else:
+            self.register_entry_points(self.raw_entry_points)
+
+    def defer_entry_points(self, entry_points):
+        """
+        Track the entry_points for registration when the records for
+        their packages are requested.  Entry points without an
+        associated distribution are registered immediately.
+        """
+
+        deferred = [
+            entry_point for entry_point in entry_points
+            if entry_point.dist is not None
+        ]
+        self.pending_entry_points.extend(deferred)
+        self.deferred_entry_points.extend(deferred)
+        self.register_entry_points([
+            entry_point for entry_point in entry_points
+            if entry_point.dist is None
+        ])
+
+    def _register_pending(self, condition):
+        entry_points = []
+        remaining = []
+        for entry_point in self.pending_entry_points:
+            (entry_points if condition(entry_point) else remaining).append(
+                entry_point)
+        if not entry_points:
+            return
+        self.pending_entry_points = remaining
+        self.register_entry_points(entry_points)
+
+    def register_package(self, package_name):
+        """
+        Register the pending entry points provided by the package.
+        """
+
+        if not self.pending_entry_points:
+            return
+        name = safe_name(package_name)
+        self._register_pending(
+            lambda entry_point: entry_point.dist.project_name == name)
+
+    def _references_module_name(self, name):
+        # the condition for the entry points that reference the module
+        # name, or a parent module of it; names using the '/' separator
+        # (such as the ones produced by the es6 mappers) are translated
+        # back to the python module name.
+        names = set([name, name.replace('/', '.')])
+
+        def condition(entry_point):
+            return any(
+                n == entry_point.module_name or
+                n.startswith(entry_point.module_name + '.')
+                for n in names
+            )
+        return condition
+
+    def register_module_name(self, name):
+        """
+        Register the pending entry points that reference the module
+        name, or a parent module of it.  Names separated by '/' will
+        be matched as their equivalent python module names.
+        """
+
+        if not self.pending_entry_points:
+            return
+        self._register_pending(self._references_module_name(name))
+
+    def register_pending(self):
+        """
+        Register all the pending entry points.
+        """
+
+        if self.pending_entry_points:
+            self._register_pending(lambda entry_point: True)
 
     def register_entry_points(self, entry_points):
         """
@@ -263,9 +451,23 @@ class BasePkgRefRegistry(BaseRegistry):
         Iterates through the records.
         """
 
+        self.register_pending()
         for item in self.records.items():
             yield item
 
+    def _register_for_record(self, name):
+        # ensure the record for name is available, registering all the
+        # pending entry points only if none of the deferred entry points
+        # reference the name.
+        if name in self.records or not self.pending_entry_points:
+            return
+        if any(map(
+                self._references_module_name(name),
+                self.deferred_entry_points)):
+            self.register_module_name(name)
+        else:
+            self.register_pending()
+
 
 class BaseModuleRegistry(BasePkgRefRegistry):
     """
@@ -274,6 +476,29 @@ class BaseModuleRegistry(BasePkgRefRegistry):
     of the target.
     """
 
+    # the calmjs.indexer.PruneRules for the directories of the modules
+    # that the recursive globbers will not descend into; set to True to
+    # opt into calmjs.indexer.DEFAULT_PRUNE_RULES.
+    prune = None
+
+    # if false, the modules referenced by the entry points will be
+    # located through their specs instead of being imported, such that
+    # they are not executed during registration.
+    import_modules = True
+
+    def __init__(self, registry_name, *a, **kw):
+        if self.prune is True:
+            self.prune = DEFAULT_PRUNE_RULES
+        super(BaseModuleRegistry, self).__init__(registry_name, *a, **kw)
+
+    def register_entry_points(self, entry_points):
+        result = super(BaseModuleRegistry, self).register_entry_points(
+            entry_points)
+        snapshot = getattr(self, '_snapshot', None)
+        if snapshot is not None:
+            snapshot.save()
+        return result
+
     def register_entry_point(self, entry_point):
         """
         Register a lone entry_point
@@ -282,16 +507,69 @@ class BaseModuleRegistry(BasePkgRefRegistry):
         import.
         """
 
-        module = _import_module(entry_point.module_name)
+        module = self.load_module(entry_point.module_name, entry_point)
         self._register_entry_point_module(entry_point, module)
 
+    def load_module(self, module_name, entry_point=None):
+        """
+        Return the module for the module_name, which is imported unless
+        import_modules is false, where a stand-in module that provides
+        the name and the paths of the module will be returned instead.
+
+        Will raise ImportError if the module cannot be found.
+        """
+
+        if self.import_modules:
+            return _import_module(module_name)
+        return _locate_module(module_name, entry_point)
+
+    def snapshot_paths(self, entry_point, module):
+        """
+        Return the list of directories that the records produced by
+        _map_entry_point_module for the module are derived from, such
+        that the records may be persisted in a snapshot and reused
+        until those directories are modified.  The default empty list
+        disables the snapshot.
+        """
+
+        return []
+
+    def _snapshot_entry_point_module(self, entry_point, module):
+        if not hasattr(self, '_snapshot'):
+            self._snapshot = registry_snapshot(self)
+        if self._snapshot is None:
+            return self._map_entry_point_module(entry_point, module)
+
+        key = entry_point_key(entry_point, module.__name__, self.prune)
+        records_map = self._snapshot.get(key)
+        if records_map is not None:
+            logger.debug(
+                "using snapshot records for entry_point '%s' in "
+                "registry '%s'", entry_point, self.registry_name,
+            )
+            return OrderedDict(
+                (name, dict(records)) for name, records in records_map.items()
+            )
+
+        paths = self.snapshot_paths(entry_point, module)
+        if not paths:
+            return self._map_entry_point_module(entry_point, module)
+        # the stamps are taken before the mapping such that changes made
+        # during the mapping will invalidate the snapshot.
+        stamps = dir_stamps(paths, self.prune)
+        records_map = self._map_entry_point_module(entry_point, module)
+        self._snapshot.set(key, OrderedDict(
+            (name, dict(records)) for name, records in records_map.items()
+        ), stamps)
+        return records_map
+
     def _register_entry_point_module(self, entry_point, module):
         """
         Private method that registers an entry_point with a provided
         module.
         """
 
-        records_map = self._map_entry_point_module(entry_point, module)
+        records_map = self._snapshot_entry_point_module(entry_point, module)
         self.store_records_for_package(entry_point, list(records_map.keys()))
 
         for module_name, records in records_map.items():
@@ -326,8 +604,16 @@ class BaseModuleRegistry(BasePkgRefRegistry):
     def get_record(self, name):
         """
         Get a record by name
+
+        For lazy registries, the pending entry points that reference the
+        module name (or a parent of it, with '/' separated names matched
+        as the equivalent python module name) are registered; if none of
+        the deferred entry points reference the name, all the
+        pending entry points will be registered as the record may be
+        provided by any of them.
         """
 
+        self._register_for_record(name)
         result = {}
         result.update(self.records.get(name, {}))
         return result
@@ -337,6 +623,7 @@ class BaseModuleRegistry(BasePkgRefRegistry):
         Get all records identified by package.
         """
 
+        self.register_package(package_name)
         names = self.package_module_map.get(package_name, [])
         result = {}
         for name in names:
@@ -443,6 +730,7 @@ class BaseExternalModuleRegistry(BasePkgRefRegistry):
         matching desired "module names" for the given path.
         """
 
+        self._register_for_record(name)
         return set().union(self.records.get(name, set()))
 
     def get_records_for_package(self, package_name):
@@ -450,6 +738,7 @@ class BaseExternalModuleRegistry(BasePkgRefRegistry):
         Get all records identified by package.
         """
 
+        self.register_package(package_name)
         result = []
         result.extend(self.package_module_map.get(package_name))
         return result
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Filesystem backends for the build directory of a toolchain.
+
+The toolchain will route the reading and writing of intermediate files
+within the build directory through the backend assigned to the spec,
+such that the backends provided here may hold those files in memory
+until they are required to be present on disk, such as for the external
+binary that links the final artifact.  Note that this only reduces the
+amount written to disk for the files that are never flushed, which the
+toolchain controls through its build_fs_flush_paths method.
+"""
+
+from __future__ import absolute_import
+
+import codecs
+import logging
+from io import StringIO
+from os.path import abspath
+from os.path import dirname
+from os.path import join
+from os.path import normpath
+from threading import Lock
+
+from calmjs.utils import ensure_dir
+from calmjs.utils import unlink_shared
+
+logger = logging.getLogger(__name__)
+
+
+def disk_open(path, mode='r'):
+    if 'w' in mode:
+        # the file may be a source materialized into the build directory
+        # through a link, where the original file must not be modified.
+        unlink_shared(path)
+    return codecs.open(path, mode, encoding='utf-8')
+
+
+class BuildFS(object):
+    """
+    The default backend, where all files are read from and written to
+    disk directly.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def resolve(self, path):
+        """
+        Return the normalized absolute path for path, which may be
+        relative to the root of this filesystem.
+        """
+
+        return normpath(join(abspath(self.root), path))
+
+    def open(self, path, mode='r'):
+        return disk_open(path, mode)
+
+    def flush(self, paths=None):
+        """
+        Ensure that the files at paths (or all files, if unspecified)
+        are written to disk.  Returns the list of paths written.
+        """
+
+        return []
+
+
+class _MemoryReader(StringIO):
+
+    def __init__(self, text, path):
+        super(_MemoryReader, self).__init__(text)
+        # as the name may be used for the generation of source maps.
+        self.name = path
+
+
+class _MemoryWriter(object):
+
+    def __init__(self, fs, path):
+        self.fs = fs
+        self.name = path
+        self.chunks = []
+        self.closed = False
+
+    def write(self, s):
+        self.chunks.append(s)
+
+    def writelines(self, lines):
+        self.chunks.extend(lines)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.fs._commit(self.name, u''.join(self.chunks))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MemoryBuildFS(BuildFS):
+    """
+    A backend that holds the text files written inside its root in
+    memory.  Once the total size of the files held reaches spill_limit
+    (in bytes, if specified), further files will be written directly to
+    disk.  Files outside of the root are always accessed from disk, as
+    are files inside the root not held by this backend.
+    """
+
+    def __init__(self, root, spill_limit=None):
+        super(MemoryBuildFS, self).__init__(root)
+        self.spill_limit = spill_limit
+        self.files = {}
+        self.size = 0
+        self._lock = Lock()
+
+    def _is_managed(self, path):
+        root = self.resolve('')
+        return path.startswith(join(root, ''))
+
+    def _commit(self, path, text):
+        size = len(text.encode('utf8'))
+        with self._lock:
+            previous = self.files.pop(path, None)
+            if previous is not None:
+                self.size -= previous[1]
+            if (self.spill_limit is None or
+                    self.size + size <= self.spill_limit):
+                self.files[path] = (text, size)
+                self.size += size
+                return
+        logger.debug("spilling '%s' to disk", path)
+        self._write(path, text)
+
+    def _write(self, path, text):
+        ensure_dir(dirname(path))
+        with disk_open(path, 'w') as fd:
+            fd.write(text)
+
+    def open(self, path, mode='r'):
+        # as with the disk backend, relative paths are based on the
+        # current working directory.
+        path = normpath(abspath(path))
+        if not self._is_managed(path):
+            return disk_open(path, mode)
+        if mode == 'w':
+            return _MemoryWriter(self, path)
+        if mode == 'r':
+            with self._lock:
+                record = self.files.get(path)
+            if record is not None:
+                return _MemoryReader(record[0], path)
+        else:
+            # other modes can only be served by the file on disk.
+            self.flush([path])
+        return disk_open(path, mode)
+
+    def flush(self, paths=None):
+        with self._lock:
+            if paths is None:
+                targets = sorted(self.files)
+            else:
+                targets = [
+                    p for p in (self.resolve(p) for p in paths)
+                    if p in self.files
+                ]
+            records = [(p, self.files.pop(p)) for p in targets]
+            for path, (text, size) in records:
+                self.size -= size
+        for path, (text, size) in records:
+            self._write(path, text)
+        return targets
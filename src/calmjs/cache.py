@@ -0,0 +1,602 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent caches for the calmjs framework.
+
+This module provides the caching facilities that may be used by the
+toolchain to avoid repeating work across separate runs, such as the
+regeneration of compiled outputs for sources that have not changed.
+"""
+
+from __future__ import absolute_import
+
+import codecs
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import time
+from collections import OrderedDict
+from functools import partial
+from os import listdir
+from os import remove
+from os import rename
+from os import stat
+from os import utime
+from os.path import abspath
+from os.path import dirname
+from os.path import exists
+from os.path import isdir
+from os.path import join
+from os.path import normpath
+from tempfile import NamedTemporaryFile
+from threading import Lock
+
+from calmjs.parse.io import read
+
+from calmjs.indexer import RACY_MTIME_WINDOW
+from calmjs.utils import ensure_dir
+
+logger = logging.getLogger(__name__)
+
+COMPILE_CACHE_MANIFEST = 'manifest.json'
+COMPILE_CACHE_OBJECTS = 'objects'
+COMPILE_CACHE_VERSION = 1
+# default upper limits for the number of records retained by the
+# CompileCache, and the total size of the copies of their outputs.
+COMPILE_CACHE_MAX_ENTRIES = 4096
+COMPILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# default upper limit for the total size of the source files of the
+# trees retained by the ASTCache.
+AST_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+BUILD_DIR_LOCK = '.lock'
+BUILD_DIR_NAME = 'build'
+# default number of managed build directories to retain.
+BUILD_DIR_RETENTION = 8
+# default number of seconds to wait for a locked build directory, and
+# the age for a lock to be considered stale if the owner of the lock
+# cannot be verified.
+BUILD_DIR_LOCK_TIMEOUT = 60
+BUILD_DIR_LOCK_STALE = 86400
+
+_chunk_size = 1 << 16
+
+
+def file_digest(path, algorithm='sha256'):
+    """
+    Return the hex digest of the contents of the file at path.
+    """
+
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(_chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def digest_values(*values):
+    """
+    Return a stable hex digest for the provided JSON serializable
+    values.
+    """
+
+    return hashlib.sha256(json.dumps(
+        values, sort_keys=True, separators=(',', ':')).encode('utf8')
+    ).hexdigest()
+
+
+def write_json_atomic(path, obj):
+    """
+    Write the obj as JSON to path, through a temporary file in the same
+    directory that replaces the target once fully written.
+    """
+
+    ensure_dir(dirname(path))
+    with NamedTemporaryFile(
+            mode='w', dir=dirname(path), suffix='.tmp', delete=False) as fd:
+        json.dump(obj, fd, sort_keys=True)
+    try:
+        rename(fd.name, path)
+    except OSError:
+        # rename will not replace existing files on win32.
+        if exists(path):
+            remove(path)
+        rename(fd.name, path)
+
+
+def _stat_record(path):
+    st = stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+class CompileCache(object):
+    """
+    A persistent cache of the outputs generated by the compile step of
+    a toolchain.
+
+    The records are stored in a manifest, keyed by a digest provided by
+    the caller that must be derived from every input that may affect the
+    output, such as the digest of the source file, the toolchain class,
+    the transpiler and the relevant spec values.  Each record tracks the
+    output files relative to the build directory, and optionally a copy
+    of each of the output files inside this cache directory such that
+    they may be restored into a new build directory.
+
+    The least recently used records (along with their copies) are
+    evicted when the manifest is saved, once there are more than
+    max_entries of them or once the total size of their copies exceeds
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_entries=None, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.manifest_path = join(cache_dir, COMPILE_CACHE_MANIFEST)
+        self.max_entries = (
+            COMPILE_CACHE_MAX_ENTRIES if max_entries is None else max_entries)
+        self.max_bytes = (
+            COMPILE_CACHE_MAX_BYTES if max_bytes is None else max_bytes)
+        self._lock = Lock()
+        self._entries = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self):
+        if not exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as fd:
+                manifest = json.load(fd)
+        except (IOError, OSError, ValueError) as e:
+            logger.warning(
+                "failed to load compile cache manifest '%s': %s; starting "
+                "with an empty cache", self.manifest_path, e
+            )
+            return {}
+        if manifest.get('version') != COMPILE_CACHE_VERSION:
+            logger.info(
+                "compile cache manifest '%s' is of an incompatible version; "
+                "starting with an empty cache", self.manifest_path
+            )
+            return {}
+        return manifest.get('entries', {})
+
+    def _blob_dir(self, key):
+        return join(self.cache_dir, COMPILE_CACHE_OBJECTS, key[:2], key)
+
+    def _blob_path(self, key, idx):
+        return join(self._blob_dir(key), idx)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def restore(self, key, build_dir):
+        """
+        Ensure that the outputs recorded under key are available in the
+        build directory, copying them from the cache if necessary.
+        Returns True if successful, otherwise False to signify that the
+        outputs must be generated again.
+        """
+
+        with self._lock:
+            record = self.entries.get(key)
+        if not record:
+            return self._count(False)
+
+        pending = []
+        for idx, (path, stat_record) in enumerate(sorted(
+                record['files'].items())):
+            target = join(build_dir, normpath(path))
+            if exists(target) and _stat_record(target) == stat_record:
+                continue
+            if not record.get('blobs'):
+                return self._count(False)
+            blob = self._blob_path(key, str(idx))
+            if not exists(blob):
+                return self._count(False)
+            pending.append((blob, target))
+
+        for blob, target in pending:
+            logger.debug("restoring '%s' from compile cache", target)
+            ensure_dir(dirname(target))
+            shutil.copy2(blob, target)
+        with self._lock:
+            # mark as the most recently used.
+            record['used'] = time.time()
+            self._dirty = True
+        return self._count(True)
+
+    def store(self, key, build_dir, paths, blobs=True):
+        """
+        Record the outputs at the provided paths, relative to the build
+        directory, under key.  If blobs is true, a copy of each output
+        will be kept inside the cache directory.
+        """
+
+        files = {}
+        for idx, path in enumerate(sorted(paths)):
+            target = join(build_dir, normpath(path))
+            if blobs:
+                blob = self._blob_path(key, str(idx))
+                ensure_dir(dirname(blob))
+                shutil.copy2(target, blob)
+            files[path] = _stat_record(target)
+
+        with self._lock:
+            self.entries[key] = {
+                'files': files, 'blobs': blobs, 'used': time.time()}
+            self._dirty = True
+
+    def _evict(self):
+        def size(record):
+            if not record.get('blobs'):
+                return 0
+            return sum(
+                stat_record[0] for stat_record in record['files'].values())
+
+        entries = self.entries
+        total = sum(size(record) for record in entries.values())
+        evicted = []
+        for key in sorted(entries, key=lambda k: entries[k].get('used', 0)):
+            if len(entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            record = entries.pop(key)
+            total -= size(record)
+            shutil.rmtree(self._blob_dir(key), ignore_errors=True)
+            evicted.append(key)
+        if evicted:
+            logger.debug(
+                "evicted %d record(s) from compile cache '%s'",
+                len(evicted), self.cache_dir,
+            )
+        return evicted
+
+    def save(self):
+        """
+        Write out the manifest, if there were changes, after evicting
+        the least recently used records that exceed the limits.
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+            self._evict()
+            write_json_atomic(self.manifest_path, {
+                'version': COMPILE_CACHE_VERSION,
+                'entries': self.entries,
+            })
+            self._dirty = False
+        logger.debug(
+            "compile cache manifest '%s' written; %d hit(s), %d miss(es)",
+            self.manifest_path, self.hits, self.misses,
+        )
+
+
+class DigestCache(object):
+    """
+    An in-memory cache of the digests of files, such that a file will
+    only be hashed again once its size or modification time changes.
+
+    The size and modification time of the files may be provided up
+    front through update, such as the ones recorded by a snapshot that
+    was produced by calmjs.utils.stat_snapshot, such that the files will
+    not need to be checked again.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._digests = {}
+        self._stamps = {}
+        self.hits = 0
+        self.misses = 0
+
+    def update(self, stamps):
+        """
+        Replace the known stamps, a mapping of paths to a 2-tuple of the
+        size and the modification time of the file at that path.
+        """
+
+        with self._lock:
+            self._stamps = dict(stamps)
+
+    def digest(self, path):
+        """
+        Return the hex digest of the contents of the file at path.
+        """
+
+        with self._lock:
+            stamp = self._stamps.get(path)
+        if stamp is None:
+            st = stat(path)
+            stamp = (st.st_size, st.st_mtime)
+        stamp = tuple(stamp)
+        with self._lock:
+            record = self._digests.get(path)
+            if record is not None and record[0] == stamp:
+                self.hits += 1
+                return record[1]
+            self.misses += 1
+
+        digest = file_digest(path)
+        # files modified within the resolution of the timestamps may be
+        # modified again without the stamp changing.
+        if time.time() - stamp[1] >= RACY_MTIME_WINDOW:
+            with self._lock:
+                self._digests[path] = (stamp, digest)
+        return digest
+
+
+def _text_open(path, mode='r'):
+    return codecs.open(path, mode, encoding='utf-8')
+
+
+class ASTCache(object):
+    """
+    An in-memory cache of the syntax trees produced by parsers such as
+    the ones provided by calmjs.parse, such that a source file may be
+    parsed once and the resulting tree be shared by everything that
+    needs it within the same process, such as the transpile step of a
+    toolchain and the interrogation of the imports of the source file.
+
+    The trees are tracked by the path of the source file and the parser
+    used, and are only reused if the size and modification time of the
+    file remain unchanged.  The least recently used trees are evicted
+    once the total size of their source files exceeds max_bytes.
+
+    As the trees are shared, consumers must not modify them.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = (
+            AST_CACHE_MAX_BYTES if max_bytes is None else max_bytes)
+        self._lock = Lock()
+        self._trees = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._trees:
+            key, (stamp, tree) = self._trees.popitem(last=False)
+            self.size -= stamp[0]
+
+    def parse(self, parser, path, opener=_text_open):
+        """
+        Return the tree for the source file at path produced by parser,
+        reading the file with the opener if it has to be parsed.
+        """
+
+        path = normpath(abspath(path))
+        st = stat(path)
+        stamp = (st.st_size, st.st_mtime)
+        key = (path, parser)
+        with self._lock:
+            record = self._trees.pop(key, None)
+            if record is not None:
+                self.size -= record[0][0]
+                if record[0] == stamp:
+                    # reinsert to mark as the most recently used.
+                    self._trees[key] = record
+                    self.size += stamp[0]
+                    self.hits += 1
+                    return record[1]
+            self.misses += 1
+
+        tree = read(parser, partial(opener, path, 'r'))
+        with self._lock:
+            previous = self._trees.pop(key, None)
+            if previous is not None:
+                self.size -= previous[0][0]
+            self._trees[key] = (stamp, tree)
+            self.size += stamp[0]
+            self._evict()
+        return tree
+
+    def clear(self):
+        with self._lock:
+            self._trees.clear()
+            self.size = 0
+
+
+def _pid_running(pid):
+    if sys.platform == 'win32':
+        # os.kill cannot be used for probing under win32.
+        return None
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class BuildDirLock(object):
+    """
+    A simple lock file based lock for a build directory, such that
+    concurrent processes will not make use of the same one.
+    """
+
+    def __init__(self, path, stale=BUILD_DIR_LOCK_STALE):
+        self.path = path
+        self.stale = stale
+        self.acquired = False
+
+    def _read_owner(self):
+        try:
+            with open(self.path) as fd:
+                host, pid = fd.read().split()
+            return host, int(pid)
+        except (IOError, OSError, ValueError):
+            return None, None
+
+    def is_stale(self):
+        """
+        Check whether the existing lock file was left behind by a
+        process that is no longer running.
+        """
+
+        try:
+            age = time.time() - stat(self.path).st_mtime
+        except OSError:
+            return False
+        host, pid = self._read_owner()
+        if pid is not None and host == socket.gethostname():
+            running = _pid_running(pid)
+            if running is not None:
+                return not running
+        return age > self.stale
+
+    def _identity(self):
+        try:
+            st = stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime
+
+    def _break_stale(self, identity):
+        # The stale lock file is first moved aside under a unique name,
+        # as another process may have replaced it with a fresh one of
+        # its own since it was determined to be stale; only the lock
+        # file with the identity that was checked may be removed.
+        moved = '%s.%s.%d.%d.stale' % (
+            self.path, socket.gethostname(), os.getpid(), id(self))
+        try:
+            rename(self.path, moved)
+        except OSError:
+            # already taken over by another process.
+            return
+        st = stat(moved)
+        if (st.st_ino, st.st_mtime) == identity:
+            logger.warning("removing stale lock file '%s'", self.path)
+        else:
+            logger.debug(
+                "lock file '%s' was replaced after being found stale; "
+                "restoring it", self.path
+            )
+            try:
+                os.link(moved, self.path)
+            except (AttributeError, OSError):
+                logger.warning(
+                    "failed to restore lock file '%s' that was replaced "
+                    "after being found stale", self.path
+                )
+        try:
+            remove(moved)
+        except OSError:
+            pass
+
+    def is_locked(self):
+        return exists(self.path) and not self.is_stale()
+
+    def _create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            return False
+        os.write(fd, (
+            '%s %d' % (socket.gethostname(), os.getpid())).encode('utf8'))
+        os.close(fd)
+        return True
+
+    def acquire(self, timeout=BUILD_DIR_LOCK_TIMEOUT, interval=0.1):
+        """
+        Acquire the lock, waiting up to timeout seconds for it to be
+        released.  Returns True if acquired, otherwise False.
+        """
+
+        deadline = time.time() + timeout
+        while not self._create():
+            identity = self._identity()
+            if identity is not None and self.is_stale():
+                self._break_stale(identity)
+                continue
+            if time.time() >= deadline:
+                return False
+            time.sleep(interval)
+        self.acquired = True
+        return True
+
+    def release(self):
+        if not self.acquired:
+            return
+        try:
+            remove(self.path)
+        except OSError:
+            logger.warning("failed to remove lock file '%s'", self.path)
+        self.acquired = False
+
+
+def prune_build_dirs(root, retention=BUILD_DIR_RETENTION):
+    """
+    Remove the least recently used managed build directories inside
+    root, such that at most the retention number of them are kept.
+    Directories that are locked are always kept.
+    """
+
+    try:
+        names = listdir(root)
+    except OSError:
+        return []
+
+    candidates = []
+    for name in names:
+        path = join(root, name)
+        if not isdir(join(path, BUILD_DIR_NAME)):
+            continue
+        candidates.append((stat(path).st_mtime, path))
+
+    removed = []
+    for mtime, path in sorted(candidates, reverse=True)[retention:]:
+        if BuildDirLock(join(path, BUILD_DIR_LOCK)).is_locked():
+            continue
+        logger.debug("removing expired managed build directory '%s'", path)
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+    return removed
+
+
+def acquire_managed_build_dir(root, fingerprint, retention=None, timeout=None):
+    """
+    Acquire the managed build directory inside root that is identified
+    by the fingerprint, creating it if it does not already exist.  If
+    unspecified, retention and timeout defaults to BUILD_DIR_RETENTION
+    and BUILD_DIR_LOCK_TIMEOUT respectively.
+
+    Returns a 2-tuple of the build directory and the acquired lock that
+    must be released once the directory is no longer needed, or None
+    if the lock could not be acquired within the timeout.
+    """
+
+    retention = BUILD_DIR_RETENTION if retention is None else retention
+    timeout = BUILD_DIR_LOCK_TIMEOUT if timeout is None else timeout
+    base = join(root, fingerprint)
+    build_dir = join(base, BUILD_DIR_NAME)
+    ensure_dir(build_dir)
+    lock = BuildDirLock(join(base, BUILD_DIR_LOCK))
+    if not lock.acquire(timeout=timeout):
+        logger.warning(
+            "timed out waiting for the lock on managed build directory '%s'",
+            build_dir,
+        )
+        return None
+    # mark this as the most recently used.
+    utime(base, None)
+    prune_build_dirs(root, retention=retention)
+    return build_dir, lock
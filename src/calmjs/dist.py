@@ -11,15 +11,23 @@ import json
 
 from functools import partial
 from logging import getLogger
+from os.path import abspath
+from os.path import isdir
+from os.path import join
 
 from distutils.command.build import build as BuildCommand
 from distutils.errors import DistutilsSetupError
 
+from pkg_resources import EntryPoint
 from pkg_resources import Requirement
 from pkg_resources import working_set as default_working_set
 
 from calmjs.registry import get
 from calmjs.base import BaseModuleRegistry
+from calmjs.base import BaseChildModuleRegistry
+from calmjs.indexer import JS_EXT
+from calmjs.indexer import list_module_files
+from calmjs.indexer import path_origin
 
 logger = getLogger(__name__)
 
@@ -121,6 +129,72 @@ def write_line_list(argname, cmd, basename, filename):
     cmd.write_or_delete_file(argname, filename, values, force=True)
 
 
+def build_module_index(dist, get_package_dir, build_lib=None):
+    """
+    Build the module index for the setuptools distribution, which lists
+    the files for each of the modules declared for the module registries
+    through its entry points, using get_package_dir to locate their
+    directories.  If the build_lib directory is provided and contains
+    the directory for a module (i.e. build_py was run), the files will
+    be listed from there, as those are the files that get installed.
+
+    The listed files are limited to the ones with the default extension
+    and the extensions declared for the loader plugin module registries.
+    """
+
+    modules = set()
+    extensions = set([JS_EXT])
+    for group, entry_map in EntryPoint.parse_map(
+            dist.entry_points or {}).items():
+        registry = get(group)
+        if not isinstance(registry, BaseModuleRegistry):
+            continue
+        for entry_point in entry_map.values():
+            if isinstance(registry, BaseChildModuleRegistry):
+                extensions.update('.' + extra for extra in entry_point.extras)
+            else:
+                modules.add(entry_point.module_name)
+
+    index = {}
+    for module_name in sorted(modules):
+        path = abspath(get_package_dir(module_name))
+        if not isdir(path):
+            logger.warning(
+                "directory for module '%s' not found at '%s'; not indexed",
+                module_name, path,
+            )
+            continue
+        built = build_lib and join(build_lib, *module_name.split('.'))
+        index[module_name] = {
+            # the origin remains the source directory, such that the
+            # index will not be used for develop installs.
+            'origin': path_origin(path),
+            'paths': list_module_files(
+                built if built and isdir(built) else path, extensions),
+        }
+
+    if not index:
+        return None
+    return {'extensions': sorted(extensions), 'modules': index}
+
+
+def write_module_index(cmd, basename, filename):
+    """
+    Write the module index for the distribution into the package's
+    egg-info directory, such that the module registries may read that
+    instead of globbing the directories of the installed modules.
+    """
+
+    build_py = cmd.get_finalized_command('build_py')
+    index = build_module_index(
+        cmd.distribution, build_py.get_package_dir, build_py.build_lib)
+    if index is not None:
+        index = json.dumps(
+            index, indent=4, sort_keys=True, separators=(',', ': '))
+    cmd.write_or_delete_file(
+        'calmjs module index', filename, index, force=True)
+
+
 def find_pkg_dist(pkg_name, working_set=None):
     """
     Locate a package's distribution by its name.
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+A persistent index of the entry points provided by the distributions in
+the default working set.
+
+The registries (and runtimes) of the calmjs framework each iterate
+through the entry points of some group, which requires the metadata of
+every distribution within the working set be read.  If the environment
+variable ``CALMJS_CACHE_DIR`` is set, the entry points of all groups
+will be written to an index in that directory, keyed on the paths of
+the working set and the metadata of the distributions within, such that
+subsequent executions may read that instead.  The index is rebuilt
+whenever the installed distributions change.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+from os.path import join
+from os import stat
+
+from pkg_resources import EntryPoint
+from pkg_resources import working_set as default_working_set
+
+from calmjs.cache import digest_values
+from calmjs.cache import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+CALMJS_CACHE_DIR = 'CALMJS_CACHE_DIR'
+INDEX_FILENAME = 'entry_points.json'
+
+# the loaded indexes, keyed by the index key.
+_indexes = {}
+
+
+def _metadata_stamp(dist):
+    # the entry points file within the metadata directory is checked
+    # directly as it may be rewritten in place for develop installs.
+    egg_info = getattr(dist, 'egg_info', None)
+    if not egg_info:
+        return None
+    try:
+        st = stat(join(egg_info, 'entry_points.txt'))
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime]
+
+
+def index_key(working_set):
+    """
+    Produce the key for the working_set, from its paths and the name,
+    version, location and entry point metadata of every distribution.
+    """
+
+    return digest_values(list(working_set.entries), [
+        [dist.key, dist.version, dist.location, _metadata_stamp(dist)]
+        for dist in working_set
+    ])
+
+
+def build_index(working_set):
+    """
+    Return a dict of entry point groups, each with a list of 2-tuples
+    of the distribution key and the entry point, in the order as they
+    would be produced by working_set.iter_entry_points.
+    """
+
+    groups = {}
+    for dist in working_set:
+        for group, entry_map in dist.get_entry_map().items():
+            groups.setdefault(group, []).extend(
+                (dist.key, str(entry_point))
+                for entry_point in entry_map.values()
+            )
+    return groups
+
+
+def _read_index(path, key):
+    try:
+        with open(path) as fd:
+            index = json.load(fd)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get('key') != key:
+        return None
+    return index.get('groups')
+
+
+def load_index(working_set, cache_dir):
+    """
+    Return the index for the working_set, reading it from cache_dir or
+    building (and writing) it if it is missing or outdated.
+    """
+
+    key = index_key(working_set)
+    groups = _indexes.get(key)
+    if groups is not None:
+        return groups
+
+    path = join(cache_dir, INDEX_FILENAME)
+    groups = _read_index(path, key)
+    if groups is None:
+        logger.debug("building entry point index '%s'", path)
+        groups = build_index(working_set)
+        try:
+            write_json_atomic(path, {'key': key, 'groups': groups})
+        except (IOError, OSError) as e:
+            logger.warning(
+                "failed to write entry point index '%s': %s", path, e)
+    _indexes[key] = groups
+    return groups
+
+
+def iter_entry_points(working_set, group, name=None):
+    """
+    Iterate through the entry points for group (with the name, if
+    provided) like working_set.iter_entry_points, but through the index
+    if the working_set is the default one and ``CALMJS_CACHE_DIR`` is
+    set.
+    """
+
+    cache_dir = os.environ.get(CALMJS_CACHE_DIR)
+    if working_set is not default_working_set or not cache_dir:
+        entry_points = working_set.iter_entry_points(group) if (
+            name is None) else working_set.iter_entry_points(group, name)
+        for entry_point in entry_points:
+            yield entry_point
+        return
+
+    for dist_key, text in load_index(working_set, cache_dir).get(group, ()):
+        entry_point = EntryPoint.parse(
+            text, dist=working_set.by_key.get(dist_key))
+        if name is None or entry_point.name == name:
+            yield entry_point
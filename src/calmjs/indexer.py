@@ -6,19 +6,51 @@ Various loaders.
 from __future__ import absolute_import
 
 import fnmatch
+import hashlib
+import json
 import pkg_resources
+import sys
+import time
 
-from logging import getLogger
+from collections import OrderedDict
 from glob import iglob
+from logging import getLogger
+from threading import Lock
+from os.path import dirname
 from os.path import exists
+from os.path import isdir
+from os.path import islink
 from os.path import join
+from os.path import normcase
+from os.path import realpath
 from os.path import relpath
 from os.path import sep
+from os import altsep
+from os import listdir
+from os import stat
 from os import walk
 
+try:  # pragma: no cover
+    from os import scandir
+except ImportError:  # pragma: no cover
+    # not available for Python 2.
+    scandir = None
+
 logger = getLogger(__name__)
 
 JS_EXT = '.js'
+CALMJS_MODULE_INDEX_JSON = 'calmjs_module_index.json'
+# directories modified within this many seconds of being listed will
+# not have their listings cached, as further modifications within the
+# resolution of the filesystem timestamps may go unnoticed.
+RACY_MTIME_WINDOW = 2
+# the maximum number of directory listings held by a ListingCache, as
+# the processes that watch for changes may run for a long time.
+LISTING_CACHE_MAX_ENTRIES = 4096
+
+# the module indexes read from the distributions, keyed by their key,
+# version and location.
+_module_indexes = {}
 
 _utils = {
     'modpath': {},
@@ -28,7 +60,27 @@ _utils = {
 }
 
 
-def resource_filename_mod_dist(module_name, dist):
+def resource_filename_mod(module_name, module=None):
+    """
+    Resolve the path to the module through pkg_resources, which will
+    import the module.  If the module provided was not imported (such
+    as the stand-in modules located by the module registries that do
+    not import their modules), the path will be resolved from the
+    location attributes of that module instead such that it is not
+    executed.
+    """
+
+    if module is not None and sys.modules.get(module_name) is not module:
+        path = getattr(module, '__file__', None)
+        if path:
+            return dirname(path)
+        paths = list(getattr(module, '__path__', None) or ())
+        if paths:
+            return paths[0]
+    return pkg_resources.resource_filename(module_name, '')
+
+
+def resource_filename_mod_dist(module_name, dist, module=None):
     """
     Given a module name and a distribution, attempt to resolve the
     actual path to the module.
@@ -42,7 +94,7 @@ def resource_filename_mod_dist(module_name, dist):
             "distribution '%s' not found, falling back to resolution using "
             "module_name '%s'", dist, module_name,
         )
-        return pkg_resources.resource_filename(module_name, '')
+        return resource_filename_mod(module_name, module)
 
 
 # An attempt was made to use the provided distribution argument directly
@@ -80,7 +132,7 @@ def resource_filename_mod_dist(module_name, dist):
 # `Distribution._provider.module_path`.
 
 
-def resource_filename_mod_entry_point(module_name, entry_point):
+def resource_filename_mod_entry_point(module_name, entry_point, module=None):
     """
     If a given package declares a namespace and also provide submodules
     nested at that namespace level, and for whatever reason that module
@@ -89,14 +141,18 @@ def resource_filename_mod_entry_point(module_name, entry_point):
     be resolved through its distribution.  That said, the default
     resource_filename function does not accept an entry_point, and so we
     have to chain that back together manually.
+
+    The module, if provided, is used for the fallback resolution as
+    described by resource_filename_mod.
     """
 
     if entry_point.dist is None:
         # distribution missing is typically caused by mocked entry
         # points from tests; silently falling back to basic lookup
-        result = pkg_resources.resource_filename(module_name, '')
+        result = resource_filename_mod(module_name, module)
     else:
-        result = resource_filename_mod_dist(module_name, entry_point.dist)
+        result = resource_filename_mod_dist(
+            module_name, entry_point.dist, module)
 
     if not result:
         logger.warning(
@@ -117,7 +173,7 @@ def resource_filename_mod_entry_point(module_name, entry_point):
 def modgen(
         module, entry_point,
         modpath='pkg_resources', globber='root', fext=JS_EXT,
-        registry=_utils):
+        registry=_utils, prune=None):
     """
     JavaScript styled module location listing generator.
 
@@ -142,11 +198,18 @@ def modgen(
         one that will only glob the local path.
 
     fext
-        The filename extension to match.  Defaults to `.js`.
+        The filename extension to match.  Defaults to `.js`.  May also
+        be a collection of extensions, such that the files for all of
+        them will be listed through a single traversal of the module
+        paths where the globber permits.
 
     registry
         The "registry" to extract the functions from
 
+    prune
+        The PruneRules for the directories that the recursive globbers
+        will not descend into.
+
     Yields 3-tuples of
 
     - raw list of module name fragments
@@ -156,6 +219,26 @@ def modgen(
     For each of the module basepath and source files the globber finds.
     """
 
+    for fext_, modname_fragments, base, subpath in _modgen(
+            module, entry_point, modpath, globber, fext, registry, prune):
+        yield modname_fragments, base, subpath
+
+
+def _to_fexts(fext):
+    # a tuple of the extensions from the fext argument.
+    if isinstance(fext, (list, tuple, set, frozenset)):
+        return tuple(sorted(set(fext)))
+    return (fext,)
+
+
+def _modgen(
+        module, entry_point, modpath, globber, fext, registry, prune=None):
+    # as modgen, but with the matched extension included as the first
+    # item of the yielded tuples.
+
+    fexts = _to_fexts(fext)
+    if len(fexts) > 1 and not callable(globber):
+        globber = _multi_globbers.get(globber, globber)
     globber_f = globber if callable(globber) else registry['globber'][globber]
     modpath_f = modpath if callable(modpath) else registry['modpath'][modpath]
 
@@ -168,16 +251,177 @@ def modgen(
     module_base_paths = modpath_f(module, entry_point)
 
     for module_base_path in module_base_paths:
-        logger.debug('searching for *%s files in %s', fext, module_base_path)
-        for path in globber_f(module_base_path, '*' + fext):
+        matches = None
+        if modpath == 'pkg_resources' and globber in _indexed_globbers:
+            matches = _indexed_matches(
+                module.__name__, entry_point, module_base_path, fexts,
+                _indexed_globbers[globber], prune)
+        if matches is None:
+            logger.debug(
+                'searching for %s files in %s',
+                ', '.join('*' + fext for fext in fexts), module_base_path)
+            matches = _glob_matches(
+                globber_f, module_base_path, fexts, prune)
+        for fext, path in matches:
             mod_path = (relpath(path, module_base_path))
             yield (
+                fext,
                 module_frags + mod_path[:-len(fext)].split(sep),
                 module_base_path,
                 mod_path,
             )
 
 
+def _glob_matches(globber_f, module_base_path, fexts, prune=None):
+    # yield the extension and path of the files found by the globber.
+    kw = {}
+    if prune is not None and getattr(globber_f, 'prunable', False):
+        kw['prune'] = prune
+    if len(fexts) > 1 and getattr(globber_f, 'multiple_patterns', False):
+        for path in globber_f(
+                module_base_path, tuple('*' + fext for fext in fexts), **kw):
+            for fext in fexts:
+                if path.endswith(fext):
+                    yield fext, path
+        return
+    for fext in fexts:
+        for path in globber_f(module_base_path, '*' + fext, **kw):
+            yield fext, path
+
+
+def _indexed_matches(
+        module_name, entry_point, module_base_path, fexts, f, prune=None):
+    # the extension and path of the files from the module index that
+    # pass the filter f and are not within the directories pruned, or
+    # None if any of the extensions are missing.
+    matches = []
+    for fext in fexts:
+        indexed = indexed_module_files(
+            module_name, entry_point, module_base_path, fext)
+        if indexed is None:
+            return None
+        matches.extend(
+            (fext, join(module_base_path, *path.split('/')))
+            for path in indexed if f(path) and not (
+                prune is not None and prune.prunes_file(path))
+        )
+    logger.debug(
+        'using module index for %s files in %s',
+        ', '.join('*' + fext for fext in fexts), module_base_path)
+    return matches
+
+
+def path_origin(path):
+    """
+    Return a digest that identifies the real location of path, such
+    that the origin of a module index may be recorded without the path.
+    """
+
+    return hashlib.sha1(
+        normcase(realpath(path)).encode('utf8')).hexdigest()
+
+
+def list_module_files(module_base_path, extensions):
+    """
+    Return the sorted list of the '/' separated paths, relative to the
+    module_base_path, of all the files within that end with one of the
+    extensions.
+    """
+
+    extensions = tuple(extensions)
+    return sorted(
+        relpath(join(root, filename), module_base_path).replace(sep, '/')
+        for root, dirnames, filenames in walk(module_base_path)
+        for filename in filenames if filename.endswith(extensions)
+    )
+
+
+def read_dist_module_index(dist):
+    """
+    Read the module index from the metadata of the distribution, if it
+    provides one.
+    """
+
+    key = (dist.key, dist.version, dist.location)
+    if key in _module_indexes:
+        return _module_indexes[key]
+
+    index = None
+    if dist.has_metadata(CALMJS_MODULE_INDEX_JSON):
+        try:
+            index = json.loads(dist.get_metadata(CALMJS_MODULE_INDEX_JSON))
+        except (IOError, ValueError):
+            logger.warning(
+                "the '%s' found in '%s' could not be read",
+                CALMJS_MODULE_INDEX_JSON, dist,
+            )
+    if not isinstance(index, dict):
+        index = None
+    _module_indexes[key] = index
+    return index
+
+
+def indexed_module_files(module_name, entry_point, module_base_path, fext):
+    """
+    Return the list of relative paths of the files with the extension
+    fext for the module, as recorded in the module index provided by
+    the distribution of the entry_point.
+
+    None is returned if the index is unavailable, does not cover the
+    module or the extension, if the module is located at the path where
+    the index was generated (as is the case for develop installs, where
+    the index may not reflect the files being worked on), or if any of
+    the indexed files are not present as the index may not reflect the
+    files that were installed.
+    """
+
+    dist = getattr(entry_point, 'dist', None)
+    if dist is None:
+        return None
+    index = read_dist_module_index(dist)
+    if not index or fext not in index.get('extensions', ()):
+        return None
+    entry = index.get('modules', {}).get(module_name)
+    if not isinstance(entry, dict) or entry.get('origin') == path_origin(
+            module_base_path):
+        return None
+    paths = [path for path in entry.get('paths', ()) if path.endswith(fext)]
+    for path in paths:
+        if not exists(join(module_base_path, *path.split('/'))):
+            logger.debug(
+                "indexed file '%s' for module '%s' not found in '%s'; not "
+                "using module index", path, module_name, module_base_path)
+            return None
+    return paths
+
+
+def _indexed_root(path):
+    # as with glob, which will not match the hidden files.
+    return '/' not in path and not path.startswith('.')
+
+
+def _indexed_recursive(path):
+    return True
+
+
+# the filters for the paths from the module index that emulate the
+# globbers of the same name.
+_indexed_globbers = {
+    'root': _indexed_root,
+    'recursive': _indexed_recursive,
+    'scandir_root': _indexed_root,
+    'scandir_recursive': _indexed_recursive,
+}
+
+# the globbers that will match multiple patterns in a single traversal,
+# to be used in place of the globbers of the same behavior when listing
+# multiple extensions.
+_multi_globbers = {
+    'root': 'scandir_root',
+    'recursive': 'scandir_recursive',
+}
+
+
 def register(util_type, registry=_utils):
     """
     Crude, local registration decorator for a crude local registry of
@@ -241,7 +485,8 @@ def modpath_pkg_resources(module, entry_point):
 
     result = []
     try:
-        path = resource_filename_mod_entry_point(module.__name__, entry_point)
+        path = resource_filename_mod_entry_point(
+            module.__name__, entry_point, module)
     except ImportError:
         logger.warning("module '%s' could not be imported", module.__name__)
     except Exception:
@@ -254,14 +499,205 @@ def modpath_pkg_resources(module, entry_point):
 
 @register('globber')
 def globber_root(root, patt):
-    return iglob(join(root, patt))
+    if sep in patt or (altsep and altsep in patt):
+        # patterns that reference subdirectories cannot be matched
+        # against the listing of root.
+        return iglob(join(root, patt))
+    try:
+        entries = listing_cache.listdir(root)
+    except OSError:
+        return iter([])
+    names = [name for name, is_dir, is_link in entries]
+    if not patt.startswith('.'):
+        # as with glob, hidden entries are only matched explicitly.
+        names = [name for name in names if not name.startswith('.')]
+    return (join(root, name) for name in fnmatch.filter(names, patt))
 
 
 @register('globber')
-def globber_recursive(root, patt):
-    for root, dirnames, filenames in walk(root):
-        for filename in fnmatch.filter(filenames, patt):
-            yield join(root, filename)
+def globber_recursive(root, patt, prune=None):
+    return _scan(root, patt, True, prune)
+
+
+def _scandir(root):
+    # yield the name of each entry in root, and whether it is a
+    # directory and whether it is a symlink.
+    if scandir is None:
+        for name in listdir(root):
+            path = join(root, name)
+            yield name, isdir(path), islink(path)
+        return
+    for entry in scandir(root):
+        yield entry.name, entry.is_dir(), entry.is_symlink()
+
+
+class ListingCache(object):
+    """
+    A cache of the listings of directories, keyed by their paths and
+    validated by their modification times, such that the directories
+    shared by the module registries only need to be read once.  Only
+    the most recently used max_entries listings are retained.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = (
+            LISTING_CACHE_MAX_ENTRIES if max_entries is None else max_entries)
+        self.listings = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<%s hits=%d misses=%d>' % (
+            type(self).__name__, self.hits, self.misses)
+
+    def listdir(self, path):
+        """
+        Return the sorted list of 3-tuples of the name of each entry in
+        the directory at path, and whether it is a directory and whether
+        it is a symlink.  Raises OSError if path cannot be listed.
+        """
+
+        mtime = stat(path).st_mtime
+        with self._lock:
+            cached = self.listings.pop(path, None)
+            if cached is not None and cached[0] == mtime:
+                self.hits += 1
+                self.listings[path] = cached
+                return cached[1]
+
+        entries = sorted(_scandir(path))
+        with self._lock:
+            self.misses += 1
+            if time.time() - mtime >= RACY_MTIME_WINDOW:
+                self.listings.pop(path, None)
+                self.listings[path] = (mtime, entries)
+                while len(self.listings) > self.max_entries:
+                    self.listings.popitem(last=False)
+        return entries
+
+    def clear(self):
+        """
+        Clear the cached listings and reset the counters.
+        """
+
+        with self._lock:
+            self.listings.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# the listing cache shared by all the globbers.
+listing_cache = ListingCache()
+
+
+class PruneRules(object):
+    """
+    Rules for the directories to be pruned from a recursive traversal,
+    as fnmatch patterns matched against both the name of a directory
+    and its '/' separated path relative to the root of the traversal.
+    Directories matching the exclude patterns will not be descended
+    into, unless they also match the include patterns.
+    """
+
+    def __init__(self, exclude=(), include=()):
+        self.exclude = tuple(exclude)
+        self.include = tuple(include)
+
+    def __repr__(self):
+        return '%s(exclude=%r, include=%r)' % (
+            type(self).__name__, self.exclude, self.include)
+
+    def _match(self, patts, path):
+        name = path.rsplit('/', 1)[-1]
+        return any(
+            fnmatch.fnmatch(name, patt) or fnmatch.fnmatch(path, patt)
+            for patt in patts
+        )
+
+    def prunes(self, path):
+        """
+        Return True if the directory at the '/' separated path relative
+        to the root of the traversal is to be pruned.
+        """
+
+        return self._match(self.exclude, path) and not self._match(
+            self.include, path)
+
+    def prunes_file(self, path):
+        """
+        Return True if the file at the '/' separated path relative to
+        the root of the traversal is within a pruned directory.
+        """
+
+        parts = path.split('/')[:-1]
+        return any(
+            self.prunes('/'.join(parts[:idx]))
+            for idx in range(1, len(parts) + 1)
+        )
+
+
+# the rules that prune the directories that typically hold no sources
+# for a module, such as the ones for installed node packages, bytecode
+# caches and the hidden directories used by version control systems.
+DEFAULT_PRUNE_RULES = PruneRules(exclude=('node_modules', '__pycache__', '.*'))
+
+
+def _scan(root, patt, recursive, prune=None):
+    patts = tuple(patt) if isinstance(
+        patt, (list, tuple, set, frozenset)) else (patt,)
+    roots = [(root, '')]
+    while roots:
+        current, current_rel = roots.pop()
+        try:
+            entries = listing_cache.listdir(current)
+        except OSError:
+            continue
+        subdirs = []
+        for name, is_dir, is_link in entries:
+            if is_dir:
+                # as with os.walk, symlinks to directories are not
+                # followed.
+                if is_link:
+                    continue
+                rel = current_rel + '/' + name if current_rel else name
+                if prune is None or not prune.prunes(rel):
+                    subdirs.append((join(current, name), rel))
+            elif not recursive and name.startswith('.'):
+                # as with glob, hidden files are not matched.
+                continue
+            elif any(fnmatch.fnmatch(name, p) for p in patts):
+                yield join(current, name)
+        if recursive:
+            roots.extend(reversed(subdirs))
+
+
+@register('globber')
+def globber_scandir_root(root, patt):
+    """
+    Glob the files directly within root that match patt, which may also
+    be a collection of patterns to be matched in a single listing.
+    """
+
+    return _scan(root, patt, False)
+
+
+@register('globber')
+def globber_scandir_recursive(root, patt, prune=None):
+    """
+    Glob the files within root and all its subdirectories that match
+    patt, which may also be a collection of patterns to be matched in a
+    single traversal.  Directories pruned by the PruneRules will not be
+    descended into.
+    """
+
+    return _scan(root, patt, True, prune)
+
+
+globber_scandir_root.multiple_patterns = True
+globber_scandir_recursive.multiple_patterns = True
+globber_recursive.prunable = True
+globber_scandir_recursive.prunable = True
 
 
 @register('modname')
@@ -284,26 +720,32 @@ def modname_python(fragments):
 
 def mapper(module, entry_point,
            modpath='pkg_resources', globber='root', modname='es6',
-           fext=JS_EXT, registry=_utils):
+           fext=JS_EXT, registry=_utils, prune=None):
     """
     General mapper
 
     Loads components from the micro registry.
+
+    If fext is a collection of extensions, the mappings for all of them
+    are produced from a single listing of the module paths and returned
+    as a dict keyed by each of the extensions.  The prune rules are
+    passed to the recursive globbers.
     """
 
     modname_f = modname if callable(modname) else _utils['modname'][modname]
 
-    return {
-        modname_f(modname_fragments): join(base, subpath)
-        for modname_fragments, base, subpath in modgen(
-            module, entry_point=entry_point,
-            modpath=modpath, globber=globber,
-            fext=fext, registry=_utils)
-    }
+    results = {fext_: {} for fext_ in _to_fexts(fext)}
+    for fext_, modname_fragments, base, subpath in _modgen(
+            module, entry_point, modpath, globber, fext, _utils, prune):
+        results[fext_][modname_f(modname_fragments)] = join(base, subpath)
+    if isinstance(fext, (list, tuple, set, frozenset)):
+        return results
+    return results[fext]
 
 
 @register('mapper')
-def mapper_es6(module, entry_point, globber='root', fext=JS_EXT):
+def mapper_es6(
+        module, entry_point, globber='root', fext=JS_EXT, prune=None):
     """
     Default mapper
 
@@ -313,11 +755,12 @@ def mapper_es6(module, entry_point, globber='root', fext=JS_EXT):
 
     return mapper(
         module, entry_point=entry_point, modpath='pkg_resources',
-        globber=globber, modname='es6', fext=fext)
+        globber=globber, modname='es6', fext=fext, prune=prune)
 
 
 @register('mapper')
-def mapper_python(module, entry_point, globber='root', fext=JS_EXT):
+def mapper_python(
+        module, entry_point, globber='root', fext=JS_EXT, prune=None):
     """
     Default mapper using python style globber
 
@@ -327,4 +770,4 @@ def mapper_python(module, entry_point, globber='root', fext=JS_EXT):
 
     return mapper(
         module, entry_point=entry_point, modpath='pkg_resources',
-        globber=globber, modname='python', fext=fext)
+        globber=globber, modname='python', fext=fext, prune=prune)
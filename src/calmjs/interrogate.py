@@ -5,12 +5,14 @@ For the purpose of interrogation of JavaScript source files.
 
 from __future__ import absolute_import
 
+import codecs
 import logging
 import re
 import ast
 from functools import partial
 
 from calmjs.parse import asttypes
+from calmjs.parse.io import read
 from calmjs.parse.parsers.es5 import parse
 
 logger = logging.getLogger(__name__)
@@ -209,6 +211,27 @@ def extract_module_imports(text):
     return yield_module_imports(tree)
 
 
+def parse_path(path, ast_cache=None):
+    """
+    Parse the JavaScript source file at path, through the provided
+    calmjs.cache.ASTCache such that the resulting tree may be shared
+    with other consumers.
+    """
+
+    if ast_cache is None:
+        return read(parse, partial(codecs.open, path, 'r', encoding='utf-8'))
+    return ast_cache.parse(parse, path)
+
+
+def extract_module_imports_path(path, ast_cache=None):
+    """
+    Extract all require and define calls from the unbundled JavaScript
+    source file at path, parsed using parse_path.
+    """
+
+    return yield_module_imports(parse_path(path, ast_cache))
+
+
 def yield_module_imports_nodes(root, checks=import_nodes()):
     """
     Yield all nodes that provide an import
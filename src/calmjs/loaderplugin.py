@@ -13,9 +13,11 @@ import logging
 from os.path import exists
 from os.path import join
 
-from calmjs import base as calmjs_base
 from calmjs.base import PackageKeyMapping
 from calmjs.npm import locate_package_entry_file
+from calmjs.indexer import mapper_es6
+from calmjs.indexer import mapper_python
+from calmjs.indexer import modpath_pkg_resources
 from calmjs.base import BaseLoaderPluginRegistry
 from calmjs.base import BaseLoaderPluginHandler
 from calmjs.base import BaseChildModuleRegistry
@@ -224,13 +226,33 @@ class ModuleLoaderRegistry(BaseChildModuleRegistry):
         return super(ModuleLoaderRegistry, self).resolve_parent_registry_name(
             registry_name, suffix)
 
+    def register_entry_points(self, entry_points):
+        entry_points = list(entry_points)
+        # the extensions declared by all the entry points for each of
+        # the packages, such that the directories of their modules only
+        # need to be listed once for the entire batch.
+        self._batch_fexts = {}
+        self._batch_mappings = {}
+        for entry_point in entry_points:
+            if entry_point.dist is not None:
+                self._batch_fexts.setdefault(
+                    entry_point.dist.project_name, set()).update(
+                        '.' + extra for extra in entry_point.extras)
+        try:
+            return super(ModuleLoaderRegistry, self).register_entry_points(
+                entry_points)
+        finally:
+            self._batch_fexts = None
+            self._batch_mappings = None
+
     def register_entry_point(self, entry_point):
         # use the module names registered on the parent registry, but
         # apply the entry points defined for this registry name.
+        self.parent.register_package(entry_point.dist.project_name)
         module_names = self.parent.package_module_map[
             entry_point.dist.project_name]
         for module_name in module_names:
-            module = calmjs_base._import_module(module_name)
+            module = self.parent.load_module(module_name, entry_point)
             self._register_entry_point_module(entry_point, module)
 
     def store_records_for_package(self, entry_point, records):
@@ -260,17 +282,51 @@ class ModuleLoaderRegistry(BaseChildModuleRegistry):
         # loaders typically need the full path.
         return '%s!%s%s' % (prefix, modname, extension)
 
+    def _map_module_extensions(self, entry_point, module, extensions):
+        """
+        Return the mappings produced by the parent mapper for each of
+        the extensions, keyed by the extension.
+        """
+
+        kw = {} if self.prune is None else {'prune': self.prune}
+        if self.parent.mapper not in (mapper_es6, mapper_python):
+            # other mappers may not accept multiple extensions.
+            return {
+                extension: self.parent.mapper(
+                    module, entry_point, fext=extension, **kw)
+                for extension in extensions
+            }
+
+        fexts = set(extensions)
+        project_name = None
+        if entry_point.dist is not None:
+            project_name = entry_point.dist.project_name
+            fexts.update((getattr(self, '_batch_fexts', None) or {}).get(
+                project_name, ()))
+        batch_mappings = getattr(self, '_batch_mappings', None)
+        if batch_mappings is None:
+            return self.parent.mapper(module, entry_point, fext=fexts, **kw)
+        key = (project_name, module.__name__, frozenset(fexts))
+        if key not in batch_mappings:
+            batch_mappings[key] = self.parent.mapper(
+                module, entry_point, fext=fexts, **kw)
+        return batch_mappings[key]
+
     def _map_entry_point_module(self, entry_point, module):
         mapping = {}
         result = {module.__name__: mapping}
-        for extra in entry_point.extras:
-            # since extras cannot contain leading '.', the full filename
-            # extension must be built.
-            extension = '.' + extra
+        # since extras cannot contain leading '.', the full filename
+        # extensions must be built.
+        extensions = ['.' + extra for extra in entry_point.extras]
+        mappings = self._map_module_extensions(
+            entry_point, module, extensions)
+        for extension in extensions:
             mapping.update({
                 self.generate_complete_modname(
                     entry_point.name, modname, extension): targetpath
-                for modname, targetpath in self.parent.mapper(
-                    module, entry_point, fext=extension).items()
+                for modname, targetpath in mappings[extension].items()
             })
         return result
+
+    def snapshot_paths(self, entry_point, module):
+        return modpath_pkg_resources(module, entry_point)
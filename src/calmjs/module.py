@@ -15,6 +15,7 @@ from calmjs.base import BaseModuleRegistry
 from calmjs.base import BaseChildModuleRegistry
 from calmjs.indexer import mapper_es6
 from calmjs.indexer import mapper_python
+from calmjs.indexer import modpath_pkg_resources
 
 logger = logging.getLogger(__name__)
 
@@ -54,8 +55,14 @@ class ModuleRegistry(BaseModuleRegistry):
         self.mapper = mapper_es6
 
     def _map_entry_point_module(self, entry_point, module):
+        if self.prune is not None:
+            return {module.__name__: self.mapper(
+                module, entry_point, prune=self.prune)}
         return {module.__name__: self.mapper(module, entry_point)}
 
+    def snapshot_paths(self, entry_point, module):
+        return modpath_pkg_resources(module, entry_point)
+
 
 class PythonicModuleRegistry(ModuleRegistry):
     """
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling helpers for the calmjs runtime.
+"""
+
+from __future__ import absolute_import
+
+import cProfile
+import logging
+import pstats
+from contextlib import contextmanager
+
+try:  # pragma: no cover
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    # not available for Python 2.
+    tracemalloc = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Collector(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, s):
+        self.chunks.append(s)
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+def _report_cpu(profiler, cpu_file, top):
+    profiler.dump_stats(cpu_file)
+    logger.info("wrote cpu profile to '%s'", cpu_file)
+    if not top:
+        return
+    stream = _Collector()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(top)
+    logger.info(
+        'top %d functions by cumulative time:\n%s', top, stream.getvalue())
+
+
+def _report_mem(snapshot, mem_file, top):
+    snapshot.dump(mem_file)
+    logger.info("wrote tracemalloc snapshot to '%s'", mem_file)
+    if not top:
+        return
+    logger.info('top %d allocations by line:\n%s', top, '\n'.join(
+        str(stat) for stat in snapshot.statistics('lineno')[:top]))
+
+
+@contextmanager
+def profile(cpu_file=None, mem_file=None, top=None):
+    """
+    Profile the execution of the context, writing the cProfile stats
+    to cpu_file and the tracemalloc snapshot to mem_file, if specified.
+    If top is specified, summaries of the top entries will be logged.
+    """
+
+    profiler = None
+    started_tracemalloc = False
+    if mem_file:
+        if tracemalloc is None:
+            logger.warning(
+                'tracemalloc is unavailable; memory profile will not be '
+                'written to %s', mem_file)
+            mem_file = None
+        elif not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracemalloc = True
+    if cpu_file:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _report_cpu(profiler, cpu_file, top)
+        if mem_file:
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            _report_mem(snapshot, mem_file, top)
@@ -144,3 +144,21 @@ _inst = Registry(__name__)  # __name__ == calmjs.registry
 
 def get(registry_name):
     return _inst.get(registry_name)
+
+
+def discard(condition):
+    """
+    Discard the constructed registries for which the condition returns
+    true from the root registry, such that they will be constructed
+    again when they are next requested.  Returns the names of the
+    registries that were discarded.
+    """
+
+    names = sorted(
+        name for name, registry in _inst.records.items()
+        if registry is not _inst and condition(registry)
+    )
+    for name in names:
+        logger.debug("discarding registry '%s'", name)
+        _inst.records.pop(name)
+    return names
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Disk-backed storage for the results produced by the compile step.
+
+For builds that involve a very large number of modules, the mappings of
+module names to their compiled paths may be held in a ResultStore, such
+that they are written out to a sqlite database as they are produced
+and read back lazily by the steps that follow.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import shutil
+from collections import MutableMapping
+from os.path import join
+from tempfile import mkdtemp
+from threading import Lock
+
+try:  # pragma: no cover
+    import sqlite3
+except ImportError:  # pragma: no cover
+    # Python may be built without sqlite3.
+    sqlite3 = None
+
+logger = logging.getLogger(__name__)
+
+# the number of rows fetched for each query done while iterating.
+_page_size = 1000
+
+
+class StoredMapping(MutableMapping):
+    """
+    A mapping of string keys to JSON serializable values held inside a
+    ResultStore, which iterates in the order of insertion.
+    """
+
+    def __init__(self, store, ident):
+        self.store = store
+        self.ident = ident
+
+    def __getitem__(self, key):
+        row = self.store._fetchone(
+            'SELECT value FROM results WHERE mapping = ? AND key = ?',
+            (self.ident, key),
+        )
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self.store._set(self.ident, key, json.dumps(value))
+
+    def __delitem__(self, key):
+        if not self.store._execute(
+                'DELETE FROM results WHERE mapping = ? AND key = ?',
+                (self.ident, key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.store._fetchone(
+            'SELECT 1 FROM results WHERE mapping = ? AND key = ?',
+            (self.ident, key),
+        ) is not None
+
+    def __iter__(self):
+        rowid = 0
+        while True:
+            rows = self.store._fetchall(
+                'SELECT rowid, key FROM results WHERE mapping = ? AND '
+                'rowid > ? ORDER BY rowid LIMIT ?',
+                (self.ident, rowid, _page_size),
+            )
+            for rowid, key in rows:
+                yield key
+            if len(rows) < _page_size:
+                return
+
+    def __len__(self):
+        return self.store._fetchone(
+            'SELECT COUNT(*) FROM results WHERE mapping = ?', (self.ident,),
+        )[0]
+
+    def __repr__(self):
+        return '<%s %d of %r>' % (
+            type(self).__name__, self.ident, self.store)
+
+    def release(self):
+        """
+        Remove all the values held by this mapping from the store.
+        """
+
+        self.store._execute(
+            'DELETE FROM results WHERE mapping = ?', (self.ident,))
+
+
+class ResultStore(object):
+    """
+    A sqlite database, located at path (or inside a temporary directory
+    that will be removed on close), that holds the StoredMapping
+    instances provided by the mapping method.
+    """
+
+    def __init__(self, path=None):
+        if sqlite3 is None:
+            raise RuntimeError('sqlite3 is unavailable')
+        self.tempdir = None
+        if path is None:
+            self.tempdir = mkdtemp()
+            path = join(self.tempdir, 'results.sqlite')
+        self.path = path
+        self._lock = Lock()
+        # the results do not need to survive a crash, so durability is
+        # traded for speed.
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode = OFF')
+        self._conn.execute('PRAGMA synchronous = OFF')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'mapping INTEGER, key TEXT, value TEXT, UNIQUE (mapping, key))'
+        )
+        self._count = self._conn.execute(
+            'SELECT MAX(mapping) FROM results').fetchone()[0] or 0
+
+    def __repr__(self):
+        return '<%s %r>' % (type(self).__name__, self.path)
+
+    def _execute(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _fetchone(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _set(self, ident, key, value):
+        with self._lock:
+            # an update is attempted first such that existing keys will
+            # retain their position, as with dicts.
+            if not self._conn.execute(
+                    'UPDATE results SET value = ? WHERE mapping = ? AND '
+                    'key = ?', (value, ident, key)).rowcount:
+                self._conn.execute(
+                    'INSERT INTO results (mapping, key, value) '
+                    'VALUES (?, ?, ?)', (ident, key, value))
+
+    def mapping(self):
+        """
+        Return a new, empty StoredMapping held by this store.
+        """
+
+        with self._lock:
+            self._count += 1
+            ident = self._count
+        return StoredMapping(self, ident)
+
+    def close(self):
+        """
+        Close the database, removing it if it was created in a
+        temporary directory.
+        """
+
+        with self._lock:
+            self._conn.close()
+        if self.tempdir:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+            self.tempdir = None
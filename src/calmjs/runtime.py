@@ -8,13 +8,19 @@ from __future__ import absolute_import
 import warnings
 import logging
 import re
+import shutil
 import sys
+import time
 from collections import namedtuple
 from functools import partial
 from argparse import Action
 from argparse import SUPPRESS
 from inspect import currentframe
+from os.path import dirname
 from os.path import exists
+from os.path import isdir
+from os.path import join
+from tempfile import mkdtemp
 
 from pkg_resources import working_set as default_working_set
 
@@ -27,23 +33,51 @@ from calmjs.argparse import ATTR_ROOT_PKG
 from calmjs.argparse import metavar
 from calmjs.artifact import ArtifactBuilder
 from calmjs.artifact import ARTIFACT_REGISTRY_NAME
+from calmjs.base import BaseChildModuleRegistry
+from calmjs.base import BaseModuleRegistry
+from calmjs.cache import ASTCache
+from calmjs.cache import DigestCache
+from calmjs.epindex import iter_entry_points
 from calmjs.exc import RuntimeAbort
+from calmjs.profiling import profile
+from calmjs.registry import discard as discard_registries
 from calmjs.toolchain import Spec
 from calmjs.toolchain import ToolchainCancel
 from calmjs.toolchain import ADVICE_PACKAGES
+from calmjs.toolchain import AST_CACHE
 from calmjs.toolchain import AFTER_PREPARE
 from calmjs.toolchain import BUILD_DIR
+from calmjs.toolchain import BUILD_DIR_ROOT
+from calmjs.toolchain import BUILD_FS
+from calmjs.toolchain import BUILD_FS_SPILL_LIMIT
+from calmjs.toolchain import BUILD_PLAN
+from calmjs.toolchain import BUILD_PLAN_FILE
+from calmjs.toolchain import BUNDLE_MATERIALIZE
+from calmjs.toolchain import CHECKPOINT
 from calmjs.toolchain import CALMJS_MODULE_REGISTRY_NAMES
 from calmjs.toolchain import CALMJS_LOADERPLUGIN_REGISTRY_NAME
+from calmjs.toolchain import COMPILE_CACHE_DIR
+from calmjs.toolchain import COMPILE_JOBS
+from calmjs.toolchain import COMPILE_RESULT_STORE
+from calmjs.toolchain import COMPILE_TASK_JOBS
 from calmjs.toolchain import DEBUG
+from calmjs.toolchain import DIGEST_CACHE
+from calmjs.toolchain import DRY_RUN
+from calmjs.toolchain import ENTRY_MODULE_NAMES
 from calmjs.toolchain import EXPORT_TARGET
 from calmjs.toolchain import EXPORT_TARGET_OVERWRITE
+from calmjs.toolchain import PRUNE_UNREACHABLE
+from calmjs.toolchain import RESUME_FROM
+from calmjs.toolchain import TOOLCHAIN_STEPS
 from calmjs.toolchain import SOURCE_PACKAGE_NAMES
+from calmjs.toolchain import TRACE_FILE
 from calmjs.toolchain import WORKING_DIR
 from calmjs.ui import prompt_overwrite_json
 from calmjs.ui import prompt
+from calmjs.utils import materialize_strategies
 from calmjs.utils import pretty_logging
 from calmjs.utils import pdb_post_mortem
+from calmjs.utils import stat_snapshot
 
 CALMJS = 'calmjs'
 CALMJS_RUNTIME = 'calmjs.runtime'
@@ -51,6 +85,13 @@ CALMJS_RUNTIME_ARTIFACT = 'calmjs.runtime.artifact'
 logger = logging.getLogger(__name__)
 DEST_ACTION = 'action'
 DEST_RUNTIME = 'runtime'
+DEST_PROFILE_CPU = 'profile_cpu'
+DEST_PROFILE_MEM = 'profile_mem'
+DEST_PROFILE_TOP = 'profile_top'
+DEST_WATCH = 'watch'
+DEST_WATCH_INTERVAL = 'watch_interval'
+# default number of seconds between the polling of the watched files.
+WATCH_INTERVAL = 0.5
 
 levels = {
     -2: logging.CRITICAL,
@@ -251,6 +292,20 @@ class BaseRuntime(BootstrapRuntime):
         self.global_opts.add_argument(
             '-V', '--version', action=Version, default=0,
             help="print version information")
+        self.global_opts.add_argument(
+            '--profile-cpu', default=SUPPRESS, dest=DEST_PROFILE_CPU,
+            metavar=metavar('file'),
+            help="write the cProfile statistics of the run to file")
+        self.global_opts.add_argument(
+            '--profile-mem', default=SUPPRESS, dest=DEST_PROFILE_MEM,
+            metavar=metavar('file'),
+            help="write the tracemalloc snapshot taken at the end of the run "
+                 "to file")
+        self.global_opts.add_argument(
+            '--profile-top', default=SUPPRESS, dest=DEST_PROFILE_TOP,
+            type=int, metavar=metavar('count'),
+            help="log the specified number of top entries from the enabled "
+                 "profiles")
 
     def run(self, argparser=None, **kwargs):
         """
@@ -368,7 +423,11 @@ class BaseRuntime(BootstrapRuntime):
                 if extras:
                     self.unrecognized_arguments_error(args, parsed, extras)
                 kwargs = vars(parsed)
-                return self.run(argparser=self.argparser, **kwargs)
+                with profile(
+                        cpu_file=kwargs.pop(DEST_PROFILE_CPU, None),
+                        mem_file=kwargs.pop(DEST_PROFILE_MEM, None),
+                        top=kwargs.pop(DEST_PROFILE_TOP, None)):
+                    return self.run(argparser=self.argparser, **kwargs)
             except KeyboardInterrupt:
                 logger.critical('termination requested; aborted.')
             except Exception as e:
@@ -466,8 +525,9 @@ class Runtime(BaseRuntime):
         return inst
 
     def iter_entry_points(self):
-        for entry_point in sorted(self.working_set.iter_entry_points(
-                self.entry_point_group), key=lambda e: e.name):
+        for entry_point in sorted(iter_entry_points(
+                self.working_set, self.entry_point_group),
+                key=lambda e: e.name):
             yield entry_point
 
     def init_argparser(self, argparser):
@@ -831,6 +891,227 @@ class ToolchainRuntime(DriverRuntime):
             metavar=metavar(BUILD_DIR), help=help,
         )
 
+    def init_argparser_build_dir_root(
+            self, argparser, help=(
+                'the root directory for managed build directories; if '
+                'specified without a build directory, one that is derived '
+                'from the inputs for the build will be created inside it '
+                'and be retained for reuse by subsequent builds'
+            )):
+        """
+        For setting up the root directory for managed build directories.
+        """
+
+        argparser.add_argument(
+            '--build-dir-root', default=None, dest=BUILD_DIR_ROOT,
+            metavar=metavar(BUILD_DIR_ROOT), help=help,
+        )
+
+    def init_argparser_compile_cache_dir(
+            self, argparser, help=(
+                'the directory for a persistent cache of compiled outputs; '
+                'if specified, sources that are unchanged from a previous '
+                'build will have their outputs reused from this cache '
+                'rather than being compiled again'
+            )):
+        """
+        For setting up the compile cache directory.
+        """
+
+        argparser.add_argument(
+            '--compile-cache-dir', default=None, dest=COMPILE_CACHE_DIR,
+            metavar=metavar(COMPILE_CACHE_DIR), help=help,
+        )
+
+    def init_argparser_compile_jobs(
+            self, argparser, default=None, help=(
+                'the number of workers to use for processing the entries '
+                'for each of the compile steps; if left unspecified, the '
+                'entries will be processed sequentially'
+            )):
+        """
+        For setting up the number of compile workers.
+        """
+
+        argparser.add_argument(
+            '--jobs', default=default, dest=COMPILE_JOBS, type=int,
+            metavar=metavar('jobs'), help=help,
+        )
+
+    def init_argparser_compile_task_jobs(
+            self, argparser, default=None, help=(
+                'the number of workers to use for executing the compile '
+                'steps that are independent of each other concurrently; if '
+                'left unspecified, the steps will be executed sequentially'
+            )):
+        """
+        For setting up the number of compile task graph workers.
+        """
+
+        argparser.add_argument(
+            '--task-jobs', default=default, dest=COMPILE_TASK_JOBS, type=int,
+            metavar=metavar('jobs'), help=help,
+        )
+
+    def init_argparser_bundle_materialize(
+            self, argparser, default=None, help=(
+                'a comma separated list of strategies, in the order of '
+                'preference, for materializing the bundled sources into the '
+                'build directory; may be any of hardlink, reflink, symlink '
+                'or copy, with copy being the default and the final fallback'
+            )):
+        """
+        For setting up the bundle materialization strategies.
+        """
+
+        argparser.add_argument(
+            '--bundle-materialize', default=default, required=False,
+            dest=BUNDLE_MATERIALIZE, action=StoreDelimitedList,
+            choices=sorted(materialize_strategies),
+            metavar='<strategy>[,<strategy>[...]]',
+            help=help
+        )
+
+    def init_argparser_build_fs(
+            self, argparser, help=(
+                'the filesystem backend for the intermediate files written '
+                'into the build directory; memory will hold them in memory '
+                'until they are flushed to disk before the link step, which '
+                'only avoids writing the files not required by the link '
+                'step of the toolchain'
+            )):
+        """
+        For setting up the build filesystem backend.
+        """
+
+        argparser.add_argument(
+            '--build-fs', default=None, dest=BUILD_FS, choices=('memory',),
+            help=help,
+        )
+        argparser.add_argument(
+            '--build-fs-spill-limit', default=None, dest=BUILD_FS_SPILL_LIMIT,
+            type=int, metavar=metavar('bytes'), help=(
+                'the total size of the files to be held by the memory build '
+                'filesystem, beyond which they will be written to disk'
+            ),
+        )
+
+    def init_argparser_compile_result_store(
+            self, argparser, help=(
+                'the store for the results of the compile step; sqlite will '
+                'write them to a temporary database as they are produced, '
+                'for builds with a very large number of modules'
+            )):
+        """
+        For setting up the store for compile results.
+        """
+
+        argparser.add_argument(
+            '--compile-result-store', default=None, dest=COMPILE_RESULT_STORE,
+            choices=('sqlite',), help=help,
+        )
+
+    def init_argparser_dry_run(
+            self, argparser, help=(
+                'only run the prepare step and determine the entries for '
+                'the compile step without writing anything, then output the '
+                'resulting build plan'
+            )):
+        """
+        For setting up the dry run and the build plan output.
+        """
+
+        argparser.add_argument(
+            '--dry-run', default=False, dest=DRY_RUN, action='store_true',
+            help=help,
+        )
+        argparser.add_argument(
+            '--build-plan', default=None, dest=BUILD_PLAN_FILE,
+            metavar=metavar('file'),
+            help='write the build plan from the dry run to the specified '
+                 'file instead of stdout',
+        )
+
+    def init_argparser_checkpoint(
+            self, argparser, help=(
+                'write a checkpoint into the build directory after each '
+                'step of the toolchain, such that a subsequent run with the '
+                'same build directory may resume from a later step'
+            )):
+        """
+        For setting up the checkpoint and resume options.
+        """
+
+        argparser.add_argument(
+            '--checkpoint', default=False, dest=CHECKPOINT,
+            action='store_true', help=help,
+        )
+        argparser.add_argument(
+            '--resume-from', default=None, dest=RESUME_FROM,
+            choices=TOOLCHAIN_STEPS, metavar=metavar('step'),
+            help='resume the toolchain execution from the specified step, '
+                 'using the checkpoint written into the build directory by '
+                 'a previous run; one of: %s' % ', '.join(TOOLCHAIN_STEPS),
+        )
+
+    def init_argparser_prune_unreachable(
+            self, argparser, help=(
+                'only compile the modules that are reachable through the '
+                'imports of the entry modules (as specified by '
+                '--entry-modules, or the modules to be transpiled from the '
+                'source packages otherwise)'
+            )):
+        """
+        For setting up the pruning of the unreachable modules.
+        """
+
+        argparser.add_argument(
+            '--prune-unreachable', default=False, dest=PRUNE_UNREACHABLE,
+            action='store_true', help=help,
+        )
+        argparser.add_argument(
+            '--entry-modules', default=None, dest=ENTRY_MODULE_NAMES,
+            action=StoreDelimitedList, metavar=metavar('modname'),
+            help='comma separated list of the entry module names for the '
+                 'pruning of unreachable modules; defaults to the modules '
+                 'to be transpiled from the source packages, as the module '
+                 'names being exported are not yet known when pruning',
+        )
+
+    def init_argparser_trace(
+            self, argparser, help=(
+                'write the timing of the steps, advices and compile entries '
+                'of the toolchain execution to the specified file, in the '
+                'Chrome trace event format'
+            )):
+        """
+        For setting up the trace file.
+        """
+
+        argparser.add_argument(
+            '--trace', default=None, dest=TRACE_FILE,
+            metavar=metavar('file'), help=help,
+        )
+
+    def init_argparser_watch(
+            self, argparser, help=(
+                'after the build, watch the source files for changes and '
+                'rebuild when they are modified, until interrupted'
+            )):
+        """
+        For setting up the watch mode.
+        """
+
+        argparser.add_argument(
+            '--watch', default=False, dest=DEST_WATCH, action='store_true',
+            help=help,
+        )
+        argparser.add_argument(
+            '--watch-interval', default=WATCH_INTERVAL,
+            dest=DEST_WATCH_INTERVAL, type=float, metavar=metavar('seconds'),
+            help='the number of seconds between the checks for changes',
+        )
+
     def init_argparser_optional_advice(
             self, argparser, default=[], help=(
                 'a comma separated list of packages to retrieve optional '
@@ -866,6 +1147,18 @@ class ToolchainRuntime(DriverRuntime):
         self.init_argparser_export_target(argparser)
         self.init_argparser_working_dir(argparser)
         self.init_argparser_build_dir(argparser)
+        self.init_argparser_build_dir_root(argparser)
+        self.init_argparser_compile_cache_dir(argparser)
+        self.init_argparser_compile_jobs(argparser)
+        self.init_argparser_compile_task_jobs(argparser)
+        self.init_argparser_bundle_materialize(argparser)
+        self.init_argparser_build_fs(argparser)
+        self.init_argparser_compile_result_store(argparser)
+        self.init_argparser_watch(argparser)
+        self.init_argparser_trace(argparser)
+        self.init_argparser_dry_run(argparser)
+        self.init_argparser_prune_unreachable(argparser)
+        self.init_argparser_checkpoint(argparser)
         self.init_argparser_optional_advice(argparser)
 
     def check_export_target_exists(self, spec):
@@ -906,6 +1199,9 @@ class ToolchainRuntime(DriverRuntime):
 
     def prepare_spec_export_target_checks(self, spec, **kwargs):
         spec[EXPORT_TARGET_OVERWRITE] = kwargs.get(EXPORT_TARGET_OVERWRITE)
+        if kwargs.get(DRY_RUN):
+            # the export target will not be written.
+            return
         spec.advise(AFTER_PREPARE, self.check_export_target_exists, spec)
 
     def prepare_spec_advice_packages(self, spec, **kwargs):
@@ -945,11 +1241,134 @@ class ToolchainRuntime(DriverRuntime):
         self.prepare_spec(spec, **kwargs)
         return spec
 
-    def run(self, argparser=None, **kwargs):
-        spec = self.kwargs_to_spec(**kwargs)
-        self.toolchain(spec)
+    def watch_paths(self, spec):
+        """
+        Return the paths to the source files and directories that the
+        build for the spec was derived from.
+        """
+
+        suffix = getattr(self.toolchain, 'sourcepath_suffix', '_sourcepath')
+        paths = set()
+        for key, value in spec.items():
+            if key.endswith(suffix) and isinstance(value, dict):
+                paths.update(value.values())
+        return paths
+
+    def watch_dirs(self, paths):
+        """
+        Return the directories containing the source files at paths,
+        such that the addition of new module files to them may be
+        detected.
+        """
+
+        return set(dirname(path) for path in paths if not isdir(path))
+
+    def reload_module_registries(self):
+        """
+        Discard the module registries that have been constructed, such
+        that they will be constructed again with the module files that
+        are currently present.
+        """
+
+        return discard_registries(lambda registry: isinstance(
+            registry, (BaseModuleRegistry, BaseChildModuleRegistry)))
+
+    def watch(self, spec, interval=WATCH_INTERVAL, **kwargs):
+        """
+        Poll the source files of the spec (and the directories that
+        contain them) and rebuild using a new spec created from the
+        kwargs when they are modified, until interrupted.  Returns the
+        spec of the final build.
+
+        The toolchain remain loaded between builds, as do the registries
+        unless files were added to or removed from the directories of
+        the modules.  As the build directory, the compile cache and the
+        ast cache are also retained, only the entries with modified
+        sources will be compiled again before the remaining steps of
+        the toolchain.  If a DigestCache was provided, the snapshot of
+        the sources is reused for it such that only the modified sources
+        will be hashed again.
+        """
+
+        paths = self.watch_paths(spec)
+        dirs = self.watch_dirs(paths)
+        snapshot = stat_snapshot(paths, dirs)
+        logger.info(
+            'watching %d file(s) for changes; interrupt to stop',
+            len(snapshot),
+        )
+        try:
+            while True:
+                time.sleep(interval)
+                current = stat_snapshot(paths, dirs)
+                if current == snapshot:
+                    continue
+                changed = sorted(
+                    path for path in set(snapshot) | set(current)
+                    if snapshot.get(path) != current.get(path)
+                )
+                snapshot = current
+                logger.info(
+                    'rebuilding as %d file(s) changed: %s',
+                    len(changed), ', '.join(changed),
+                )
+                if dirs.intersection(changed):
+                    logger.info(
+                        'reloading module registries as the contents of '
+                        'the module directories changed'
+                    )
+                    self.reload_module_registries()
+                digest_cache = kwargs.get(DIGEST_CACHE)
+                if isinstance(digest_cache, DigestCache):
+                    digest_cache.update(current)
+                spec = self.kwargs_to_spec(**kwargs)
+                try:
+                    self.toolchain(spec)
+                except Exception as e:
+                    # continue watching for the fix.
+                    logger.error('rebuild failed: %s: %s', type(e).__name__, e)
+                    continue
+                # sources may have been added or removed.
+                new_paths = self.watch_paths(spec)
+                if new_paths and new_paths != paths:
+                    paths = new_paths
+                    dirs = self.watch_dirs(paths)
+                    snapshot = stat_snapshot(paths, dirs)
+        except KeyboardInterrupt:
+            logger.info('watch terminated')
         return spec
 
+    def run(self, argparser=None, **kwargs):
+        watch = kwargs.pop(DEST_WATCH, False)
+        interval = kwargs.pop(DEST_WATCH_INTERVAL, WATCH_INTERVAL)
+        if not watch or kwargs.get(DRY_RUN):
+            spec = self.kwargs_to_spec(**kwargs)
+            self.toolchain(spec)
+            if BUILD_PLAN in spec and not spec.get(BUILD_PLAN_FILE):
+                sys.stdout.write(self.toolchain.dumps(spec[BUILD_PLAN]))
+                sys.stdout.write('\n')
+            return spec
+
+        # retain the build directory and caches between the builds.
+        tempdir = None
+        if not kwargs.get(BUILD_DIR) and not kwargs.get(BUILD_DIR_ROOT):
+            tempdir = mkdtemp()
+            kwargs[BUILD_DIR_ROOT] = tempdir
+        if not kwargs.get(COMPILE_CACHE_DIR):
+            tempdir = tempdir or mkdtemp()
+            kwargs[COMPILE_CACHE_DIR] = join(tempdir, 'cache')
+        kwargs[AST_CACHE] = ASTCache()
+        kwargs[DIGEST_CACHE] = DigestCache()
+        try:
+            spec = self.kwargs_to_spec(**kwargs)
+            self.toolchain(spec)
+            # the export target is expected to be rewritten.
+            kwargs[EXPORT_TARGET_OVERWRITE] = True
+            return self.watch(spec, interval=interval, **kwargs)
+        finally:
+            if tempdir:
+                shutil.rmtree(tempdir, ignore_errors=True)
+
 
 class ArtifactRuntime(RequiredCommandRuntime):
     """
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Persisted snapshots of the records produced by the module registries.
+
+The production of the records for a module registry requires the
+globbing of the directories of every module declared for it.  If the
+environment variable ``CALMJS_CACHE_DIR`` is set, the records derived
+for each of the entry points will be written to a snapshot for that
+registry along with the modification times of the directories they
+were derived from, such that subsequent executions only need to glob
+the directories that have been changed.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import time
+from os import stat
+from os import walk
+from os.path import join
+from os.path import relpath
+from os.path import sep
+
+from calmjs.cache import digest_values
+from calmjs.cache import write_json_atomic
+from calmjs.epindex import CALMJS_CACHE_DIR
+from calmjs.indexer import RACY_MTIME_WINDOW
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIRNAME = 'registry'
+
+
+def dir_stamps(paths, prune=None):
+    """
+    Return a dict of the modification times of the directories at paths
+    and all the directories within them, except for the ones pruned by
+    the PruneRules.
+    """
+
+    stamps = {}
+    for path in paths:
+        for root, dirnames, filenames in walk(path):
+            try:
+                stamps[root] = stat(root).st_mtime
+            except OSError:
+                continue
+            if prune is not None:
+                dirnames[:] = [
+                    dirname for dirname in dirnames if not prune.prunes(
+                        relpath(join(root, dirname), path).replace(sep, '/'))
+                ]
+    return stamps
+
+
+def stamps_valid(stamps):
+    """
+    Check that the directories in stamps have not been modified.
+    """
+
+    for path, mtime in stamps.items():
+        try:
+            if stat(path).st_mtime != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class RegistrySnapshot(object):
+    """
+    The entries of records for a registry, stored at path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(path) as fd:
+                entries = json.load(fd)
+        except (IOError, OSError, ValueError):
+            return
+        if isinstance(entries, dict):
+            self.entries = entries
+
+    def get(self, key):
+        """
+        Return the records for key, if their directories have not been
+        modified since they were stored.
+        """
+
+        entry = self.entries.get(key)
+        if not isinstance(entry, dict) or not stamps_valid(
+                entry.get('stamps', {})):
+            return None
+        return entry.get('records')
+
+    def set(self, key, records, stamps):
+        """
+        Store the records for key, along with the stamps of the
+        directories they were derived from.
+        """
+
+        if stamps and time.time() - max(stamps.values()) < RACY_MTIME_WINDOW:
+            return False
+        try:
+            json.dumps(records)
+        except (TypeError, ValueError):
+            return False
+        self.entries[key] = {'records': records, 'stamps': stamps}
+        self.dirty = True
+        return True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            write_json_atomic(self.path, self.entries)
+        except (IOError, OSError) as e:
+            logger.warning(
+                "failed to write registry snapshot '%s': %s", self.path, e)
+        else:
+            self.dirty = False
+
+
+def registry_snapshot(registry):
+    """
+    Return the RegistrySnapshot for the registry, or None if the cache
+    directory was not specified.
+    """
+
+    cache_dir = os.environ.get(CALMJS_CACHE_DIR)
+    if not cache_dir:
+        return None
+    cls = type(registry)
+    name = digest_values(
+        '%s:%s' % (cls.__module__, cls.__name__), registry.registry_name)
+    return RegistrySnapshot(
+        join(cache_dir, SNAPSHOT_DIRNAME, name[:32] + '.json'))
+
+
+def entry_point_key(entry_point, module_name, prune=None):
+    """
+    The key for the records of the module_name produced through the
+    entry_point, with the directories pruned by the PruneRules.
+    """
+
+    dist = entry_point.dist
+    return digest_values(str(entry_point), module_name, [
+        dist.key, dist.version, dist.location] if dist else None,
+        repr(prune) if prune is not None else None)
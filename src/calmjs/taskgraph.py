@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+A minimal task graph executor.
+
+Units of work are added as named tasks along with the names of the
+tasks they require, such that the graph may be executed in an order
+that satisfies those requirements, with the tasks that are independent
+of each other optionally executed concurrently by a pool of workers.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import sys
+from multiprocessing.pool import ThreadPool
+from threading import Condition
+
+from calmjs.trace import trace_span
+
+logger = logging.getLogger(__name__)
+
+
+class TaskGraph(object):
+    """
+    A collection of named tasks and their requirements.
+    """
+
+    def __init__(self, tracer=None):
+        self.tracer = tracer
+        self.tasks = {}
+        self.requires = {}
+        # the order which the tasks were added, which is also the order
+        # they will be executed in if there are no other constraints.
+        self.names = []
+
+    def add(self, name, f, requires=()):
+        """
+        Add a task under name, where f is a callable that accepts no
+        arguments, which will only be called after all the tasks named
+        in requires have completed.
+        """
+
+        if name in self.tasks:
+            raise ValueError("task '%s' already defined" % (name,))
+        self.tasks[name] = f
+        self.requires[name] = tuple(requires)
+        self.names.append(name)
+
+    def order(self):
+        """
+        Return the names of all tasks in an order that satisfies their
+        requirements, preferring the order which they were added.
+        Raises ValueError for requirements that are undefined or cyclic.
+        """
+
+        for name in self.names:
+            for required in self.requires[name]:
+                if required not in self.tasks:
+                    raise ValueError(
+                        "task '%s' requires undefined task '%s'" % (
+                            name, required))
+
+        result = []
+        done = set()
+        pending = list(self.names)
+        while pending:
+            ready = [
+                name for name in pending
+                if done.issuperset(self.requires[name])
+            ]
+            if not ready:
+                raise ValueError(
+                    'tasks %s have cyclic requirements' % (
+                        ', '.join("'%s'" % name for name in pending)))
+            # only take the first ready task such that the resulting
+            # order stays as close to the order of addition as possible.
+            name = ready[0]
+            result.append(name)
+            done.add(name)
+            pending.remove(name)
+        return result
+
+    def _execute(self, name):
+        with trace_span(self.tracer, name, 'task'):
+            return self.tasks[name]()
+
+    def run(self, jobs=None):
+        """
+        Execute all the tasks, using a pool of the specified number of
+        workers if jobs is greater than one, and return a dict of the
+        values returned by each task, keyed by their names.
+
+        The first exception raised by a task will be reraised once the
+        tasks that are running have completed, and no further tasks
+        will be started.
+        """
+
+        order = self.order()
+        if not (isinstance(jobs, int) and jobs > 1):
+            return {name: self._execute(name) for name in order}
+        return self._run_pool(order, jobs)
+
+    def _run_pool(self, order, jobs):
+        position = {name: idx for idx, name in enumerate(order)}
+        remaining = {name: set(self.requires[name]) for name in order}
+        dependents = {}
+        for name in order:
+            for required in remaining[name]:
+                dependents.setdefault(required, []).append(name)
+
+        results = {}
+        completed = []
+        condition = Condition()
+
+        def execute(name):
+            try:
+                outcome = (name, None, self._execute(name))
+            except BaseException:
+                outcome = (name, sys.exc_info(), None)
+            with condition:
+                completed.append(outcome)
+                condition.notify()
+
+        logger.debug(
+            "executing %d tasks using %d workers", len(order), jobs)
+        pool = ThreadPool(jobs)
+        failure = None
+        running = 0
+        ready = [name for name in order if not remaining[name]]
+        try:
+            while True:
+                if failure is None:
+                    for name in sorted(ready, key=position.get):
+                        pool.apply_async(execute, (name,))
+                        running += 1
+                ready = []
+                if not running:
+                    break
+                with condition:
+                    while not completed:
+                        condition.wait()
+                    outcomes = list(completed)
+                    completed[:] = []
+                for name, exc_info, value in outcomes:
+                    running -= 1
+                    if exc_info is not None:
+                        if failure is None:
+                            failure = exc_info
+                        continue
+                    results[name] = value
+                    for dependent in dependents.get(name, ()):
+                        remaining[dependent].discard(name)
+                        if not remaining[dependent]:
+                            ready.append(dependent)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        if failure is not None:
+            raise failure[1]
+        return results
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import unittest
 import os
+import sys
 from os.path import join
 from os.path import normcase
 from os.path import pathsep
@@ -11,11 +12,15 @@ from pkg_resources import WorkingSet
 from pkg_resources import safe_name
 
 from calmjs import base
+from calmjs.indexer import mapper_es6
+from calmjs.module import ModuleRegistry
 from calmjs.utils import pretty_logging
 from calmjs.testing import mocks
 from calmjs.testing.utils import mkdtemp
 from calmjs.testing.utils import create_fake_bin
 from calmjs.testing.utils import make_dummy_dist
+from calmjs.testing.utils import stub_item_attr_value
+from calmjs.testing.utils import stub_os_environ
 
 
 class DummyModuleRegistry(base.BaseModuleRegistry):
@@ -24,6 +29,14 @@ class DummyModuleRegistry(base.BaseModuleRegistry):
         return {module.__name__: {module.__name__: module}}
 
 
+class LazyDummyModuleRegistry(DummyModuleRegistry):
+    lazy = True
+
+
+class LocatingDummyModuleRegistry(DummyModuleRegistry):
+    import_modules = False
+
+
 class PackageKeyMappingTestCase(unittest.TestCase):
     """
     The package key mapping test cases
@@ -271,6 +284,249 @@ class BaseModuleRegistryTestCase(unittest.TestCase):
         self.assertEqual(
             1, len(registry.get_records_for_package('unsafe_name')))
 
+    def make_lazy_working_set(self):
+        make_dummy_dist(self, ((
+            'entry_points.txt',
+            '[modules]\n'
+            'calmjs.testing.module1 = calmjs.testing.module1\n'
+        ),), 'alpha_pkg', '1.0')
+        make_dummy_dist(self, ((
+            'entry_points.txt',
+            '[modules]\n'
+            'calmjs.testing.module2 = calmjs.testing.module2\n'
+            'calmjs.testing.not_a_module = calmjs.testing.not_a_module\n'
+        ),), 'beta', '1.0')
+        return WorkingSet([self._calmjs_testing_tmpdir])
+
+    def test_lazy_get_records_for_package(self):
+        from calmjs.testing import module1
+        working_set = self.make_lazy_working_set()
+        with pretty_logging(stream=mocks.StringIO()) as s:
+            registry = LazyDummyModuleRegistry(
+                'modules', _working_set=working_set)
+            self.assertEqual(3, len(registry.pending_entry_points))
+            self.assertEqual({}, registry.records)
+            self.assertEqual(
+                {'calmjs.testing.module1': module1},
+                registry.get_records_for_package('alpha_pkg'),
+            )
+        self.assertNotIn('ImportError', s.getvalue())
+        self.assertEqual(['calmjs.testing.module1'], list(registry.records))
+        self.assertEqual(2, len(registry.pending_entry_points))
+
+        with pretty_logging(stream=mocks.StringIO()) as s:
+            self.assertEqual(
+                ['calmjs.testing.module1', 'calmjs.testing.module2'],
+                [name for name, record in registry.iter_records()],
+            )
+        self.assertIn(
+            'ImportError: calmjs.testing.not_a_module not found',
+            s.getvalue())
+        self.assertEqual([], registry.pending_entry_points)
+
+    def test_lazy_get_record(self):
+        from calmjs.testing import module2
+        working_set = self.make_lazy_working_set()
+        registry = LazyDummyModuleRegistry(
+            'modules', _working_set=working_set)
+        self.assertEqual(
+            {'calmjs.testing.module2': module2},
+            registry.get_record('calmjs.testing.module2'),
+        )
+        self.assertEqual(2, len(registry.pending_entry_points))
+        # records not provided by any entry point will register all.
+        with pretty_logging(stream=mocks.StringIO()):
+            self.assertEqual({}, registry.get_record('calmjs.testing'))
+        self.assertEqual([], registry.pending_entry_points)
+
+    def test_lazy_get_record_es6_names(self):
+        working_set = self.make_lazy_working_set()
+        registry = ModuleRegistry(
+            'modules', _working_set=working_set, lazy=True)
+        # the names produced by the es6 mapper for module1.
+        for i in range(2):
+            self.assertEqual({}, registry.get_record(
+                'calmjs/testing/module1/hello'))
+            self.assertEqual(2, len(registry.pending_entry_points))
+        self.assertEqual(['calmjs.testing.module1'], list(registry.records))
+        # the remaining entry points for module2 stay unloaded.
+        self.assertEqual([
+            'calmjs.testing.module2', 'calmjs.testing.not_a_module',
+        ], sorted(ep.module_name for ep in registry.pending_entry_points))
+        self.assertEqual(
+            ['calmjs/testing/module1/hello'],
+            sorted(registry.get_record('calmjs.testing.module1')),
+        )
+
+    def test_lazy_argument(self):
+        working_set = self.make_lazy_working_set()
+        registry = DummyModuleRegistry(
+            'modules', _working_set=working_set, lazy=True)
+        self.assertTrue(registry.lazy)
+        self.assertEqual(3, len(registry.pending_entry_points))
+        self.assertEqual({}, registry.records)
+
+        with pretty_logging(stream=mocks.StringIO()):
+            registry = LazyDummyModuleRegistry(
+                'modules', _working_set=working_set, lazy=False)
+        self.assertEqual([], registry.pending_entry_points)
+        self.assertEqual(2, len(registry.records))
+
+    def test_lazy_environ(self):
+        stub_os_environ(self)
+        working_set = self.make_lazy_working_set()
+        os.environ[base.CALMJS_LAZY_REGISTRY] = '1'
+        registry = ModuleRegistry('modules', _working_set=working_set)
+        self.assertEqual(3, len(registry.pending_entry_points))
+        self.assertEqual(
+            ['calmjs/testing/module1/hello'],
+            sorted(registry.get_records_for_package('alpha_pkg')),
+        )
+        self.assertEqual(2, len(registry.pending_entry_points))
+
+        # explicitly disabled.
+        os.environ[base.CALMJS_LAZY_REGISTRY] = '0'
+        with pretty_logging(stream=mocks.StringIO()):
+            registry = ModuleRegistry('modules', _working_set=working_set)
+        self.assertEqual([], registry.pending_entry_points)
+
+    def test_lazy_manual_entrypoint(self):
+        working_set = mocks.WorkingSet({'modules': [
+            'calmjs.testing.module1 = calmjs.testing.module1',
+        ]}, dist=None)
+        with pretty_logging(stream=mocks.StringIO()):
+            registry = LazyDummyModuleRegistry(
+                'modules', _working_set=working_set)
+        # registered immediately as there are no packages to defer to.
+        self.assertEqual([], registry.pending_entry_points)
+        self.assertEqual(['calmjs.testing.module1'], list(registry.records))
+
+
+@unittest.skipIf(base.find_spec is None, 'importlib.util.find_spec missing')
+class LocateModuleTestCase(unittest.TestCase):
+    """
+    Test the location of modules without importing them.
+    """
+
+    def setUp(self):
+        root = mkdtemp(self)
+        # a package that cannot be executed, with a subpackage.
+        self.pkg_dir = join(root, 'calmjs_locate_pkg')
+        os.makedirs(join(self.pkg_dir, 'sub'))
+        with open(join(self.pkg_dir, '__init__.py'), 'w') as fd:
+            fd.write('raise Exception("executed")\n')
+        with open(join(self.pkg_dir, 'sub', '__init__.py'), 'w') as fd:
+            fd.write('raise Exception("executed")\n')
+        with open(join(self.pkg_dir, 'plain.py'), 'w') as fd:
+            fd.write('raise Exception("executed")\n')
+        # a namespace package.
+        self.ns_dir = join(root, 'calmjs_locate_ns')
+        os.makedirs(self.ns_dir)
+
+        stub_item_attr_value(self, sys, 'path', [root] + sys.path)
+        self.addCleanup(sys.path_importer_cache.pop, root, None)
+
+    def assertNotImported(self):
+        self.assertFalse([
+            name for name in sys.modules if name.startswith('calmjs_locate')
+        ])
+
+    def test_locate_module(self):
+        module = base._locate_module('calmjs_locate_pkg')
+        self.assertEqual('calmjs_locate_pkg', module.__name__)
+        self.assertEqual([self.pkg_dir], module.__path__)
+        self.assertEqual(join(self.pkg_dir, '__init__.py'), module.__file__)
+
+        module = base._locate_module('calmjs_locate_pkg.sub')
+        self.assertEqual([join(self.pkg_dir, 'sub')], module.__path__)
+
+        module = base._locate_module('calmjs_locate_pkg.plain')
+        self.assertFalse(hasattr(module, '__path__'))
+        self.assertNotImported()
+
+    def test_locate_module_imported(self):
+        self.assertIs(base._locate_module('calmjs.base'), base)
+
+    def test_locate_module_missing(self):
+        with self.assertRaises(ImportError):
+            base._locate_module('calmjs_locate_pkg.missing')
+        with self.assertRaises(ImportError):
+            base._locate_module('calmjs_locate_pkg.plain.missing')
+        with self.assertRaises(ImportError):
+            base._locate_module('calmjs_locate_missing')
+        self.assertNotImported()
+
+    def test_locate_module_namespace(self):
+        module = base._locate_module('calmjs_locate_ns')
+        self.assertEqual([self.ns_dir], module.__path__)
+
+        entry_point = EntryPoint.parse('calmjs_locate_ns = calmjs_locate_ns')
+        entry_point.dist = Distribution(project_name='ns', version='1.0')
+        stub_item_attr_value(
+            self, base, 'resource_filename_mod_entry_point',
+            lambda module_name, entry_point, module: '/located/' + module_name)
+        module = base._locate_module('calmjs_locate_ns', entry_point)
+        self.assertEqual(['/located/calmjs_locate_ns'], module.__path__)
+        self.assertNotImported()
+
+    def test_registry_locating(self):
+        registry = LocatingDummyModuleRegistry(__name__)
+        with pretty_logging(stream=mocks.StringIO()) as stream:
+            registry.register_entry_points([
+                EntryPoint.parse('pkg = calmjs_locate_pkg.sub'),
+                EntryPoint.parse('missing = calmjs_locate_missing'),
+            ])
+        self.assertIn(
+            'ImportError: calmjs_locate_missing not found', stream.getvalue())
+        self.assertEqual(
+            ['calmjs_locate_pkg.sub'], [k for k, v in registry.iter_records()])
+        self.assertNotImported()
+
+    def test_module_registry_locating(self):
+        # the real mapper for the module registry, which resolves the
+        # paths of the modules through pkg_resources.
+        with open(join(self.pkg_dir, 'index.js'), 'w') as fd:
+            fd.write('')
+        with open(join(self.pkg_dir, 'sub', 'mod.js'), 'w') as fd:
+            fd.write('')
+
+        class LocatingModuleRegistry(ModuleRegistry):
+            import_modules = False
+
+        registry = LocatingModuleRegistry(__name__)
+        self.assertIs(registry.mapper, mapper_es6)
+        missing = EntryPoint.parse('sub = calmjs_locate_pkg.sub')
+        missing.dist = Distribution(
+            project_name='calmjs_locate_missing_dist', version='1.0')
+        with pretty_logging(stream=mocks.StringIO()) as stream:
+            registry.register_entry_points([
+                # without a distribution.
+                EntryPoint.parse('pkg = calmjs_locate_pkg'),
+                # with a distribution that cannot be found.
+                missing,
+            ])
+        self.assertIn(
+            "distribution 'calmjs-locate-missing-dist 1.0' not found",
+            stream.getvalue())
+        self.assertNotIn('executed', stream.getvalue())
+        self.assertEqual({
+            'calmjs_locate_pkg/index': join(self.pkg_dir, 'index.js'),
+        }, registry.get_record('calmjs_locate_pkg'))
+        self.assertEqual({
+            'calmjs_locate_pkg/sub/mod': join(self.pkg_dir, 'sub', 'mod.js'),
+        }, registry.get_record('calmjs_locate_pkg.sub'))
+        self.assertNotImported()
+
+    def test_registry_importing(self):
+        registry = DummyModuleRegistry(__name__)
+        with pretty_logging(stream=mocks.StringIO()) as stream:
+            registry.register_entry_points([
+                EntryPoint.parse('pkg = calmjs_locate_pkg.sub'),
+            ])
+        self.addCleanup(sys.modules.pop, 'calmjs_locate_pkg', None)
+        self.assertIn('executed', stream.getvalue())
+        self.assertEqual([], list(registry.iter_records()))
+
 
 class BaseExternalModuleRegistryTestCase(unittest.TestCase):
     """
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import unittest
+import os
+from os.path import exists
+from os.path import join
+
+from calmjs.buildfs import BuildFS
+from calmjs.buildfs import MemoryBuildFS
+
+from calmjs.testing.utils import mkdtemp
+
+
+class BuildFSTestCase(unittest.TestCase):
+
+    def test_disk(self):
+        root = mkdtemp(self)
+        fs = BuildFS(root)
+        with fs.open(join(root, 'a.js'), 'w') as fd:
+            fd.write(u'var a = 1;')
+        self.assertTrue(exists(join(root, 'a.js')))
+        self.assertEqual([], fs.flush())
+
+
+class MemoryBuildFSTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp(self)
+
+    def test_write_read_flush(self):
+        fs = MemoryBuildFS(self.root)
+        target = join(self.root, 'nested', 'a.js')
+        with fs.open(target, 'w') as fd:
+            fd.write(u'var a = ')
+            fd.write(u'"☃";')
+        self.assertFalse(exists(target))
+        self.assertEqual(14, fs.size)
+        with fs.open(target) as fd:
+            self.assertEqual(u'var a = "☃";', fd.read())
+
+        self.assertEqual([target], fs.flush([join('nested', 'a.js')]))
+        self.assertEqual(0, fs.size)
+        with fs.open(target) as fd:
+            self.assertEqual(u'var a = "☃";', fd.read())
+
+    def test_outside_root(self):
+        fs = MemoryBuildFS(self.root)
+        other = mkdtemp(self)
+        with fs.open(join(other, 'a.js'), 'w') as fd:
+            fd.write(u'var a = 1;')
+        self.assertTrue(exists(join(other, 'a.js')))
+        self.assertEqual({}, fs.files)
+
+    def test_spill(self):
+        fs = MemoryBuildFS(self.root, spill_limit=10)
+        with fs.open(join(self.root, 'a.js'), 'w') as fd:
+            fd.write(u'var a = 1;')
+        with fs.open(join(self.root, 'b.js'), 'w') as fd:
+            fd.write(u'var b = 1;')
+        self.assertFalse(exists(join(self.root, 'a.js')))
+        self.assertTrue(exists(join(self.root, 'b.js')))
+
+        # rewriting a held file releases the previous size.
+        with fs.open(join(self.root, 'a.js'), 'w') as fd:
+            fd.write(u'var a=2;')
+        self.assertEqual(8, fs.size)
+        self.assertFalse(exists(join(self.root, 'a.js')))
+
+    def test_other_modes_flushes(self):
+        fs = MemoryBuildFS(self.root)
+        target = join(self.root, 'a.js')
+        with fs.open(target, 'w') as fd:
+            fd.write(u'var a = 1;')
+        with fs.open(target, 'a') as fd:
+            fd.write(u'\n')
+        self.assertEqual({}, fs.files)
+        with open(target) as fd:
+            self.assertEqual('var a = 1;\n', fd.read())
+
+    def test_flush_all(self):
+        fs = MemoryBuildFS(self.root)
+        for name in ('a.js', 'b.js'):
+            with fs.open(join(self.root, name), 'w') as fd:
+                fd.write(u'')
+        self.assertEqual(2, len(fs.flush()))
+        self.assertEqual(['a.js', 'b.js'], sorted(os.listdir(self.root)))
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import os
+import socket
+from os import utime
+from os.path import exists
+from os.path import join
+
+from calmjs import cache
+from calmjs.cache import ASTCache
+from calmjs.cache import CompileCache
+from calmjs.parse.parsers.es5 import parse
+from calmjs.utils import pretty_logging
+
+from calmjs.testing.mocks import StringIO
+from calmjs.testing.utils import mkdtemp
+
+
+class DigestTestCase(unittest.TestCase):
+
+    def test_file_digest(self):
+        target = join(mkdtemp(self), 'file')
+        with open(target, 'wb') as fd:
+            fd.write(b'hello')
+        self.assertEqual(
+            '2cf24dba5fb0a30e26e83b2ac5b9e29e'
+            '1b161e5c1fa7425e73043362938b9824',
+            cache.file_digest(target),
+        )
+
+    def test_digest_values(self):
+        self.assertEqual(
+            cache.digest_values('a', {'b': 1, 'c': 2}),
+            cache.digest_values('a', {'c': 2, 'b': 1}),
+        )
+        self.assertNotEqual(
+            cache.digest_values('a', 'b'),
+            cache.digest_values('ab'),
+        )
+
+    def test_write_json_atomic(self):
+        target = join(mkdtemp(self), 'sub', 'file.json')
+        cache.write_json_atomic(target, {'a': 1})
+        cache.write_json_atomic(target, {'a': 2})
+        with open(target) as fd:
+            self.assertEqual({'a': 2}, json.load(fd))
+
+
+class ASTCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp(self)
+
+    def write(self, name, text):
+        target = join(self.tmpdir, name)
+        with open(target, 'w') as fd:
+            fd.write(text)
+        return target
+
+    def test_parse_reuse(self):
+        target = self.write('a.js', 'var a = 1;\n')
+        ast_cache = ASTCache()
+        tree = ast_cache.parse(parse, target)
+        self.assertEqual(tree.sourcepath, target)
+        self.assertIs(tree, ast_cache.parse(parse, target))
+        self.assertEqual(1, ast_cache.hits)
+        self.assertEqual(1, ast_cache.misses)
+        self.assertEqual(11, ast_cache.size)
+
+        # a different parser is tracked separately.
+        ast_cache.parse(lambda text: parse(text), target)
+        self.assertEqual(2, ast_cache.misses)
+
+    def test_parse_modified(self):
+        target = self.write('a.js', 'var a = 1;\n')
+        ast_cache = ASTCache()
+        tree = ast_cache.parse(parse, target)
+        self.write('a.js', 'var a = 12;\n')
+        stat = os.stat(target)
+        utime(target, (stat.st_atime, stat.st_mtime + 1))
+        self.assertIsNot(tree, ast_cache.parse(parse, target))
+        self.assertEqual(12, ast_cache.size)
+
+    def test_parse_evict(self):
+        a = self.write('a.js', 'var a = 1;\n')
+        b = self.write('b.js', 'var b = 1;\n')
+        ast_cache = ASTCache(max_bytes=20)
+        tree_a = ast_cache.parse(parse, a)
+        ast_cache.parse(parse, b)
+        self.assertEqual(11, ast_cache.size)
+        self.assertIsNot(tree_a, ast_cache.parse(parse, a))
+        self.assertEqual(3, ast_cache.misses)
+
+        ast_cache.clear()
+        self.assertEqual(0, ast_cache.size)
+
+
+class DigestCacheTestCase(unittest.TestCase):
+
+    def test_digest(self):
+        path = join(mkdtemp(self), 'file.js')
+        with open(path, 'w') as fd:
+            fd.write('a')
+        utime(path, (1000000000, 1000000000))
+        digest_cache = cache.DigestCache()
+        self.assertEqual(cache.file_digest(path), digest_cache.digest(path))
+        self.assertEqual(cache.file_digest(path), digest_cache.digest(path))
+        self.assertEqual(1, digest_cache.hits)
+        self.assertEqual(1, digest_cache.misses)
+
+        with open(path, 'w') as fd:
+            fd.write('b')
+        utime(path, (1000000001, 1000000001))
+        self.assertEqual(cache.file_digest(path), digest_cache.digest(path))
+        self.assertEqual(2, digest_cache.misses)
+
+    def test_digest_update_stamps(self):
+        path = join(mkdtemp(self), 'file.js')
+        with open(path, 'w') as fd:
+            fd.write('a')
+        utime(path, (1000000000, 1000000000))
+        digest_cache = cache.DigestCache()
+        digest = digest_cache.digest(path)
+        with open(path, 'w') as fd:
+            fd.write('b')
+        # the provided stamps are trusted as is.
+        digest_cache.update({path: (1, 1000000000)})
+        self.assertEqual(digest, digest_cache.digest(path))
+        digest_cache.update({path: (1, 1000000001)})
+        self.assertNotEqual(digest, digest_cache.digest(path))
+
+    def test_digest_racy(self):
+        path = join(mkdtemp(self), 'file.js')
+        with open(path, 'w') as fd:
+            fd.write('a')
+        digest_cache = cache.DigestCache()
+        digest_cache.digest(path)
+        digest_cache.digest(path)
+        # recently modified files are always hashed again.
+        self.assertEqual(2, digest_cache.misses)
+
+
+class CompileCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = mkdtemp(self)
+        self.build_dir = mkdtemp(self)
+        with open(join(self.build_dir, 'target.js'), 'w') as fd:
+            fd.write('target')
+
+    def test_store_restore(self):
+        compile_cache = CompileCache(self.cache_dir)
+        self.assertFalse(compile_cache.restore('abcdef', self.build_dir))
+        compile_cache.store('abcdef', self.build_dir, ['target.js'])
+        compile_cache.save()
+
+        compile_cache = CompileCache(self.cache_dir)
+        build_dir = mkdtemp(self)
+        self.assertTrue(compile_cache.restore('abcdef', build_dir))
+        with open(join(build_dir, 'target.js')) as fd:
+            self.assertEqual('target', fd.read())
+        self.assertEqual(1, compile_cache.hits)
+        self.assertEqual(0, compile_cache.misses)
+
+    def test_store_no_blobs(self):
+        compile_cache = CompileCache(self.cache_dir)
+        compile_cache.store(
+            'abcdef', self.build_dir, ['target.js'], blobs=False)
+        self.assertTrue(compile_cache.restore('abcdef', self.build_dir))
+        self.assertFalse(compile_cache.restore('abcdef', mkdtemp(self)))
+
+    def test_save_evict_max_entries(self):
+        compile_cache = CompileCache(self.cache_dir, max_entries=1)
+        compile_cache.store('aaaaaa', self.build_dir, ['target.js'])
+        compile_cache.store('bbbbbb', self.build_dir, ['target.js'])
+        compile_cache.entries['aaaaaa']['used'] = 0
+        compile_cache.save()
+        self.assertEqual(['bbbbbb'], sorted(compile_cache.entries))
+        self.assertFalse(exists(compile_cache._blob_dir('aaaaaa')))
+        self.assertTrue(exists(compile_cache._blob_dir('bbbbbb')))
+
+        compile_cache = CompileCache(self.cache_dir)
+        self.assertEqual(['bbbbbb'], sorted(compile_cache.entries))
+
+    def test_save_evict_max_bytes(self):
+        compile_cache = CompileCache(self.cache_dir, max_bytes=6)
+        compile_cache.store('aaaaaa', self.build_dir, ['target.js'])
+        compile_cache.store(
+            'bbbbbb', self.build_dir, ['target.js'], blobs=False)
+        compile_cache.store('cccccc', self.build_dir, ['target.js'])
+        compile_cache.entries['aaaaaa']['used'] = 0
+        compile_cache.entries['bbbbbb']['used'] = 0.5
+        compile_cache.entries['cccccc']['used'] = 1
+        compile_cache.save()
+        # records without copies take no space, so evicting the oldest
+        # record with copies is sufficient.
+        self.assertEqual(
+            ['bbbbbb', 'cccccc'], sorted(compile_cache.entries))
+
+    def test_restore_marks_used(self):
+        compile_cache = CompileCache(self.cache_dir)
+        compile_cache.store('abcdef', self.build_dir, ['target.js'])
+        compile_cache.entries['abcdef']['used'] = 0
+        compile_cache.save()
+        self.assertTrue(compile_cache.restore('abcdef', self.build_dir))
+        self.assertNotEqual(0, compile_cache.entries['abcdef']['used'])
+
+    def test_save_unchanged(self):
+        compile_cache = CompileCache(self.cache_dir)
+        compile_cache.save()
+        self.assertFalse(exists(join(self.cache_dir, 'manifest.json')))
+
+    def test_load_invalid(self):
+        with open(join(self.cache_dir, 'manifest.json'), 'w') as fd:
+            fd.write('{')
+        compile_cache = CompileCache(self.cache_dir)
+        with pretty_logging(stream=StringIO()) as s:
+            self.assertEqual({}, compile_cache.entries)
+        self.assertIn('failed to load compile cache manifest', s.getvalue())
+
+    def test_load_incompatible_version(self):
+        with open(join(self.cache_dir, 'manifest.json'), 'w') as fd:
+            json.dump({'version': 0, 'entries': {'a': {}}}, fd)
+        compile_cache = CompileCache(self.cache_dir)
+        self.assertEqual({}, compile_cache.entries)
+
+
+class BuildDirLockTestCase(unittest.TestCase):
+
+    def test_acquire_release(self):
+        path = join(mkdtemp(self), '.lock')
+        lock = cache.BuildDirLock(path)
+        self.assertTrue(lock.acquire())
+        self.assertTrue(exists(path))
+        self.assertTrue(lock.is_locked())
+        # another lock on the same path will time out.
+        self.assertFalse(cache.BuildDirLock(path).acquire(timeout=0))
+        lock.release()
+        self.assertFalse(exists(path))
+        # releasing again is harmless.
+        lock.release()
+
+    def test_stale_lock_by_age(self):
+        path = join(mkdtemp(self), '.lock')
+        with open(path, 'w') as fd:
+            fd.write('elsewhere 1')
+        lock = cache.BuildDirLock(path, stale=3600)
+        self.assertFalse(lock.is_stale())
+        utime(path, (0, 0))
+        self.assertTrue(lock.is_stale())
+        with pretty_logging(stream=StringIO()) as s:
+            self.assertTrue(lock.acquire(timeout=0))
+        self.assertIn('removing stale lock file', s.getvalue())
+
+    def test_break_stale_replaced(self):
+        path = join(mkdtemp(self), '.lock')
+        with open(path, 'w') as fd:
+            fd.write('elsewhere 1')
+        utime(path, (0, 0))
+        lock = cache.BuildDirLock(path, stale=3600)
+        identity = lock._identity()
+        self.assertTrue(lock.is_stale())
+
+        # another process took over the stale lock in the meantime.
+        os.remove(path)
+        other = cache.BuildDirLock(path, stale=3600)
+        self.assertTrue(other.acquire(timeout=0))
+        with pretty_logging(stream=StringIO()) as s:
+            lock._break_stale(identity)
+        self.assertIn('restoring it', s.getvalue())
+        self.assertTrue(exists(path))
+        self.assertEqual([], [
+            name for name in os.listdir(os.path.dirname(path))
+            if name.endswith('.stale')])
+        self.assertFalse(lock.acquire(timeout=0))
+        other.release()
+        self.assertTrue(lock.acquire(timeout=0))
+        lock.release()
+
+    def test_break_stale_taken(self):
+        path = join(mkdtemp(self), '.lock')
+        lock = cache.BuildDirLock(path)
+        # nothing to move aside.
+        lock._break_stale((0, 0))
+        self.assertFalse(exists(path))
+
+    def test_stale_lock_by_pid(self):
+        if os.name != 'posix':
+            self.skipTest('process probing only supported on posix')
+        path = join(mkdtemp(self), '.lock')
+        with open(path, 'w') as fd:
+            fd.write('%s %d' % (socket.gethostname(), os.getpid()))
+        self.assertFalse(cache.BuildDirLock(path).is_stale())
+
+
+class ManagedBuildDirTestCase(unittest.TestCase):
+
+    def test_acquire_managed_build_dir(self):
+        root = mkdtemp(self)
+        build_dir, lock = cache.acquire_managed_build_dir(root, 'abc')
+        self.assertEqual(join(root, 'abc', 'build'), build_dir)
+        self.assertTrue(exists(build_dir))
+        self.assertIsNone(
+            cache.acquire_managed_build_dir(root, 'abc', timeout=0))
+        lock.release()
+        build_dir2, lock = cache.acquire_managed_build_dir(root, 'abc')
+        self.assertEqual(build_dir, build_dir2)
+        lock.release()
+
+    def test_prune_build_dirs(self):
+        root = mkdtemp(self)
+        for name in ['a', 'b', 'c', 'd']:
+            os.makedirs(join(root, name, 'build'))
+        os.makedirs(join(root, 'unmanaged'))
+        # mark the oldest one as in use.
+        lock = cache.BuildDirLock(join(root, 'a', '.lock'))
+        lock.acquire()
+        for idx, name in enumerate(['a', 'b', 'c', 'd']):
+            utime(join(root, name), (idx, idx))
+        removed = cache.prune_build_dirs(root, retention=1)
+        self.assertEqual(
+            sorted([join(root, 'b'), join(root, 'c')]), sorted(removed))
+        self.assertTrue(exists(join(root, 'a')))
+        self.assertTrue(exists(join(root, 'd')))
+        self.assertTrue(exists(join(root, 'unmanaged')))
+        lock.release()
+
+    def test_prune_build_dirs_missing_root(self):
+        self.assertEqual([], cache.prune_build_dirs(
+            join(mkdtemp(self), 'missing')))
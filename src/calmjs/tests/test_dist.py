@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import unittest
 import json
+import os
 import sys
 import textwrap
 from os.path import join
@@ -14,6 +15,7 @@ import pkg_resources
 
 from calmjs.module import ModuleRegistry
 from calmjs import dist as calmjs_dist
+from calmjs.indexer import CALMJS_MODULE_INDEX_JSON
 from calmjs.cli import locale
 from calmjs.utils import pretty_logging
 from calmjs.testing.mocks import Mock_egg_info
@@ -208,6 +210,96 @@ class DistTestCase(unittest.TestCase):
         calmjs_dist.write_line_list('field', ei, self.pkgname, self.pkgname)
         self.assertEqual(ei.called[self.pkgname], None)
 
+    def setup_module_index_registries(self):
+        from calmjs.registry import _inst
+        from calmjs.loaderplugin import ModuleLoaderRegistry
+        regid = 'calmjs.module.dummy.index'
+
+        def cleanup():
+            _inst.records.pop(regid, None)
+            _inst.records.pop(regid + '.loader', None)
+        self.addCleanup(cleanup)
+
+        _inst.records[regid] = ModuleRegistry(regid)
+        _inst.records[regid + '.loader'] = ModuleLoaderRegistry(
+            regid + '.loader')
+        return regid
+
+    def test_write_module_index(self):
+        regid = self.setup_module_index_registries()
+        root = mkdtemp(self)
+        pkg_dir = join(root, 'src', 'dummyidx')
+        os.makedirs(join(pkg_dir, 'sub'))
+        for name in ('index.js', 'data.txt', 'module.py', 'sub/mod.js'):
+            with open(join(pkg_dir, *name.split('/')), 'w') as fd:
+                fd.write('')
+
+        self.dist.package_dir = {'': join(root, 'src')}
+        self.dist.entry_points = {
+            regid: ['dummyidx = dummyidx', 'missing = missing'],
+            regid + '.loader': ['text = text[txt]'],
+            'other': ['other = other'],
+        }
+        ei = Mock_egg_info(self.dist)
+        ei.initialize_options()
+        with pretty_logging(stream=StringIO()) as fd:
+            calmjs_dist.write_module_index(
+                ei, CALMJS_MODULE_INDEX_JSON,
+                CALMJS_MODULE_INDEX_JSON)
+        self.assertIn(
+            "directory for module 'missing' not found", fd.getvalue())
+        self.assertEqual({
+            'extensions': ['.js', '.txt'],
+            'modules': {
+                'dummyidx': {
+                    'origin': calmjs_dist.path_origin(pkg_dir),
+                    'paths': ['data.txt', 'index.js', 'sub/mod.js'],
+                },
+            },
+        }, json.loads(ei.called[CALMJS_MODULE_INDEX_JSON]))
+
+    def test_write_module_index_build_lib(self):
+        regid = self.setup_module_index_registries()
+        root = mkdtemp(self)
+        pkg_dir = join(root, 'src', 'dummyidx')
+        build_dir = join(root, 'build', 'lib', 'dummyidx')
+        os.makedirs(join(pkg_dir, 'excluded'))
+        os.makedirs(build_dir)
+        # the built package lacks the files excluded from the package
+        # data, but has the files generated during build_py.
+        for name in ('index.js', 'excluded/test.js'):
+            with open(join(pkg_dir, *name.split('/')), 'w') as fd:
+                fd.write('')
+        for name in ('index.js', 'generated.js'):
+            with open(join(build_dir, name), 'w') as fd:
+                fd.write('')
+
+        self.dist.package_dir = {'': join(root, 'src')}
+        self.dist.entry_points = {regid: ['dummyidx = dummyidx']}
+        index = calmjs_dist.build_module_index(
+            self.dist, lambda name: join(root, 'src', name),
+            join(root, 'build', 'lib'),
+        )
+        self.assertEqual({
+            'extensions': ['.js'],
+            'modules': {
+                'dummyidx': {
+                    # still the origin of the sources.
+                    'origin': calmjs_dist.path_origin(pkg_dir),
+                    'paths': ['generated.js', 'index.js'],
+                },
+            },
+        }, index)
+
+    def test_write_module_index_delete(self):
+        self.dist.entry_points = {'other': ['other = other']}
+        ei = Mock_egg_info(self.dist)
+        ei.initialize_options()
+        calmjs_dist.write_module_index(
+            ei, CALMJS_MODULE_INDEX_JSON,
+            CALMJS_MODULE_INDEX_JSON)
+        self.assertIsNone(ei.called[CALMJS_MODULE_INDEX_JSON])
+
     def test_find_pkg_dist(self):
         # Only really testing that this returns an actual distribution
         result = calmjs_dist.find_pkg_dist('setuptools')
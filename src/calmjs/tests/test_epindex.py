@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import os
+from os.path import exists
+from os.path import join
+
+import pkg_resources
+
+from calmjs import epindex
+from calmjs.base import BaseRegistry
+
+from calmjs.testing.mocks import WorkingSet
+from calmjs.testing.utils import make_dummy_dist
+from calmjs.testing.utils import mkdtemp
+from calmjs.testing.utils import stub_item_attr_value
+from calmjs.testing.utils import stub_os_environ
+
+
+class EntryPointIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dist_dir = mkdtemp(self)
+        self.cache_dir = mkdtemp(self)
+        self.write_dist((
+            '[calmjs.testing]\n'
+            'a = calmjs.testing.module1:a\n'
+            'b = calmjs.testing.module2:b\n'
+            '[other]\n'
+            'c = other:c\n'
+        ))
+        self.working_set = pkg_resources.WorkingSet([self.dist_dir])
+        stub_item_attr_value(
+            self, epindex, 'default_working_set', self.working_set)
+        stub_item_attr_value(self, epindex, '_indexes', {})
+        stub_os_environ(self)
+        os.environ[epindex.CALMJS_CACHE_DIR] = self.cache_dir
+
+    def write_dist(self, entry_points, version='1.0'):
+        make_dummy_dist(self, (
+            ('entry_points.txt', entry_points),
+        ), pkgname='dummy', version=version, working_dir=self.dist_dir)
+
+    def test_build_index(self):
+        self.assertEqual({
+            'calmjs.testing': [
+                ('dummy', 'a = calmjs.testing.module1:a'),
+                ('dummy', 'b = calmjs.testing.module2:b'),
+            ],
+            'other': [('dummy', 'c = other:c')],
+        }, epindex.build_index(self.working_set))
+
+    def test_iter_entry_points_indexed(self):
+        entry_points = list(epindex.iter_entry_points(
+            self.working_set, 'calmjs.testing'))
+        self.assertEqual(['a', 'b'], [ep.name for ep in entry_points])
+        self.assertEqual('dummy', entry_points[0].dist.project_name)
+        self.assertEqual(
+            ['b'], [ep.name for ep in epindex.iter_entry_points(
+                self.working_set, 'calmjs.testing', 'b')])
+        self.assertEqual([], list(epindex.iter_entry_points(
+            self.working_set, 'missing')))
+
+        path = join(self.cache_dir, epindex.INDEX_FILENAME)
+        self.assertTrue(exists(path))
+        with open(path) as fd:
+            index = json.load(fd)
+        self.assertEqual(epindex.index_key(self.working_set), index['key'])
+
+        # a new process will read the index instead of the metadata.
+        stub_item_attr_value(self, epindex, '_indexes', {})
+        stub_item_attr_value(self, epindex, 'build_index', None)
+        self.assertEqual(['c'], [ep.name for ep in epindex.iter_entry_points(
+            self.working_set, 'other')])
+
+    def test_iter_entry_points_invalidated(self):
+        key = epindex.index_key(self.working_set)
+        list(epindex.iter_entry_points(self.working_set, 'other'))
+        self.write_dist('[other]\nd = other:d\nc = other:c\n')
+        # as the distributions of the working set are loaded once.
+        working_set = pkg_resources.WorkingSet([self.dist_dir])
+        stub_item_attr_value(
+            self, epindex, 'default_working_set', working_set)
+        self.assertNotEqual(key, epindex.index_key(working_set))
+        self.assertEqual(['d', 'c'], [
+            ep.name for ep in epindex.iter_entry_points(working_set, 'other')
+        ])
+
+    def test_iter_entry_points_not_default(self):
+        working_set = WorkingSet({'calmjs.testing': [
+            'module = calmjs.testing.module1',
+        ]})
+        self.assertEqual(['module'], [
+            ep.name for ep in epindex.iter_entry_points(
+                working_set, 'calmjs.testing')])
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_iter_entry_points_disabled(self):
+        os.environ.pop(epindex.CALMJS_CACHE_DIR)
+        self.assertEqual(['a', 'b'], [
+            ep.name for ep in epindex.iter_entry_points(
+                self.working_set, 'calmjs.testing')])
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_registry(self):
+        registry = BaseRegistry(
+            'calmjs.testing', _working_set=self.working_set)
+        self.assertEqual(
+            ['a', 'b'], [ep.name for ep in registry.raw_entry_points])
+        self.assertTrue(exists(join(self.cache_dir, epindex.INDEX_FILENAME)))
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 import unittest
+import json
 import os
 import sys
+import time
 
 from os.path import exists
 from os.path import join
@@ -317,6 +319,65 @@ class IndexerTestCase(unittest.TestCase):
                 to_os_sep_path('calmjs/testing/module1/hello.js'),
         })
 
+    def test_module4_multiple_fext(self):
+        from calmjs.testing import module4
+        results = indexer.mapper_es6(
+            module4, calmjs_ep, fext=set(['.css', '.json', '.style']))
+        self.assertEqual({
+            '.css': {
+                'calmjs/testing/module4/other':
+                    to_os_sep_path('calmjs/testing/module4/other.css'),
+            },
+            '.json': {
+                'calmjs/testing/module4/data':
+                    to_os_sep_path('calmjs/testing/module4/data.json'),
+            },
+            '.style': {
+                'calmjs/testing/module4/widget':
+                    to_os_sep_path('calmjs/testing/module4/widget.style'),
+            },
+        }, {k: rp_calmjs(v) for k, v in results.items()})
+
+    def test_module2_multiple_fext_recursive_single_listing(self):
+        from calmjs.testing import module2
+        listed = []
+        scandir = indexer._scandir
+
+        def stub_scandir(root):
+            listed.append(root)
+            return scandir(root)
+
+        stub_item_attr_value(self, indexer, '_scandir', stub_scandir)
+        results = indexer.mapper(
+            module2, calmjs_ep, globber='recursive', fext=['.js', '.css'])
+        self.assertEqual({}, results['.css'])
+        self.assertEqual([
+            'calmjs/testing/module2/helper',
+            'calmjs/testing/module2/index',
+            'calmjs/testing/module2/mod/helper',
+        ], sorted(results['.js']))
+        # each directory (module2, mod, and __pycache__ if present) was
+        # only listed once.
+        self.assertEqual(len(listed), len(set(listed)))
+
+    def test_globber_scandir(self):
+        root = mkdtemp(self)
+        os.makedirs(join(root, 'sub'))
+        for name in ('a.js', 'b.css', '.hidden.js', 'c.txt', 'sub/d.js'):
+            with open(join(root, *name.split('/')), 'w') as fd:
+                fd.write('')
+
+        self.assertEqual([join(root, 'a.js')], list(
+            indexer.globber_scandir_root(root, '*.js')))
+        self.assertEqual([join(root, 'a.js'), join(root, 'b.css')], list(
+            indexer.globber_scandir_root(root, ('*.js', '*.css'))))
+        self.assertEqual([
+            join(root, '.hidden.js'), join(root, 'a.js'),
+            join(root, 'sub', 'd.js'),
+        ], list(indexer.globber_scandir_recursive(root, ['*.js'])))
+        self.assertEqual([], list(indexer.globber_scandir_recursive(
+            join(root, 'missing'), '*.js')))
+
     def test_module2_recursive_es6(self):
         from calmjs.testing import module2
         results = rp_calmjs(indexer.mapper(
@@ -394,3 +455,295 @@ class IndexerTestCase(unittest.TestCase):
             'calmjs.testing.module2.mod.helper':
                 to_os_sep_path('calmjs/testing/module2/mod/helper.js'),
         })
+
+
+class ListingCacheTestCase(unittest.TestCase):
+    """
+    Test the cache of directory listings used by the globbers.
+    """
+
+    def setUp(self):
+        self.cache = indexer.ListingCache()
+        stub_item_attr_value(self, indexer, 'listing_cache', self.cache)
+        self.root = mkdtemp(self)
+        os.makedirs(join(self.root, 'sub.js'))
+        for name in ('a.js', '.hidden.js', 'b.css'):
+            with open(join(self.root, name), 'w') as fd:
+                fd.write('')
+        self.set_mtime(1000000000)
+
+    def set_mtime(self, mtime):
+        os.utime(self.root, (mtime, mtime))
+
+    def test_listdir_cached(self):
+        entries = self.cache.listdir(self.root)
+        self.assertEqual([
+            ('.hidden.js', False, False),
+            ('a.js', False, False),
+            ('b.css', False, False),
+            ('sub.js', True, False),
+        ], entries)
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+        self.assertIs(entries, self.cache.listdir(self.root))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(
+            '<ListingCache hits=1 misses=1>', repr(self.cache))
+
+        self.cache.clear()
+        self.assertEqual({}, self.cache.listings)
+        self.assertEqual((0, 0), (self.cache.hits, self.cache.misses))
+
+    def test_listdir_invalidated(self):
+        self.cache.listdir(self.root)
+        with open(join(self.root, 'c.js'), 'w') as fd:
+            fd.write('')
+        self.set_mtime(1000000001)
+        self.assertIn(
+            ('c.js', False, False), self.cache.listdir(self.root))
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+
+    def test_listdir_racy(self):
+        self.set_mtime(int(time.time()))
+        self.cache.listdir(self.root)
+        self.assertEqual({}, self.cache.listings)
+        self.cache.listdir(self.root)
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+
+    def test_listdir_missing(self):
+        with self.assertRaises(OSError):
+            self.cache.listdir(join(self.root, 'missing'))
+
+    def test_listdir_bounded(self):
+        self.cache.max_entries = 2
+        dirs = []
+        for name in ('x', 'y', 'z'):
+            path = join(self.root, name)
+            os.mkdir(path)
+            os.utime(path, (1000000000, 1000000000))
+            dirs.append(path)
+        self.cache.listdir(dirs[0])
+        self.cache.listdir(dirs[1])
+        # the most recently used listing is retained.
+        self.cache.listdir(dirs[0])
+        self.cache.listdir(dirs[2])
+        self.assertEqual([dirs[0], dirs[2]], list(self.cache.listings))
+        self.assertEqual((1, 3), (self.cache.hits, self.cache.misses))
+        self.assertEqual(
+            indexer.LISTING_CACHE_MAX_ENTRIES,
+            indexer.ListingCache().max_entries)
+
+    def test_globber_root_subdirectory(self):
+        with open(join(self.root, 'sub.js', 'c.js'), 'w') as fd:
+            fd.write('')
+        self.assertEqual([join(self.root, 'sub.js', 'c.js')], list(
+            indexer.globber_root(self.root, join('sub.js', '*.js'))))
+        self.assertEqual([join(self.root, 'sub.js', 'c.js')], list(
+            indexer.globber_root(self.root, 'sub.js/*.js')))
+
+    def test_globbers_shared(self):
+        # as with glob, directories may be matched.
+        self.assertEqual([
+            join(self.root, 'a.js'), join(self.root, 'sub.js'),
+        ], list(indexer.globber_root(self.root, '*.js')))
+        self.assertEqual([join(self.root, '.hidden.js')], list(
+            indexer.globber_root(self.root, '.*')))
+        self.assertEqual([], list(
+            indexer.globber_root(join(self.root, 'missing'), '*.js')))
+        self.assertEqual([
+            join(self.root, '.hidden.js'), join(self.root, 'a.js'),
+        ], list(indexer.globber_recursive(self.root, '*.js')))
+        self.assertEqual([join(self.root, 'b.css')], list(
+            indexer.globber_scandir_root(self.root, '*.css')))
+        # the root was only read once, with sub.js read by the recursive
+        # globber.
+        self.assertEqual(2, self.cache.misses)
+        self.assertEqual(3, self.cache.hits)
+
+
+class PruneRulesTestCase(unittest.TestCase):
+    """
+    Test the pruning of directories from the recursive globbers.
+    """
+
+    def setUp(self):
+        self.cache = indexer.ListingCache()
+        stub_item_attr_value(self, indexer, 'listing_cache', self.cache)
+        self.root = mkdtemp(self)
+        for name in (
+                'index.js', 'lib/util.js', 'node_modules/dep/index.js',
+                '__pycache__/x.js', '.git/hooks/hook.js',
+                '.well-known/a.js', 'static/vendor/v.js'):
+            path = join(self.root, *name.split('/'))
+            if not exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as fd:
+                fd.write('')
+
+    def relpaths(self, paths):
+        return sorted(
+            relpath(path, self.root).replace(sep, '/') for path in paths)
+
+    def test_prune_rules(self):
+        rules = indexer.PruneRules(
+            exclude=('.*', 'static/vendor'), include=('.well-known',))
+        self.assertTrue(rules.prunes('.git'))
+        self.assertTrue(rules.prunes('lib/.cache'))
+        self.assertFalse(rules.prunes('.well-known'))
+        self.assertTrue(rules.prunes('static/vendor'))
+        self.assertFalse(rules.prunes('vendor'))
+        self.assertFalse(rules.prunes('static'))
+        self.assertTrue(rules.prunes_file('.git/hooks/hook.js'))
+        self.assertFalse(rules.prunes_file('.git.js'))
+        self.assertFalse(rules.prunes_file('.well-known/a.js'))
+        self.assertEqual(
+            "PruneRules(exclude=('.*', 'static/vendor'), "
+            "include=('.well-known',))", repr(rules))
+
+    def test_globber_recursive_default_prune(self):
+        self.assertEqual(7, len(list(
+            indexer.globber_recursive(self.root, '*.js'))))
+        self.cache.clear()
+        self.assertEqual([
+            'index.js', 'lib/util.js', 'static/vendor/v.js',
+        ], self.relpaths(indexer.globber_recursive(
+            self.root, '*.js', prune=indexer.DEFAULT_PRUNE_RULES)))
+        # the pruned directories were never listed.
+        self.assertEqual(4, self.cache.misses)
+
+    def test_globber_scandir_recursive_prune(self):
+        self.assertEqual([
+            '.well-known/a.js', 'index.js', 'lib/util.js',
+        ], self.relpaths(indexer.globber_scandir_recursive(
+            self.root, ('*.js',), prune=indexer.PruneRules(
+                exclude=('.*', 'node_modules', '__pycache__', 'static'),
+                include=('.well-known',)))))
+
+    def test_mapper_prune(self):
+        module = ModuleType('prunedmod')
+        module.__path__ = [self.root]
+        results = indexer.mapper(
+            module, None, modpath='all', globber='recursive',
+            prune=indexer.DEFAULT_PRUNE_RULES)
+        self.assertEqual([
+            'prunedmod/index', 'prunedmod/lib/util',
+            'prunedmod/static/vendor/v',
+        ], sorted(results))
+        # not applicable for globbers that do not recurse.
+        self.assertEqual(['prunedmod/index'], sorted(indexer.mapper(
+            module, None, modpath='all', globber='root',
+            prune=indexer.DEFAULT_PRUNE_RULES)))
+
+
+class ModuleIndexTestCase(unittest.TestCase):
+    """
+    Test the usage of the module index provided by distributions.
+    """
+
+    def setUp(self):
+        stub_item_attr_value(self, indexer, '_module_indexes', {})
+        root = mkdtemp(self)
+        self.pkg_dir = join(root, 'dummyidx')
+        os.makedirs(join(self.pkg_dir, 'sub'))
+        for name in (
+                'index.js', 'data.txt', '.hidden.js', 'sub/mod.js',
+                'unindexed.js'):
+            with open(join(self.pkg_dir, *name.split('/')), 'w') as fd:
+                fd.write('')
+
+        module = ModuleType('dummyidx')
+        module.__file__ = join(self.pkg_dir, '__init__.py')
+        module.__path__ = [self.pkg_dir]
+        self.addCleanup(sys.modules.pop, 'dummyidx')
+        sys.modules['dummyidx'] = module
+        self.module = module
+
+    def make_entry_point(self, origin='elsewhere', index=None):
+        if index is None:
+            # the listing omits a file that exists, to show that the
+            # index is used instead of the filesystem.
+            index = json.dumps({
+                'extensions': ['.js'],
+                'modules': {'dummyidx': {'origin': origin, 'paths': [
+                    '.hidden.js', 'index.js', 'sub/mod.js',
+                ]}},
+            })
+        dist = make_dummy_dist(self, (
+            (indexer.CALMJS_MODULE_INDEX_JSON, index),
+        ), 'dummyidx', '1.0', working_dir=mkdtemp(self))
+        entry_point = pkg_resources.EntryPoint.parse('dummyidx = dummyidx')
+        entry_point.dist = dist
+        return entry_point
+
+    def mapper(self, entry_point, **kw):
+        with pretty_logging(stream=StringIO()):
+            return sorted(indexer.mapper(self.module, entry_point, **kw))
+
+    def test_list_module_files(self):
+        self.assertEqual([
+            '.hidden.js', 'index.js', 'sub/mod.js', 'unindexed.js',
+        ], indexer.list_module_files(self.pkg_dir, ['.js']))
+        self.assertEqual([
+            '.hidden.js', 'data.txt', 'index.js', 'sub/mod.js',
+            'unindexed.js',
+        ], indexer.list_module_files(self.pkg_dir, ['.js', '.txt']))
+
+    def test_indexed_root(self):
+        self.assertEqual([
+            'dummyidx/index',
+        ], self.mapper(self.make_entry_point()))
+
+    def test_indexed_recursive(self):
+        self.assertEqual([
+            'dummyidx/.hidden', 'dummyidx/index', 'dummyidx/sub/mod',
+        ], self.mapper(self.make_entry_point(), globber='recursive'))
+
+    def test_indexed_extension_not_indexed(self):
+        self.assertEqual(['dummyidx/data'], self.mapper(
+            self.make_entry_point(), fext='.txt'))
+
+    def test_indexed_prune(self):
+        with pretty_logging(stream=StringIO()):
+            results = indexer.mapper(
+                self.module, self.make_entry_point(), globber='recursive',
+                prune=indexer.PruneRules(exclude=('sub',)))
+        self.assertEqual([
+            'dummyidx/.hidden', 'dummyidx/index',
+        ], sorted(results))
+
+    def test_indexed_develop_origin(self):
+        # the module is located where the index was generated.
+        self.assertEqual(['dummyidx/index', 'dummyidx/unindexed'], (
+            self.mapper(self.make_entry_point(
+                indexer.path_origin(self.pkg_dir)))))
+
+    def test_indexed_missing_file(self):
+        # the index lists a file that was not installed.
+        entry_point = self.make_entry_point(index=json.dumps({
+            'extensions': ['.js'],
+            'modules': {'dummyidx': {'origin': 'elsewhere', 'paths': [
+                'index.js', 'missing.js',
+            ]}},
+        }))
+        self.assertIsNone(indexer.indexed_module_files(
+            'dummyidx', entry_point, self.pkg_dir, '.js'))
+        self.assertEqual(['dummyidx/index', 'dummyidx/unindexed'], (
+            self.mapper(entry_point)))
+
+    def test_indexed_custom_globber(self):
+        self.assertEqual(['dummyidx/index', 'dummyidx/unindexed'], (
+            self.mapper(self.make_entry_point(),
+                        globber=indexer.globber_root)))
+
+    def test_indexed_invalid(self):
+        entry_point = self.make_entry_point(index='{')
+        with pretty_logging(stream=StringIO()) as fd:
+            self.assertIsNone(indexer.read_dist_module_index(
+                entry_point.dist))
+        self.assertIn('could not be read', fd.getvalue())
+        self.assertEqual(['dummyidx/index', 'dummyidx/unindexed'], (
+            self.mapper(entry_point)))
+
+    def test_indexed_no_dist(self):
+        self.assertIsNone(indexer.indexed_module_files(
+            'dummyidx', pkg_resources.EntryPoint.parse('dummyidx = dummyidx'),
+            self.pkg_dir, '.js'))
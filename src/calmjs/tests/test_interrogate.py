@@ -10,6 +10,9 @@ from calmjs.parse.asttypes import String
 from calmjs.parse.asttypes import Object
 from calmjs.parse import es5
 from calmjs import interrogate
+from calmjs.cache import ASTCache
+
+from calmjs.testing.utils import mkdtemp
 
 # an example artifact bundle that concatenated both UMD and AMD together
 artifact = """
@@ -369,3 +372,18 @@ class RequireJSHelperTestCase(unittest.TestCase):
             [],
             sorted(set(interrogate.extract_module_imports(src)))
         )
+
+    def test_extract_module_imports_path(self):
+        target = join(mkdtemp(self), 'source.js')
+        with open(target, 'w', encoding='utf8') as fd:
+            fd.write("var a = require('a'); define(['b'], function(b) {});")
+        self.assertEqual(['a', 'b'], sorted(
+            interrogate.extract_module_imports_path(target)))
+
+        ast_cache = ASTCache()
+        self.assertEqual(['a', 'b'], sorted(
+            interrogate.extract_module_imports_path(target, ast_cache)))
+        tree = interrogate.parse_path(target, ast_cache)
+        self.assertEqual(tree.sourcepath, target)
+        self.assertEqual(1, ast_cache.hits)
+        self.assertEqual(1, ast_cache.misses)
@@ -10,6 +10,7 @@ from pkg_resources import resource_filename
 from pkg_resources import working_set as root_working_set
 
 import calmjs.base
+from calmjs import indexer
 from calmjs.registry import Registry
 from calmjs.registry import get as root_registry_get
 from calmjs.registry import _inst as root_registry
@@ -25,6 +26,7 @@ from calmjs.utils import pretty_logging
 
 from calmjs.testing.utils import remember_cwd
 from calmjs.testing.utils import mkdtemp
+from calmjs.testing.utils import stub_item_attr_value
 from calmjs.testing.utils import stub_mod_working_set
 from calmjs.testing.mocks import StringIO
 from calmjs.testing.mocks import WorkingSet
@@ -715,3 +717,55 @@ class ModuleLoaderRegistryTestCase(unittest.TestCase):
             'calmjs.testing'))
         self.assertEqual({}, loader_registry.get_records_for_package(
             'calmjs.testing'))
+
+    def test_module_loader_registry_parent_load_module(self):
+        working_set = WorkingSet({
+            'calmjs.module': [
+                'module4 = calmjs.testing.module4',
+            ],
+            'calmjs.module.loader': [
+                'css = css[css]',
+            ],
+        }, dist=root_working_set.find(Requirement.parse('calmjs')))
+        registry = ModuleRegistry('calmjs.module', _working_set=working_set)
+        loaded = []
+        load_module = registry.load_module
+
+        def stub_load_module(module_name, entry_point=None):
+            loaded.append((module_name, str(entry_point)))
+            return load_module(module_name, entry_point)
+
+        registry.load_module = stub_load_module
+        loader_registry = ModuleLoaderRegistry(
+            'calmjs.module.loader', _working_set=working_set, _parent=registry)
+        self.assertEqual([
+            ('calmjs.testing.module4', 'css = css [css]'),
+        ], loaded)
+        self.assertEqual([
+            'css!calmjs/testing/module4/other.css',
+        ], sorted(loader_registry.get_records_for_package('calmjs').keys()))
+
+    def test_module_loader_registry_single_listing(self):
+        working_set = WorkingSet({
+            'calmjs.module': [
+                'module4 = calmjs.testing.module4',
+            ],
+            'calmjs.module.loader': [
+                'css = css[style,css]',
+                'json = json[json]',
+            ],
+        }, dist=root_working_set.find(Requirement.parse('calmjs')))
+        registry = ModuleRegistry('calmjs.module', _working_set=working_set)
+
+        listing_cache = indexer.ListingCache()
+        stub_item_attr_value(self, indexer, 'listing_cache', listing_cache)
+        loader_registry = ModuleLoaderRegistry(
+            'calmjs.module.loader', _working_set=working_set, _parent=registry)
+        # the module directory was listed once for all the extensions
+        # of both entry points.
+        self.assertEqual(1, listing_cache.hits + listing_cache.misses)
+        self.assertEqual([
+            'css!calmjs/testing/module4/other.css',
+            'css!calmjs/testing/module4/widget.style',
+            'json!calmjs/testing/module4/data.json',
+        ], sorted(loader_registry.get_records_for_package('calmjs').keys()))
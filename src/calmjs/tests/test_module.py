@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 import unittest
+import sys
+from functools import partial
+from os import makedirs
+from os.path import join
 from pkg_resources import Distribution
 from pkg_resources import EntryPoint
 
 import calmjs.base
 from calmjs.base import BaseModuleRegistry
+from calmjs.indexer import DEFAULT_PRUNE_RULES
+from calmjs.indexer import PruneRules
+from calmjs.indexer import mapper_es6
 from calmjs.registry import Registry
 from calmjs.registry import get
 from calmjs.module import ModuleRegistry
@@ -59,6 +66,61 @@ class ModuleRegistryTestCase(unittest.TestCase):
         self.assertEqual(sorted(module1.keys()), [key])
 
 
+class PrunedModuleRegistry(ModuleRegistry):
+
+    prune = PruneRules(exclude=('mod',))
+
+    def _init(self):
+        self.mapper = partial(mapper_es6, globber='recursive')
+
+
+class PrunedModuleRegistryTestCase(unittest.TestCase):
+
+    def test_module_registry_prune(self):
+        registry = PrunedModuleRegistry(__name__)
+        with pretty_logging(stream=mocks.StringIO()):
+            registry.register_entry_points([EntryPoint.parse(
+                'calmjs.testing.module2 = calmjs.testing.module2')])
+        self.assertEqual([
+            'calmjs/testing/module2/helper',
+            'calmjs/testing/module2/index',
+        ], sorted(registry.get_record('calmjs.testing.module2')))
+
+
+class DefaultPrunedModuleRegistry(ModuleRegistry):
+
+    prune = True
+
+    def _init(self):
+        self.mapper = partial(mapper_es6, globber='recursive')
+
+
+class DefaultPrunedModuleRegistryTestCase(unittest.TestCase):
+
+    def test_module_registry_prune_default(self):
+        root = utils.mkdtemp(self)
+        pkg = join(root, 'prunedpkg')
+        for path in ('', 'node_modules', 'lib'):
+            makedirs(join(pkg, path))
+        for name in ('__init__.py', 'index.js', 'node_modules/dep.js',
+                     'lib/util.js'):
+            with open(join(pkg, name), 'w'):
+                pass
+        sys.path.insert(0, root)
+        self.addCleanup(sys.path.remove, root)
+        self.addCleanup(sys.modules.pop, 'prunedpkg', None)
+
+        registry = DefaultPrunedModuleRegistry(__name__)
+        self.assertIs(DEFAULT_PRUNE_RULES, registry.prune)
+        with pretty_logging(stream=mocks.StringIO()):
+            registry.register_entry_points([EntryPoint.parse(
+                'prunedpkg = prunedpkg')])
+        self.assertEqual([
+            'prunedpkg/index',
+            'prunedpkg/lib/util',
+        ], sorted(registry.get_record('prunedpkg')))
+
+
 class IntegratedModuleRegistryTestCase(unittest.TestCase):
     """
     Test the JavaScript module registry, with a mocked working set and
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import unittest
+import pstats
+from os.path import exists
+from os.path import join
+
+from calmjs import profiling
+from calmjs.utils import pretty_logging
+
+from calmjs.testing.mocks import StringIO
+from calmjs.testing.utils import mkdtemp
+
+
+class ProfileTestCase(unittest.TestCase):
+
+    def test_profile_cpu(self):
+        cpu_file = join(mkdtemp(self), 'cpu.pstats')
+        with pretty_logging(stream=StringIO()) as s:
+            with profiling.profile(cpu_file=cpu_file, top=3):
+                sorted(range(1000))
+        self.assertIn('top 3 functions by cumulative time', s.getvalue())
+        self.assertTrue(pstats.Stats(cpu_file).total_calls)
+
+    def test_profile_failure(self):
+        cpu_file = join(mkdtemp(self), 'cpu.pstats')
+        with pretty_logging(stream=StringIO()):
+            with self.assertRaises(ValueError):
+                with profiling.profile(cpu_file=cpu_file):
+                    raise ValueError('failure')
+        self.assertTrue(exists(cpu_file))
+
+    @unittest.skipIf(profiling.tracemalloc is None, 'tracemalloc unavailable')
+    def test_profile_mem(self):
+        mem_file = join(mkdtemp(self), 'mem.snapshot')
+        with pretty_logging(stream=StringIO()) as s:
+            with profiling.profile(mem_file=mem_file, top=2):
+                # retained such that it will be part of the snapshot.
+                data = [str(i) for i in range(1000)]
+        self.assertEqual(1000, len(data))
+        self.assertIn('top 2 allocations by line', s.getvalue())
+        self.assertFalse(profiling.tracemalloc.is_tracing())
+        snapshot = profiling.tracemalloc.Snapshot.load(mem_file)
+        self.assertTrue(snapshot.traces)
+
+    def test_profile_mem_unavailable(self):
+        mem_file = join(mkdtemp(self), 'mem.snapshot')
+        original, profiling.tracemalloc = profiling.tracemalloc, None
+        try:
+            with pretty_logging(stream=StringIO()) as s:
+                with profiling.profile(mem_file=mem_file):
+                    pass
+        finally:
+            profiling.tracemalloc = original
+        self.assertIn('tracemalloc is unavailable', s.getvalue())
+        self.assertFalse(exists(mem_file))
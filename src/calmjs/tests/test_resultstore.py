@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import unittest
+from os.path import exists
+from os.path import join
+
+from calmjs import resultstore
+from calmjs.resultstore import ResultStore
+
+from calmjs.testing.utils import mkdtemp
+from calmjs.testing.utils import stub_item_attr_value
+
+
+class ResultStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ResultStore()
+        self.addCleanup(self.store.close)
+
+    def test_mapping_basic(self):
+        mapping = self.store.mapping()
+        self.assertEqual(0, len(mapping))
+        mapping['b'] = 'b.js'
+        mapping['a'] = {'path': 'a.js'}
+        mapping['b'] = 'b2.js'
+        self.assertEqual(2, len(mapping))
+        self.assertIn('a', mapping)
+        self.assertNotIn('c', mapping)
+        self.assertEqual({'path': 'a.js'}, mapping['a'])
+        # order of insertion retained, even after the update.
+        self.assertEqual(['b', 'a'], list(mapping))
+        self.assertEqual([('b', 'b2.js'), ('a', {'path': 'a.js'})], list(
+            mapping.items()))
+        with self.assertRaises(KeyError):
+            mapping['c']
+        del mapping['b']
+        with self.assertRaises(KeyError):
+            del mapping['b']
+        self.assertEqual({'a': {'path': 'a.js'}}, dict(mapping))
+
+    def test_mapping_separate(self):
+        first = self.store.mapping()
+        second = self.store.mapping()
+        first.update({'a': 1, 'b': 2})
+        second['a'] = 3
+        self.assertEqual({'a': 1, 'b': 2}, dict(first))
+        self.assertEqual({'a': 3}, dict(second))
+        first.release()
+        self.assertEqual(0, len(first))
+        self.assertEqual({'a': 3}, dict(second))
+
+    def test_mapping_paging(self):
+        stub_item_attr_value(self, resultstore, '_page_size', 3)
+        mapping = self.store.mapping()
+        keys = ['k%02d' % i for i in range(10)]
+        for key in keys:
+            mapping[key] = key
+        self.assertEqual(keys, list(mapping))
+
+    def test_close_temporary(self):
+        store = ResultStore()
+        self.assertTrue(exists(store.path))
+        store.close()
+        self.assertFalse(exists(store.path))
+
+    def test_reopen_path(self):
+        path = join(mkdtemp(self), 'results.sqlite')
+        store = ResultStore(path)
+        mapping = store.mapping()
+        mapping['a'] = 1
+        store.close()
+        self.assertTrue(exists(path))
+        store = ResultStore(path)
+        self.addCleanup(store.close)
+        self.assertEqual({'a': 1}, dict(resultstore.StoredMapping(store, 1)))
+        # new mappings will not collide with the existing one.
+        self.assertEqual(2, store.mapping().ident)
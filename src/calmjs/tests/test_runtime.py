@@ -385,6 +385,202 @@ class ToolchainRuntimeTestCase(unittest.TestCase):
 
         self.assertTrue(isinstance(rt.create_spec(), toolchain.Spec))
 
+    def test_toolchain_runtime_compile_jobs(self):
+        stub_stdouts(self)
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        self.assertIn("--jobs", rt.argparser.format_help())
+        result = rt(['--export-target=dummy', '--jobs=2'])
+        self.assertEqual(result['compile_jobs'], 2)
+        self.assertEqual(result['link'], 'linked')
+
+    def test_toolchain_runtime_compile_task_jobs(self):
+        stub_stdouts(self)
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        result = rt(['--export-target=dummy', '--task-jobs=2'])
+        self.assertEqual(result['compile_task_jobs'], 2)
+        self.assertEqual(result['link'], 'linked')
+
+    def test_toolchain_runtime_compile_result_store(self):
+        stub_stdouts(self)
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        result = rt(['--export-target=dummy', '--compile-result-store=sqlite'])
+        # removed at cleanup, with the stored results copied back.
+        self.assertNotIn('compile_result_store', result)
+        self.assertEqual({}, result['transpiled_modpaths'])
+        self.assertEqual(result['link'], 'linked')
+
+    def test_toolchain_runtime_checkpoint_resume(self):
+        stub_stdouts(self)
+        build_dir = mkdtemp(self)
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        rt([
+            '--export-target=dummy', '--build-dir=' + build_dir,
+            '--checkpoint'])
+        self.assertTrue(exists(join(build_dir, '.calmjs_checkpoint.json')))
+        result = rt([
+            '--export-target=dummy', '--build-dir=' + build_dir,
+            '--resume-from=link'])
+        self.assertEqual(result['link'], 'linked')
+        self.assertEqual(result['prepare'], 'prepared')
+
+    def test_toolchain_runtime_bundle_materialize(self):
+        stub_stdouts(self)
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        self.assertIn("--bundle-materialize", rt.argparser.format_help())
+        result = rt([
+            '--export-target=dummy', '--bundle-materialize=hardlink,copy'])
+        self.assertEqual(result['bundle_materialize'], ['hardlink', 'copy'])
+
+    def test_toolchain_runtime_watch(self):
+        stub_stdouts(self)
+        src_dir = mkdtemp(self)
+        src = join(src_dir, 'mod.js')
+        with open(src, 'w') as fd:
+            fd.write('var a = 1;\n')
+
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        self.assertIn("--watch", rt.argparser.format_help())
+        transpiled = []
+        transpile = tc.transpile_modname_source_target
+
+        def counted(spec, modname, source, target):
+            transpiled.append(modname)
+            return transpile(spec, modname, source, target)
+
+        tc.transpile_modname_source_target = counted
+        sleeps = []
+
+        class FakeTime(object):
+            def sleep(self, interval):
+                sleeps.append(interval)
+                if len(sleeps) == 2:
+                    with open(src, 'w') as fd:
+                        fd.write('var a = 12;\n')
+                elif len(sleeps) > 3:
+                    raise KeyboardInterrupt()
+
+        stub_item_attr_value(self, runtime, 'time', FakeTime())
+        with pretty_logging(logger='calmjs.runtime', stream=mocks.StringIO()):
+            result = rt.run(
+                export_target=join(src_dir, 'export.js'),
+                transpile_sourcepath={'mod': src},
+                watch=True, watch_interval=0.1,
+            )
+        self.assertEqual([0.1, 0.1, 0.1, 0.1], sleeps)
+        # only rebuilt once for the modification.
+        self.assertEqual(['mod', 'mod'], transpiled)
+        self.assertEqual(result['link'], 'linked')
+        self.assertTrue(result['export_target_overwrite'])
+        # the temporary build directory managed for the watch is removed.
+        self.assertFalse(exists(result['build_dir']))
+
+    def test_toolchain_runtime_watch_new_files(self):
+        stub_stdouts(self)
+        src_dir = mkdtemp(self)
+        src = join(src_dir, 'mod.js')
+        with open(src, 'w') as fd:
+            fd.write('var a = 1;\n')
+        os.utime(src, (1000000000, 1000000000))
+        os.utime(src_dir, (1000000000, 1000000000))
+
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        transpiled = []
+        transpile = tc.transpile_modname_source_target
+
+        def counted(spec, modname, source, target):
+            transpiled.append(modname)
+            return transpile(spec, modname, source, target)
+
+        tc.transpile_modname_source_target = counted
+        reloaded = []
+        rt.reload_module_registries = lambda: reloaded.append(True)
+        sleeps = []
+
+        class FakeTime(object):
+            def sleep(self, interval):
+                sleeps.append(interval)
+                if len(sleeps) == 2:
+                    # a new module file not yet known to the build.
+                    with open(join(src_dir, 'new.js'), 'w') as fd:
+                        fd.write('var b = 1;\n')
+                elif len(sleeps) > 3:
+                    raise KeyboardInterrupt()
+
+        stub_item_attr_value(self, runtime, 'time', FakeTime())
+        with pretty_logging(
+                logger='calmjs.runtime', stream=mocks.StringIO()) as s:
+            result = rt.run(
+                export_target=join(mkdtemp(self), 'export.js'),
+                transpile_sourcepath={'mod': src},
+                watch=True, watch_interval=0.1,
+            )
+        self.assertIn('reloading module registries', s.getvalue())
+        self.assertEqual([True], reloaded)
+        # rebuilt once for the new file, with the compile cache reused
+        # for the unmodified source.
+        self.assertEqual(['mod'], transpiled)
+        self.assertEqual(1, result['digest_cache'].hits)
+        self.assertEqual(1, result['digest_cache'].misses)
+
+    def test_toolchain_runtime_reload_module_registries(self):
+        from calmjs.registry import _inst
+        from calmjs.module import ModuleRegistry
+        stub_item_attr_value(self, _inst, 'records', {
+            'calmjs.registry': _inst,
+            'dummy.module': ModuleRegistry('dummy.module'),
+            'dummy.other': object(),
+        })
+        rt = runtime.ToolchainRuntime(toolchain.NullToolchain())
+        self.assertEqual(['dummy.module'], rt.reload_module_registries())
+        self.assertEqual(
+            ['calmjs.registry', 'dummy.other'], sorted(_inst.records))
+
+    def test_toolchain_runtime_trace(self):
+        stub_stdouts(self)
+        trace_file = join(mkdtemp(self), 'trace.json')
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        rt(['--export-target=dummy', '--trace', trace_file])
+        with open(trace_file) as fd:
+            trace = json.load(fd)
+        self.assertIn('link', [e['name'] for e in trace['traceEvents']])
+
+    def test_toolchain_runtime_profile_cpu(self):
+        stub_stdouts(self)
+        cpu_file = join(mkdtemp(self), 'cpu.pstats')
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        result = rt(['--export-target=dummy', '--profile-cpu', cpu_file])
+        self.assertTrue(exists(cpu_file))
+        self.assertNotIn('profile_cpu', result)
+        self.assertEqual(result['link'], 'linked')
+
+    def test_toolchain_runtime_dry_run(self):
+        stub_stdouts(self)
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        result = rt(['--export-target=dummy', '--dry-run'])
+        self.assertNotIn('link', result)
+        self.assertEqual(
+            json.loads(sys.stdout.getvalue()), result['build_plan'])
+
+    def test_toolchain_runtime_build_fs(self):
+        stub_stdouts(self)
+        tc = toolchain.NullToolchain()
+        rt = runtime.ToolchainRuntime(tc)
+        result = rt([
+            '--export-target=dummy', '--build-fs=memory',
+            '--build-fs-spill-limit=1024'])
+        self.assertEqual(result['build_fs'].spill_limit, 1024)
+        self.assertEqual(result['link'], 'linked')
+
     def test_standard_run(self):
         stub_stdouts(self)
         tc = toolchain.NullToolchain()
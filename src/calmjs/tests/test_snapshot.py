@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import os
+from os.path import exists
+from os.path import join
+
+from pkg_resources import EntryPoint
+
+from calmjs import indexer
+from calmjs import snapshot
+from calmjs.module import ModuleRegistry
+from calmjs.utils import pretty_logging
+
+from calmjs.testing import mocks
+from calmjs.testing.utils import mkdtemp
+from calmjs.testing.utils import stub_item_attr_value
+from calmjs.testing.utils import stub_os_environ
+
+
+def set_mtime(path, mtime=1000000000):
+    os.utime(path, (mtime, mtime))
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp(self)
+        self.subdir = join(self.tmpdir, 'sub')
+        os.mkdir(self.subdir)
+        set_mtime(self.subdir)
+        set_mtime(self.tmpdir)
+
+    def test_dir_stamps(self):
+        stamps = snapshot.dir_stamps([self.tmpdir, join(self.tmpdir, 'no')])
+        self.assertEqual({
+            self.tmpdir: 1000000000,
+            self.subdir: 1000000000,
+        }, stamps)
+        self.assertTrue(snapshot.stamps_valid(stamps))
+
+        with open(join(self.subdir, 'file.js'), 'w') as fd:
+            fd.write('')
+        self.assertFalse(snapshot.stamps_valid(stamps))
+
+    def test_dir_stamps_prune(self):
+        self.assertEqual({
+            self.tmpdir: 1000000000,
+        }, snapshot.dir_stamps(
+            [self.tmpdir], indexer.PruneRules(exclude=('sub',))))
+
+    def test_entry_point_key_prune(self):
+        entry_point = EntryPoint.parse('module = module')
+        self.assertNotEqual(
+            snapshot.entry_point_key(entry_point, 'module'),
+            snapshot.entry_point_key(
+                entry_point, 'module', indexer.DEFAULT_PRUNE_RULES),
+        )
+
+    def test_stamps_valid_missing(self):
+        self.assertFalse(snapshot.stamps_valid({
+            join(self.tmpdir, 'no'): 1000000000}))
+
+    def test_registry_snapshot_set_save(self):
+        path = join(mkdtemp(self), 'registry', 'snapshot.json')
+        target = snapshot.RegistrySnapshot(path)
+        stamps = snapshot.dir_stamps([self.tmpdir])
+        self.assertTrue(target.set('key', {'mod': {'a': 'a.js'}}, stamps))
+        self.assertEqual({'mod': {'a': 'a.js'}}, target.get('key'))
+        target.save()
+        self.assertFalse(target.dirty)
+
+        reloaded = snapshot.RegistrySnapshot(path)
+        self.assertEqual({'mod': {'a': 'a.js'}}, reloaded.get('key'))
+
+        # the recorded directories got modified.
+        set_mtime(self.subdir, 1000000001)
+        self.assertIsNone(reloaded.get('key'))
+        self.assertIsNone(reloaded.get('missing'))
+
+    def test_registry_snapshot_set_racy(self):
+        target = snapshot.RegistrySnapshot(join(self.tmpdir, 'snap.json'))
+        set_mtime(self.subdir, int(snapshot.time.time()))
+        self.assertFalse(target.set(
+            'key', {}, snapshot.dir_stamps([self.tmpdir])))
+        self.assertFalse(target.dirty)
+
+    def test_registry_snapshot_set_not_serializable(self):
+        target = snapshot.RegistrySnapshot(join(self.tmpdir, 'snap.json'))
+        self.assertFalse(target.set('key', {'mod': object()}, {}))
+
+    def test_registry_snapshot_invalid_file(self):
+        path = join(self.tmpdir, 'snap.json')
+        with open(path, 'w') as fd:
+            fd.write('[]')
+        self.assertEqual({}, snapshot.RegistrySnapshot(path).entries)
+        with open(path, 'w') as fd:
+            fd.write('{')
+        self.assertEqual({}, snapshot.RegistrySnapshot(path).entries)
+
+
+class ModuleRegistrySnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = mkdtemp(self)
+        stub_os_environ(self)
+        os.environ[snapshot.CALMJS_CACHE_DIR] = self.cache_dir
+        # the directories of the testing modules may have been freshly
+        # created.
+        stub_item_attr_value(self, snapshot, 'RACY_MTIME_WINDOW', 0)
+        self.entry_point = EntryPoint.parse(
+            'calmjs.testing.module1 = calmjs.testing.module1')
+
+    def test_registry_snapshot_disabled(self):
+        os.environ.pop(snapshot.CALMJS_CACHE_DIR)
+        self.assertIsNone(snapshot.registry_snapshot(ModuleRegistry(
+            __name__)))
+
+    def test_module_registry_snapshot(self):
+        registry = ModuleRegistry(__name__)
+        with pretty_logging(stream=mocks.StringIO()):
+            registry.register_entry_points([self.entry_point])
+        records = registry.get_record('calmjs.testing.module1')
+        self.assertEqual(['calmjs/testing/module1/hello'], sorted(records))
+        path = registry._snapshot.path
+        self.assertTrue(exists(path))
+        with open(path) as fd:
+            self.assertEqual(1, len(json.load(fd)))
+
+        def mapper(module, entry_point):
+            raise AssertionError('mapper should not be called')
+
+        registry = ModuleRegistry(__name__)
+        registry.mapper = mapper
+        with pretty_logging(stream=mocks.StringIO()) as s:
+            registry.register_entry_points([self.entry_point])
+        self.assertIn('using snapshot records', s.getvalue())
+        self.assertEqual(
+            records, registry.get_record('calmjs.testing.module1'))
+
+    def test_module_registry_snapshot_invalidated(self):
+        tmpdir = mkdtemp(self)
+        set_mtime(tmpdir)
+        calls = []
+
+        def map_entry_point_module(entry_point, module):
+            calls.append(module.__name__)
+            return {module.__name__: {
+                'mod/%d' % len(calls): join(tmpdir, 'mod.js')}}
+
+        def make_registry():
+            registry = ModuleRegistry(__name__ + '.invalidated')
+            registry.snapshot_paths = lambda entry_point, module: [tmpdir]
+            registry._map_entry_point_module = map_entry_point_module
+            registry.register_entry_points([self.entry_point])
+            return registry
+
+        self.assertEqual({'mod/1': join(tmpdir, 'mod.js')}, make_registry(
+            ).get_record('calmjs.testing.module1'))
+        self.assertEqual({'mod/1': join(tmpdir, 'mod.js')}, make_registry(
+            ).get_record('calmjs.testing.module1'))
+        self.assertEqual(1, len(calls))
+
+        # adding a file to the directory will invalidate the snapshot.
+        with open(join(tmpdir, 'mod.js'), 'w') as fd:
+            fd.write('')
+        set_mtime(tmpdir, 1000000001)
+        self.assertEqual({'mod/2': join(tmpdir, 'mod.js')}, make_registry(
+            ).get_record('calmjs.testing.module1'))
+        self.assertEqual(2, len(calls))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import unittest
+import threading
+
+from calmjs.taskgraph import TaskGraph
+from calmjs.trace import Tracer
+
+
+class TaskGraphTestCase(unittest.TestCase):
+
+    def test_add_duplicate(self):
+        graph = TaskGraph()
+        graph.add('a', list)
+        with self.assertRaises(ValueError):
+            graph.add('a', list)
+
+    def test_order(self):
+        graph = TaskGraph()
+        graph.add('link', list, requires=['assemble'])
+        graph.add('transpile', list)
+        graph.add('assemble', list, requires=['transpile', 'bundle'])
+        graph.add('bundle', list)
+        self.assertEqual(
+            ['transpile', 'bundle', 'assemble', 'link'], graph.order())
+
+    def test_order_undefined(self):
+        graph = TaskGraph()
+        graph.add('a', list, requires=['b'])
+        with self.assertRaises(ValueError) as e:
+            graph.order()
+        self.assertIn("requires undefined task 'b'", str(e.exception))
+
+    def test_order_cyclic(self):
+        graph = TaskGraph()
+        graph.add('a', list, requires=['b'])
+        graph.add('b', list, requires=['a'])
+        graph.add('c', list)
+        with self.assertRaises(ValueError) as e:
+            graph.order()
+        self.assertIn("'a', 'b' have cyclic", str(e.exception))
+
+    def test_run_sequential(self):
+        called = []
+        graph = TaskGraph()
+        graph.add('b', lambda: called.append('b') or 2, requires=['a'])
+        graph.add('a', lambda: called.append('a') or 1)
+        self.assertEqual({'a': 1, 'b': 2}, graph.run())
+        self.assertEqual(['a', 'b'], called)
+
+    def test_run_concurrent(self):
+        # the independent tasks must be running at the same time for
+        # both of them to pass the barrier.
+        barrier = threading.Event()
+        arrived = []
+        lock = threading.Lock()
+
+        def wait(name):
+            with lock:
+                arrived.append(name)
+                if len(arrived) == 2:
+                    barrier.set()
+            return barrier.wait(5)
+
+        tracer = Tracer()
+        graph = TaskGraph(tracer=tracer)
+        graph.add('a', lambda: wait('a'))
+        graph.add('b', lambda: wait('b'))
+        graph.add('c', lambda: sorted(arrived), requires=['a', 'b'])
+        results = graph.run(jobs=2)
+        self.assertEqual(
+            {'a': True, 'b': True, 'c': ['a', 'b']}, results)
+        self.assertEqual(
+            ['a', 'b', 'c'], sorted(e['name'] for e in tracer.events))
+        self.assertEqual(
+            {'task'}, {e['cat'] for e in tracer.events})
+
+    def test_run_concurrent_failure(self):
+        called = []
+
+        def fail():
+            raise ValueError('failure')
+
+        graph = TaskGraph()
+        graph.add('a', fail)
+        graph.add('b', lambda: called.append('b'), requires=['a'])
+        graph.add('c', lambda: called.append('c'))
+        with self.assertRaises(ValueError):
+            graph.run(jobs=2)
+        # the dependent task was never started.
+        self.assertNotIn('b', called)
@@ -2,7 +2,11 @@
 import unittest
 import logging
 import json
+import os
+import socket
 import tempfile
+import threading
+import time
 import warnings
 from collections import OrderedDict
 from functools import partial
@@ -21,6 +25,10 @@ from calmjs.exc import AdviceAbort
 from calmjs.exc import AdviceCancel
 from calmjs.exc import ToolchainAbort
 from calmjs.exc import ToolchainCancel
+from calmjs import buildfs as calmjs_buildfs
+from calmjs import cache as calmjs_cache
+from calmjs import interrogate
+from calmjs import resultstore as calmjs_resultstore
 from calmjs import toolchain as calmjs_toolchain
 from calmjs.utils import pretty_logging
 from calmjs.registry import get
@@ -40,10 +48,12 @@ from calmjs.toolchain import ToolchainSpecCompileEntry
 from calmjs.toolchain import dict_setget
 from calmjs.toolchain import dict_setget_dict
 from calmjs.toolchain import dict_update_overwrite_check
+from calmjs.toolchain import process_compile_entries
 from calmjs.toolchain import spec_update_sourcepath_filter_loaderplugins
 from calmjs.toolchain import spec_update_loaderplugin_registry
 from calmjs.toolchain import toolchain_spec_compile_entries
 from calmjs.toolchain import toolchain_spec_prepare_loaderplugins
+from calmjs.toolchain import toolchain_spec_prune_unreachable
 
 from calmjs.toolchain import SETUP
 from calmjs.toolchain import CLEANUP
@@ -473,6 +483,51 @@ class SpecTestCase(unittest.TestCase):
         # if a better implementation is done...
         self.assertIn("'spec': {...}", repr(spec))
 
+    def test_spec_fingerprint(self):
+        source = join(mkdtemp(self), 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var a = 1;\n')
+
+        def make_spec(**kw):
+            return Spec(
+                source_package_names=['calmjs'],
+                transpile_sourcepath={'a': source},
+                **kw
+            )
+
+        fingerprint = make_spec().fingerprint()
+        self.assertEqual(64, len(fingerprint))
+        self.assertEqual(fingerprint, make_spec().fingerprint())
+        # values not included in the keys are ignored.
+        self.assertEqual(fingerprint, make_spec(other=1).fingerprint())
+        self.assertNotEqual(
+            fingerprint, make_spec(other=1).fingerprint(keys=['other']))
+        self.assertNotEqual(
+            fingerprint, make_spec(generate_source_map=True).fingerprint())
+        self.assertNotEqual(fingerprint, make_spec().fingerprint(
+            toolchain=NullToolchain()))
+        self.assertNotEqual(
+            make_spec().fingerprint(toolchain=NullToolchain()),
+            make_spec().fingerprint(toolchain=ES5Toolchain()),
+        )
+
+        without_digest = make_spec().fingerprint(digest_files=False)
+        with open(source, 'w') as fd:
+            fd.write('var a = 2;\n')
+        self.assertNotEqual(fingerprint, make_spec().fingerprint())
+        self.assertEqual(
+            without_digest, make_spec().fingerprint(digest_files=False))
+
+    def test_spec_fingerprint_sourcepath_suffix(self):
+        spec = Spec(transpile_sourcepath={'a': 'a.js'})
+        fingerprint = spec.fingerprint()
+        spec['transpile_sourcepath']['b'] = 'b.js'
+        self.assertNotEqual(fingerprint, spec.fingerprint())
+        self.assertEqual(
+            Spec().fingerprint(sourcepath_suffix='_source'),
+            spec.fingerprint(sourcepath_suffix='_source'),
+        )
+
 
 class SpecAdviceTestCase(unittest.TestCase):
     """
@@ -523,7 +578,7 @@ class SpecAdviceTestCase(unittest.TestCase):
     def test_spec_advice_empty_stack(self):
         spec = Spec(debug=1)
         with pretty_logging(stream=StringIO()) as s:
-            spec.handle('cleanup')
+            spec.handle(CLEANUP)
         self.assertEqual(s.getvalue(), '')
 
     def test_spec_advice_malformed(self):
@@ -675,6 +730,141 @@ class SpecAdviceTestCase(unittest.TestCase):
             "indirect invocation of 'handle' by 'handle' is forbidden",
             s.getvalue())
 
+    def test_spec_advise_parallel(self):
+        stub_item_attr_value(self, calmjs_toolchain, 'cpu_count', lambda: 4)
+        spec = Spec()
+        called = []
+        lock = threading.Lock()
+        barrier = threading.Event()
+
+        def sequential(label):
+            called.append(label)
+
+        def parallel(label):
+            with lock:
+                called.append(label)
+                if called.count('parallel') == 2:
+                    barrier.set()
+            # both must be running at the same time to get past this.
+            if not barrier.wait(5):
+                raise ValueError('not executed concurrently')
+            with lock:
+                called.append('done')
+
+        spec.advise(CLEANUP, sequential, 'first')
+        spec.advise_parallel(CLEANUP, parallel, 'parallel')
+        spec.advise_parallel(CLEANUP, parallel, 'parallel')
+        spec.advise(CLEANUP, sequential, 'last')
+        spec.advise_parallel(None, parallel, 'ignored')
+        with pretty_logging(stream=StringIO()) as s:
+            spec.handle(CLEANUP)
+        self.assertIn(
+            "handling 2 parallel safe advices in group 'cleanup' using 2 "
+            "workers", s.getvalue())
+        self.assertNotIn('unexpected exception', s.getvalue())
+        # the ordering of the other advices is retained.
+        self.assertEqual([
+            'last', 'parallel', 'parallel', 'done', 'done', 'first',
+        ], called)
+
+    def test_spec_advise_parallel_default_jobs(self):
+        # the default number of workers is bounded by the processors
+        # available rather than the number of advices.
+        stub_item_attr_value(self, calmjs_toolchain, 'cpu_count', lambda: 2)
+        spec = Spec()
+        called = []
+        for i in range(5):
+            spec.advise_parallel(CLEANUP, called.append, i)
+        with pretty_logging(stream=StringIO()) as s:
+            spec.handle(CLEANUP)
+        self.assertIn(
+            "handling 5 parallel safe advices in group 'cleanup' using 2 "
+            "workers", s.getvalue())
+        self.assertEqual([0, 1, 2, 3, 4], sorted(called))
+
+    def test_default_advice_jobs(self):
+        def cpu_count():
+            raise NotImplementedError()
+
+        self.assertGreaterEqual(calmjs_toolchain.default_advice_jobs(), 1)
+        stub_item_attr_value(self, calmjs_toolchain, 'cpu_count', cpu_count)
+        self.assertEqual(1, calmjs_toolchain.default_advice_jobs())
+
+    def test_spec_advise_parallel_sequential_jobs(self):
+        spec = Spec(advice_jobs=1)
+        called = []
+        spec.advise_parallel(CLEANUP, called.append, 1)
+        spec.advise_parallel(CLEANUP, called.append, 2)
+        spec.handle(CLEANUP)
+        self.assertEqual([2, 1], called)
+
+    def test_spec_advise_parallel_exceptions(self):
+        spec = Spec()
+        called = []
+
+        def advice_abort():
+            raise AdviceAbort('advice abort')
+
+        def toolchain_abort():
+            raise ToolchainAbort('toolchain abort')
+
+        spec.advise(CLEANUP, called.append, 'never')
+        spec.advise_parallel(CLEANUP, toolchain_abort)
+        spec.advise_parallel(CLEANUP, called.append, 'called')
+        spec.advise_parallel(CLEANUP, advice_abort)
+        with pretty_logging(stream=StringIO()) as s:
+            with self.assertRaises(ToolchainAbort):
+                spec.handle(CLEANUP)
+        self.assertEqual(['called'], called)
+        self.assertIn('encountered a known error', s.getvalue())
+        self.assertIn('triggered an abort: toolchain abort', s.getvalue())
+
+    def test_spec_advise_parallel_abort_skips_queued(self):
+        spec = Spec(advice_jobs=2)
+        called = []
+        started = threading.Event()
+        aborting = threading.Event()
+
+        def toolchain_abort():
+            # only abort once the sibling is running alongside.
+            started.wait(5)
+            aborting.set()
+            raise ToolchainAbort('toolchain abort')
+
+        def running(label):
+            started.set()
+            aborting.wait(5)
+            time.sleep(0.1)
+            called.append(label)
+
+        spec.advise_parallel(CLEANUP, called.append, 'queued')
+        spec.advise_parallel(CLEANUP, called.append, 'queued')
+        spec.advise_parallel(CLEANUP, running, 'running')
+        spec.advise_parallel(CLEANUP, toolchain_abort)
+        with pretty_logging(stream=StringIO()) as s:
+            with self.assertRaises(ToolchainAbort):
+                spec.handle(CLEANUP)
+        # the sibling that was running completes, but the queued ones
+        # were never started.
+        self.assertEqual(['running'], called)
+        self.assertIn('triggered an abort: toolchain abort', s.getvalue())
+        self.assertIn(
+            "as an earlier advice stopped the handling", s.getvalue())
+
+    def test_spec_advise_parallel_block_handle_call(self):
+        spec = Spec()
+
+        def advice():
+            spec.handle(CLEANUP)
+
+        spec.advise_parallel(CLEANUP, advice)
+        spec.advise_parallel(CLEANUP, advice)
+        with pretty_logging(stream=StringIO()) as s:
+            spec.handle(CLEANUP)
+        self.assertIn(
+            "indirect invocation of 'handle' by 'handle' is forbidden",
+            s.getvalue())
+
     def test_spec_advice_no_infinite_pop(self):
         spec = Spec(counter=0)
         spec._advices[CLEANUP] = []
@@ -1460,6 +1650,104 @@ class ToolchainTestCase(unittest.TestCase):
             'module': 'changed',
         }, spec['logged_targetpaths'])
 
+    def test_toolchain_spec_compile_entry_logging_jobs(self):
+        # the ordering of the merged results and the overwrite logging
+        # must remain identical when entries are processed concurrently.
+
+        class CustomToolchain(Toolchain):
+            def build_compile_entries(self):
+                return [
+                    ToolchainSpecCompileEntry(
+                        'logged', 'log', 'logged',
+                        'calmjs_testing', logging.WARNING,
+                    ),
+                ]
+
+            def compile_logged_entry(self, spec, entry):
+                modname, source, target, modpath = entry
+                return {'module': modpath}, {'module': source}, [modname]
+
+        names = ['mod%02d' % i for i in range(20)]
+        custom_toolchain = CustomToolchain()
+        spec = Spec(
+            compile_jobs=4,
+            log_sourcepath=OrderedDict((name, name) for name in names),
+        )
+
+        with pretty_logging(logger='calmjs_testing', stream=StringIO()) as s:
+            custom_toolchain.compile(spec)
+
+        msg = s.getvalue()
+        self.assertIn(
+            "logged_modpaths['module'] is being rewritten from "
+            "'mod00' to 'mod01'", msg
+        )
+        self.assertIn(
+            "logged_modpaths['module'] is being rewritten from "
+            "'mod18' to 'mod19'", msg
+        )
+        self.assertEqual({'module': 'mod19'}, spec['logged_modpaths'])
+        self.assertEqual(names, spec['export_module_names'])
+
+    def test_toolchain_compile_task_graph(self):
+        class CustomToolchain(Toolchain):
+            def build_compile_entries(self):
+                return [
+                    ('first', 'first', 'first'),
+                    ('second', 'second', 'second'),
+                    ('first', 'first', 'first'),
+                ]
+
+            def compile_first(self, spec, entries):
+                return process_compile_entries(
+                    self.compile_first_entry, spec, entries)
+
+            def compile_first_entry(self, spec, entry):
+                modname, source, target, modpath = entry
+                return {modname: modpath}, {modname: target}, [modname]
+
+            compile_second = compile_first
+
+        custom_toolchain = CustomToolchain()
+        graph = custom_toolchain.build_compile_task_graph(Spec(), [])
+        self.assertEqual([
+            'entry:first', 'entry:second', 'entry:first:2', 'compile',
+        ], graph.names)
+        self.assertEqual(('entry:first',), graph.requires['entry:first:2'])
+        self.assertEqual(
+            ('entry:first', 'entry:second', 'entry:first:2'),
+            graph.requires['compile'])
+
+        spec = Spec(
+            compile_task_jobs=2,
+            first_sourcepath=OrderedDict([('a', 'a'), ('b', 'b')]),
+            second_sourcepath=OrderedDict([('c', 'c')]),
+        )
+        with pretty_logging(stream=StringIO()) as s:
+            custom_toolchain.compile(spec)
+        self.assertEqual(['a', 'b', 'c'], spec['export_module_names'])
+        self.assertEqual({'c': 'c'}, spec['second_modpaths'])
+        # the repeated entry is still aborted as before.
+        self.assertIn("aborting compile step ('first'", s.getvalue())
+
+    def test_toolchain_compile_task_graph_store_key_compile(self):
+        class CustomToolchain(Toolchain):
+            def build_compile_entries(self):
+                return [('compile', 'compile', 'compile')]
+
+            def compile_compile(self, spec, entries):
+                return process_compile_entries(
+                    self.compile_compile_entry, spec, entries)
+
+            def compile_compile_entry(self, spec, entry):
+                modname, source, target, modpath = entry
+                return {modname: modpath}, {modname: target}, [modname]
+
+        spec = Spec(compile_sourcepath={'a': 'a'})
+        CustomToolchain().compile(spec)
+        self.assertEqual(['a'], spec['export_module_names'])
+        self.assertEqual({'a': 'a'}, spec['compile_modpaths'])
+
     def test_toolchain_standard_good(self):
         # good, with a mock
         called = []
@@ -1537,6 +1825,66 @@ class ToolchainTestCase(unittest.TestCase):
         self.assertIn("realpath of 'build_dir' resolved to", s.getvalue())
         self.assertEqual(spec['build_dir'], real)
 
+    def test_toolchain_standard_build_dir_root(self):
+        root = mkdtemp(self)
+
+        def run(**kw):
+            spec = Spec(build_dir_root=root, **kw)
+            with self.assertRaises(NotImplementedError):
+                self.toolchain(spec)
+            return spec['build_dir']
+
+        build_dir = run(source_package_names=['example'])
+        self.assertTrue(build_dir.startswith(realpath(root)))
+        # the managed build directory is retained and unlocked.
+        self.assertTrue(exists(build_dir))
+        self.assertFalse(exists(join(build_dir, pardir, '.lock')))
+        self.assertEqual(build_dir, run(source_package_names=['example']))
+        self.assertNotEqual(build_dir, run(source_package_names=['other']))
+
+    def test_toolchain_standard_build_dir_root_setup_failure(self):
+        root = mkdtemp(self)
+
+        def setup_tracer(spec):
+            raise ValueError('setup failure')
+
+        self.toolchain.setup_tracer = setup_tracer
+        spec = Spec(build_dir_root=root)
+        with self.assertRaises(ValueError):
+            self.toolchain(spec)
+        # the lock is released despite the failure during setup.
+        self.assertTrue(exists(spec['build_dir']))
+        self.assertFalse(exists(join(spec['build_dir'], pardir, '.lock')))
+
+    def test_toolchain_standard_build_dir_root_retention(self):
+        root = mkdtemp(self)
+        for name in ('a', 'b', 'c'):
+            spec = Spec(
+                build_dir_root=root, build_dir_retention=1,
+                source_package_names=[name],
+            )
+            with self.assertRaises(NotImplementedError):
+                self.toolchain(spec)
+        # only the most recently used one is retained.
+        self.assertEqual(1, len(os.listdir(root)))
+
+    def test_toolchain_standard_build_dir_root_locked(self):
+        root = mkdtemp(self)
+        spec = Spec(build_dir_root=root)
+        fingerprint = self.toolchain.build_dir_fingerprint(spec)
+        lock_dir = join(realpath(root), fingerprint)
+        makedirs(lock_dir)
+        with open(join(lock_dir, '.lock'), 'w') as fd:
+            fd.write('%s %d' % (socket.gethostname(), os.getpid()))
+        stub_item_attr_value(
+            self, calmjs_cache, 'BUILD_DIR_LOCK_TIMEOUT', 0)
+        with pretty_logging(stream=StringIO()) as s:
+            with self.assertRaises(NotImplementedError):
+                self.toolchain(spec)
+        self.assertIn('falling back to a temporary build directory', (
+            s.getvalue()))
+        self.assertFalse(spec['build_dir'].startswith(realpath(root)))
+
     def test_toolchain_target_build_dir_inside(self):
         """
         Mostly a sanity check; who knows if anyone will write some
@@ -1603,6 +1951,72 @@ class ToolchainTestCase(unittest.TestCase):
         self.assertTrue(exists(join(build_dir, target3)))
         self.assertTrue(exists(join(build_dir, target4)))
 
+    def test_toolchain_compile_bundle_entry_materialize(self):
+        build_dir = mkdtemp(self)
+        src_dir = mkdtemp(self)
+        src = join(src_dir, 'mod.js')
+        pkg_dir = join(src_dir, 'pkg')
+        os.mkdir(pkg_dir)
+        with open(src, 'w') as fd:
+            fd.write('module.export = function () {};')
+        with open(join(pkg_dir, 'index.js'), 'w') as fd:
+            fd.write('module.export = 1;')
+
+        spec = {'build_dir': build_dir, 'bundle_materialize': ['hardlink']}
+        compile_bundle = partial(
+            toolchain_spec_compile_entries, self.toolchain,
+            process_name='bundle')
+        compile_bundle(spec, [
+            ('mod', src, 'mod.js', 'mod'),
+            ('pkg', pkg_dir, 'pkg', 'pkg'),
+        ])
+
+        self.assertTrue(os.path.samefile(src, join(build_dir, 'mod.js')))
+        self.assertTrue(os.path.samefile(
+            join(pkg_dir, 'index.js'), join(build_dir, 'pkg', 'index.js')))
+
+        # directories are synced on subsequent runs rather than failing
+        # as the target already exist.
+        with open(join(pkg_dir, 'extra.js'), 'w') as fd:
+            fd.write('module.export = 2;')
+        compile_bundle(spec, [('pkg', pkg_dir, 'pkg', 'pkg')])
+        self.assertTrue(exists(join(build_dir, 'pkg', 'extra.js')))
+
+        # writes through the opener of the toolchain into the build
+        # directory will not modify the linked source.
+        with self.toolchain.opener(join(build_dir, 'mod.js'), 'w') as fd:
+            fd.write('changed')
+        with open(src) as fd:
+            self.assertEqual('module.export = function () {};', fd.read())
+
+    def test_toolchain_compile_bundle_entry_sync_managed(self):
+        root = mkdtemp(self)
+        src_dir = mkdtemp(self)
+        pkg_dir = join(src_dir, 'pkg')
+        os.mkdir(pkg_dir)
+        for name in ('index.js', 'extra.js'):
+            with open(join(pkg_dir, name), 'w') as fd:
+                fd.write('module.export = 1;')
+
+        spec = Spec(build_dir_root=root)
+        self.toolchain.setup_managed_build_dir(spec)
+        build_dir = spec['build_dir']
+        self.assertIsNotNone(self.toolchain.bundle_sync_manifest(spec, 'pkg'))
+        self.assertIsNone(self.toolchain.bundle_sync_manifest(
+            {'build_dir': build_dir}, 'pkg'))
+        compile_bundle = partial(
+            toolchain_spec_compile_entries, self.toolchain,
+            process_name='bundle')
+        compile_bundle(spec, [('pkg', pkg_dir, 'pkg', 'pkg')])
+        with open(join(build_dir, 'pkg', 'other.js'), 'w') as fd:
+            fd.write('written by another entry')
+
+        os.remove(join(pkg_dir, 'extra.js'))
+        compile_bundle(spec, [('pkg', pkg_dir, 'pkg', 'pkg')])
+        self.assertEqual(['index.js', 'other.js'], sorted(
+            os.listdir(join(build_dir, 'pkg'))))
+        spec.handle(CLEANUP)
+
     def test_toolchain_setup_advice_abort_does_cleanup(self):
         spec = Spec()
 
@@ -1696,6 +2110,70 @@ class ToolchainLoaderPluginTestCase(unittest.TestCase):
         # recursive lookups are generally not needed, if the target
         # supplied _is_ the target.
 
+    def test_toolchain_plan(self):
+        reg = LoaderPluginRegistry('simple', _working_set=WorkingSet({
+            'simple': [
+                'foo = calmjs.tests.test_toolchain:MockLPHandler',
+            ],
+        }))
+        self.toolchain.compile_entries = self.toolchain.compile_entries + (
+            ToolchainSpecCompileEntry('loaderplugin', 'plugin', 'plugin'),)
+
+        def modname_source_to_target(spec, modname, source):
+            if modname == 'skipped':
+                raise ValueSkip('not needed')
+            if modname == 'failed':
+                raise ValueError('bad name')
+            return modname + '.js'
+
+        self.toolchain.modname_source_to_target = modname_source_to_target
+        spec = Spec(
+            calmjs_loaderplugin_registry=reg,
+            transpile_sourcepath={
+                'mod': '/src/mod.js',
+                'skipped': '/src/skipped.js',
+                'failed': '/src/failed.js',
+            },
+            plugin_sourcepath={
+                'foo!target.txt': '/src/target.txt',
+                'bar!target.txt': '/src/target.txt',
+            },
+        )
+        with pretty_logging(stream=StringIO()):
+            plan = self.toolchain.plan(spec)
+
+        self.assertEqual(plan['toolchain'], 'calmjs.toolchain:Toolchain')
+        self.assertEqual([{
+            'process': 'transpile',
+            'store_key': 'transpiled',
+            'modname': 'mod',
+            'source': '/src/mod.js',
+            'target': 'mod.js',
+            'modpath': 'mod',
+        }], [e for e in plan['entries'] if e['process'] == 'transpile'])
+        self.assertEqual({
+            'foo!target.txt': 'calmjs.tests.test_toolchain:MockLPHandler',
+            'bar!target.txt': None,
+        }, {
+            e['modname']: e['loaderplugin']
+            for e in plan['entries'] if e['process'] == 'loaderplugin'
+        })
+        self.assertEqual([{
+            'process': 'transpile',
+            'modname': 'failed',
+            'source': '/src/failed.js',
+            'method': 'modname_source_to_target',
+            'reason': 'bad name',
+            'skip': False,
+        }, {
+            'process': 'transpile',
+            'modname': 'skipped',
+            'source': '/src/skipped.js',
+            'method': 'modname_source_to_target',
+            'reason': 'not needed',
+            'skip': True,
+        }], sorted(plan['skipped'], key=lambda e: e['modname']))
+
     def test_toolchain_spec_prepare_loaderplugins_unsupported(self):
         spec = Spec()
         # really though, providing None shouldn't be supported, but
@@ -1963,6 +2441,462 @@ class NullToolchainTestCase(unittest.TestCase):
             "where modname='skip', source='skip'", s.getvalue(),
         )
 
+    def test_null_toolchain_dry_run(self):
+        source_dir = mkdtemp(self)
+        source_file = join(source_dir, 'source.js')
+        plan_file = join(mkdtemp(self), 'plan.json')
+        with open(source_file, 'w') as fd:
+            fd.write('var dummy = function () {};\n')
+
+        spec = Spec(
+            transpile_sourcepath={'dummy': source_file},
+            dry_run=True,
+            build_plan_file=plan_file,
+        )
+        self.toolchain(spec)
+        self.assertEqual(spec['prepare'], 'prepared')
+        self.assertNotIn('transpiled_targetpaths', spec)
+        self.assertNotIn('link', spec)
+        with open(plan_file) as fd:
+            plan = json.load(fd)
+        self.assertEqual(plan, spec['build_plan'])
+        self.assertEqual(['dummy.js'], [
+            entry['target'] for entry in plan['entries']])
+        # no build directory was created for the dry run.
+        self.assertNotIn('build_dir', spec)
+
+    def test_null_toolchain_dry_run_build_dir_root(self):
+        root = mkdtemp(self)
+        spec = Spec(
+            build_dir_root=root, dry_run=True, checkpoint=True,
+            compile_result_store='sqlite',
+        )
+        self.toolchain(spec)
+        self.assertIn('build_plan', spec)
+        self.assertNotIn('build_dir', spec)
+        # no store was created.
+        self.assertEqual('sqlite', spec['compile_result_store'])
+        # nothing was written into the root.
+        self.assertEqual([], os.listdir(root))
+
+    def write_prune_sources(self):
+        source_dir = mkdtemp(self)
+        sources = {
+            'app/main': 'var util = require("./util");\n'
+                        'var tmpl = require("text!./main.html");\n',
+            'app/util': 'define(["lib/base"], function(base) {});\n',
+            'lib/base': 'var base = {};\n',
+            'lib/unused': 'var unused = require("lib/base");\n',
+        }
+        paths = {}
+        for modname, text in sources.items():
+            paths[modname] = join(
+                source_dir, modname.replace('/', '_') + '.js')
+            with open(paths[modname], 'w') as fd:
+                fd.write(text)
+        html = join(source_dir, 'main.html')
+        with open(html, 'w') as fd:
+            fd.write('<div></div>\n')
+        return paths, html
+
+    def test_toolchain_spec_prune_unreachable(self):
+        paths, html = self.write_prune_sources()
+        spec = Spec(
+            transpile_sourcepath={
+                k: v for k, v in paths.items() if k.startswith('app/')},
+            bundle_sourcepath={
+                k: v for k, v in paths.items() if k.startswith('lib/')},
+            plugin_sourcepath={
+                'text!app/main.html': html,
+                'text!app/other.html': html,
+            },
+            loaderplugin_sourcepath_maps={
+                'text': {
+                    'text!app/main.html': html,
+                    'text!app/other.html': html,
+                },
+            },
+        )
+        with pretty_logging(stream=StringIO()) as s:
+            removed = toolchain_spec_prune_unreachable(
+                self.toolchain, spec, ['app/main'])
+        self.assertEqual(['lib/unused', 'text!app/other.html'], removed)
+        self.assertEqual(
+            sorted(spec['transpile_sourcepath']), ['app/main', 'app/util'])
+        self.assertEqual(sorted(spec['bundle_sourcepath']), ['lib/base'])
+        self.assertEqual(
+            sorted(spec['plugin_sourcepath']), ['text!app/main.html'])
+        self.assertEqual(
+            sorted(spec['loaderplugin_sourcepath_maps']['text']),
+            ['text!app/main.html'])
+        self.assertIn('pruned 2 of 6 module(s)', s.getvalue())
+
+    def test_toolchain_spec_prune_unreachable_no_entries(self):
+        paths, html = self.write_prune_sources()
+        spec = Spec(bundle_sourcepath=dict(paths))
+        with pretty_logging(stream=StringIO()) as s:
+            removed = toolchain_spec_prune_unreachable(self.toolchain, spec)
+        self.assertEqual([], removed)
+        self.assertEqual(spec['bundle_sourcepath'], paths)
+        self.assertIn(
+            'no entry module names provided; not pruning', s.getvalue())
+
+    def test_toolchain_spec_prune_unreachable_transpile_entries(self):
+        # the modules to be transpiled are the entry modules by default.
+        paths, html = self.write_prune_sources()
+        spec = Spec(
+            transpile_sourcepath={
+                k: v for k, v in paths.items() if k.startswith('app/')},
+            bundle_sourcepath={
+                k: v for k, v in paths.items() if k.startswith('lib/')},
+        )
+        with pretty_logging(stream=StringIO()) as s:
+            removed = toolchain_spec_prune_unreachable(self.toolchain, spec)
+        self.assertEqual(['lib/unused'], removed)
+        self.assertEqual(sorted(spec['bundle_sourcepath']), ['lib/base'])
+        self.assertIn(
+            'using the 2 module(s) to be transpiled as the entry modules',
+            s.getvalue())
+
+    def test_toolchain_spec_prune_unreachable_syntax_error(self):
+        paths, html = self.write_prune_sources()
+        with open(paths['app/main'], 'w') as fd:
+            fd.write('var main = require("app/util";\n')
+        spec = Spec(
+            transpile_sourcepath=dict(paths),
+            export_module_names=['app/main'],
+        )
+        with pretty_logging(stream=StringIO()) as s:
+            removed = toolchain_spec_prune_unreachable(self.toolchain, spec)
+        self.assertEqual(['app/util', 'lib/base', 'lib/unused'], removed)
+        self.assertEqual(['app/main'], list(spec['transpile_sourcepath']))
+        self.assertIn('failed to interrogate the imports', s.getvalue())
+
+    def test_null_toolchain_prune_unreachable(self):
+        paths, html = self.write_prune_sources()
+        spec = Spec(
+            transpile_sourcepath=dict(paths),
+            prune_unreachable=True,
+            entry_module_names=['app/util'],
+        )
+        with pretty_logging(stream=StringIO()):
+            self.toolchain(spec)
+        self.assertEqual(
+            sorted(spec['transpiled_modpaths']), ['app/util', 'lib/base'])
+
+    def test_null_toolchain_prune_unreachable_default_entries(self):
+        paths, html = self.write_prune_sources()
+        spec = Spec(
+            transpile_sourcepath={'app/util': paths['app/util']},
+            bundle_sourcepath={
+                k: v for k, v in paths.items() if k.startswith('lib/')},
+            prune_unreachable=True,
+        )
+        with pretty_logging(stream=StringIO()):
+            self.toolchain(spec)
+        self.assertEqual(sorted(spec['bundled_modpaths']), ['lib/base'])
+
+    def test_null_toolchain_compile_result_store(self):
+        source_dir = mkdtemp(self)
+        sources = {}
+        for name in ('a', 'b', 'c'):
+            sources[name] = join(source_dir, name + '.js')
+            with open(sources[name], 'w') as fd:
+                fd.write('var %s = 1;\n' % name)
+
+        captured = {}
+
+        def capture(spec):
+            captured['sourcepath'] = 'transpile_sourcepath' in spec
+            captured['modpaths'] = spec['transpiled_modpaths']
+            captured['values'] = dict(spec['transpiled_modpaths'])
+            captured['store'] = spec['compile_result_store']
+
+        spec = Spec(
+            transpile_sourcepath=sources,
+            compile_result_store='sqlite',
+            compile_jobs=2,
+            release_spec_keys={AFTER_COMPILE: ['transpile_sourcepath']},
+        )
+        spec.advise(BEFORE_LINK, capture, spec)
+        self.toolchain(spec)
+
+        self.assertFalse(captured['sourcepath'])
+        self.assertTrue(isinstance(
+            captured['modpaths'], calmjs_resultstore.StoredMapping))
+        self.assertEqual(
+            {'a': 'a', 'b': 'b', 'c': 'c'}, captured['values'])
+        self.assertEqual(['a', 'b', 'c'], sorted(spec['export_module_names']))
+        # the created store is closed, with the stored values copied
+        # back into the spec.
+        self.assertFalse(exists(captured['store'].path))
+        self.assertNotIn('compile_result_store', spec)
+        self.assertEqual(
+            {'a': 'a', 'b': 'b', 'c': 'c'}, spec['transpiled_modpaths'])
+        self.assertTrue(isinstance(spec['transpiled_targetpaths'], dict))
+        self.assertEqual({
+            'a': 'a.js', 'b': 'b.js', 'c': 'c.js',
+        }, spec['transpiled_targetpaths'])
+
+    def test_null_toolchain_compile_result_store_provided(self):
+        source = join(mkdtemp(self), 'a.js')
+        with open(source, 'w') as fd:
+            fd.write('var a = 1;\n')
+        store = calmjs_resultstore.ResultStore()
+        self.addCleanup(store.close)
+        spec = Spec(
+            transpile_sourcepath={'a': source},
+            compile_result_store=store,
+        )
+        self.toolchain(spec)
+        self.assertIs(store, spec['compile_result_store'])
+        self.assertEqual({'a': 'a'}, dict(spec['transpiled_modpaths']))
+
+    def test_null_toolchain_compile_result_store_unsupported(self):
+        spec = Spec(compile_result_store='unknown')
+        with pretty_logging(stream=StringIO()) as s:
+            self.toolchain(spec)
+        self.assertIn("unsupported value for 'compile_result_store'", (
+            s.getvalue()))
+        self.assertNotIn('compile_result_store', spec)
+        self.assertEqual({}, spec['transpiled_modpaths'])
+
+    def test_null_toolchain_checkpoint_resume(self):
+        build_dir = mkdtemp(self)
+        source = join(mkdtemp(self), 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var dummy = function () {};\n')
+
+        def make_spec(**kw):
+            return Spec(
+                build_dir=build_dir,
+                transpile_sourcepath={'dummy': source},
+                **kw
+            )
+
+        def fail():
+            raise ToolchainAbort('bundler crashed')
+
+        spec = make_spec(checkpoint=True)
+        spec.advise(BEFORE_LINK, fail)
+        with pretty_logging(stream=StringIO()):
+            with self.assertRaises(ToolchainAbort):
+                self.toolchain(spec)
+        self.assertNotIn('link', spec)
+
+        with open(join(build_dir, '.calmjs_checkpoint.json')) as fd:
+            checkpoint = json.load(fd)
+        self.assertEqual('assemble', checkpoint['step'])
+        self.assertEqual(
+            {'dummy': 'dummy'}, checkpoint['spec']['transpiled_modpaths'])
+
+        called = []
+        spec = make_spec(resume_from='link')
+        spec.advise(BEFORE_PREPARE, called.append, 'prepare')
+        spec.advise(BEFORE_LINK, called.append, 'link')
+        with pretty_logging(stream=StringIO()) as s:
+            self.toolchain(spec)
+        self.assertIn("resuming from step 'link'", s.getvalue())
+        self.assertEqual(['link'], called)
+        self.assertEqual('linked', spec['link'])
+        self.assertEqual('prepared', spec['prepare'])
+        self.assertEqual({'dummy': 'dummy'}, spec['transpiled_modpaths'])
+
+        # modified sources will invalidate the checkpoint.
+        with open(source, 'w') as fd:
+            fd.write('var dummy = function () { return 1; };\n')
+        with pretty_logging(stream=StringIO()):
+            with self.assertRaises(ToolchainAbort) as e:
+                self.toolchain(make_spec(resume_from='link'))
+        self.assertIn('different spec or sources', str(e.exception))
+
+    def test_null_toolchain_checkpoint_resume_written(self):
+        build_dir = mkdtemp(self)
+        source = join(mkdtemp(self), 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var dummy = function () {};\n')
+
+        def narrow(spec):
+            spec['export_module_names'] = ['a']
+
+        def fail():
+            raise ToolchainAbort('failed')
+
+        spec = Spec(
+            build_dir=build_dir, checkpoint=True,
+            transpile_sourcepath={'dummy': source},
+            export_module_names=['a', 'b'], compile_result_store='sqlite',
+        )
+        spec.advise(AFTER_PREPARE, narrow, spec)
+        spec.advise(AFTER_PREPARE, spec_update_loaderplugin_registry, spec)
+        spec.advise(BEFORE_LINK, fail)
+        with pretty_logging(stream=StringIO()):
+            with self.assertRaises(ToolchainAbort):
+                self.toolchain(spec)
+
+        with open(join(build_dir, '.calmjs_checkpoint.json')) as fd:
+            checkpoint = json.load(fd)
+        self.assertEqual('assemble', checkpoint['step'])
+        self.assertIn('export_module_names', checkpoint['written'])
+        self.assertEqual(
+            ['calmjs_loaderplugin_registry'], checkpoint['derived'])
+        # the stored compile results are recorded as mappings.
+        self.assertEqual(
+            {'dummy': 'dummy'}, checkpoint['spec']['transpiled_modpaths'])
+
+        # the values written by the completed steps take precedence.
+        spec = Spec(
+            build_dir=build_dir, resume_from='link',
+            transpile_sourcepath={'dummy': source},
+            export_module_names=['a', 'b'], compile_result_store='sqlite',
+        )
+        with pretty_logging(stream=StringIO()):
+            self.toolchain(spec)
+        # as narrowed by prepare and extended by compile.
+        self.assertEqual(['a', 'dummy'], spec['export_module_names'])
+        self.assertEqual({'dummy': 'dummy'}, spec['transpiled_modpaths'])
+        self.assertEqual('linked', spec['link'])
+        self.assertTrue(isinstance(
+            spec['calmjs_loaderplugin_registry'], BaseLoaderPluginRegistry))
+
+    def assert_checkpoint_resume_setup(self, key, **kw):
+        # the compile step sets up values that cannot be serialized.
+        build_dir = mkdtemp(self)
+        source = join(mkdtemp(self), 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var dummy = function () {};\n')
+
+        def fail():
+            raise ToolchainAbort('failed')
+
+        spec = Spec(
+            build_dir=build_dir, checkpoint=True,
+            transpile_sourcepath={'dummy': source}, **kw)
+        spec.advise(BEFORE_LINK, fail)
+        with pretty_logging(stream=StringIO()) as s:
+            with self.assertRaises(ToolchainAbort):
+                self.toolchain(spec)
+        self.assertNotIn('unable to write checkpoint', s.getvalue())
+        with open(join(build_dir, '.calmjs_checkpoint.json')) as fd:
+            checkpoint = json.load(fd)
+        self.assertEqual('assemble', checkpoint['step'])
+        self.assertIn(key, checkpoint['derived'])
+
+        spec = Spec(
+            build_dir=build_dir, resume_from='link',
+            transpile_sourcepath={'dummy': source}, **kw)
+        with pretty_logging(stream=StringIO()) as s:
+            self.toolchain(spec)
+        self.assertIn("resuming from step 'link'", s.getvalue())
+        self.assertEqual('linked', spec['link'])
+        self.assertTrue(exists(join(build_dir, 'dummy.js')))
+        return spec
+
+    def test_null_toolchain_checkpoint_resume_compile_cache(self):
+        spec = self.assert_checkpoint_resume_setup(
+            'compile_cache', compile_cache_dir=mkdtemp(self))
+        self.assertTrue(isinstance(
+            spec['compile_cache'], calmjs_cache.CompileCache))
+
+    def test_null_toolchain_checkpoint_resume_build_fs(self):
+        spec = self.assert_checkpoint_resume_setup(
+            'build_fs', build_fs='memory')
+        self.assertTrue(isinstance(
+            spec['build_fs'], calmjs_buildfs.MemoryBuildFS))
+
+    def test_null_toolchain_checkpoint_unserializable(self):
+        build_dir = mkdtemp(self)
+
+        def assign(spec):
+            spec['compiled_object'] = object()
+
+        spec = Spec(build_dir=build_dir, checkpoint=True)
+        spec.advise(AFTER_COMPILE, assign, spec)
+        with pretty_logging(stream=StringIO()) as s:
+            self.toolchain(spec)
+        self.assertIn(
+            "unable to write checkpoint for step 'compile' as the values "
+            "for the keys ['compiled_object'] cannot be serialized",
+            s.getvalue())
+
+        # only the checkpoint for the prepare step remains usable.
+        with open(join(build_dir, '.calmjs_checkpoint.json')) as fd:
+            self.assertEqual('prepare', json.load(fd)['step'])
+        with pretty_logging(stream=StringIO()):
+            with self.assertRaises(ToolchainAbort) as e:
+                self.toolchain(Spec(build_dir=build_dir, resume_from='link'))
+        self.assertIn("only completed the step 'prepare'", str(e.exception))
+
+    def test_null_toolchain_resume_incomplete(self):
+        build_dir = mkdtemp(self)
+
+        def fail():
+            raise ToolchainAbort('failed')
+
+        spec = Spec(build_dir=build_dir, checkpoint=True)
+        spec.advise(BEFORE_COMPILE, fail)
+        with pretty_logging(stream=StringIO()):
+            with self.assertRaises(ToolchainAbort):
+                self.toolchain(spec)
+            # the prepare step was completed, so compile may be resumed
+            self.toolchain(Spec(build_dir=build_dir, resume_from='compile'))
+            with self.assertRaises(ToolchainAbort) as e:
+                self.toolchain(Spec(
+                    build_dir=mkdtemp(self), resume_from='link'))
+        self.assertIn('could not be read', str(e.exception))
+
+        spec = Spec(build_dir=build_dir, checkpoint=True)
+        spec.advise(BEFORE_COMPILE, fail)
+        with pretty_logging(stream=StringIO()):
+            with self.assertRaises(ToolchainAbort):
+                self.toolchain(spec)
+            with self.assertRaises(ToolchainAbort) as e:
+                self.toolchain(Spec(build_dir=build_dir, resume_from='link'))
+        self.assertIn("only completed the step 'prepare'", str(e.exception))
+
+    def test_null_toolchain_resume_invalid(self):
+        with self.assertRaises(ValueError):
+            self.toolchain(Spec(resume_from='unknown'))
+        # resuming from the first step is a normal execution.
+        spec = Spec(resume_from='prepare')
+        self.toolchain(spec)
+        self.assertEqual('linked', spec['link'])
+
+    def test_null_toolchain_trace(self):
+        source_dir = mkdtemp(self)
+        source_file = join(source_dir, 'source.js')
+        trace_file = join(mkdtemp(self), 'trace.json')
+        with open(source_file, 'w') as fd:
+            fd.write('var dummy = function () {};\n')
+
+        def advice():
+            pass
+
+        spec = Spec(
+            transpile_sourcepath={'dummy': source_file},
+            trace_file=trace_file,
+        )
+        spec.advise(BEFORE_LINK, advice)
+        self.toolchain(spec)
+
+        with open(trace_file) as fd:
+            events = json.load(fd)['traceEvents']
+        names = {(e['cat'], e['name']) for e in events}
+        for step in ('setup', 'prepare', 'compile', 'assemble', 'link',
+                     'finalize'):
+            self.assertIn(('phase', step), names)
+        self.assertIn(('compile', 'dummy'), names)
+        advices = [
+            e for e in events if e['cat'] == 'advice' and
+            e['args']['group'] == 'before_link'
+        ]
+        self.assertEqual(1, len(advices))
+        self.assertIn('advice', advices[0]['name'])
+        for event in events:
+            self.assertEqual('X', event['ph'])
+            self.assertGreaterEqual(event['dur'], 0)
+            self.assertIn('tdur', event)
+
     def test_null_toolchain_transpile_sources(self):
         source_dir = mkdtemp(self)
         build_dir = mkdtemp(self)
@@ -2001,6 +2935,34 @@ class NullToolchainTestCase(unittest.TestCase):
         })
         self.assertTrue(exists(join(build_dir, 'namespace.dummy.source.js')))
 
+    def test_null_toolchain_transpile_sources_jobs(self):
+        source_dir = mkdtemp(self)
+        build_dir = mkdtemp(self)
+        transpile_sourcepath = OrderedDict()
+        for i in range(12):
+            source_file = join(source_dir, 'source%d.js' % i)
+            with open(source_file, 'w') as fd:
+                fd.write('var dummy%d = function () {};\n' % i)
+            transpile_sourcepath['ns/sub%d/source%d' % (i % 3, i)] = (
+                source_file)
+
+        spec = Spec(
+            build_dir=build_dir,
+            compile_jobs=4,
+            transpile_sourcepath=transpile_sourcepath,
+        )
+        self.toolchain(spec)
+
+        self.assertEqual(
+            list(transpile_sourcepath.keys()), spec['export_module_names'])
+        for i in range(12):
+            target = join(
+                build_dir, 'ns', 'sub%d' % (i % 3), 'source%d.js' % i)
+            self.assertTrue(exists(target))
+            with open(target) as fd:
+                self.assertEqual(
+                    'var dummy%d = function () {};\n' % i, fd.read())
+
     def test_null_toolchain_bundle_sources(self):
         source_dir = mkdtemp(self)
         bundle_dir = mkdtemp(self)
@@ -2309,3 +3271,293 @@ class ES5ToolchainTestCase(unittest.TestCase):
         self.assertEqual(len(result['sources']), 1)
         self.assertEqual(basename(result['sources'][0]), 'source.js')
         self.assertEqual(result['file'], target)
+
+    def test_transpiler_sourcemap_inline(self):
+        build_dir = mkdtemp(self)
+        srcdir = mkdtemp(self)
+        source = join(srcdir, 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var dummy = function() {\n};\n')
+
+        spec = Spec(
+            build_dir=build_dir, generate_source_map=True,
+            source_map_mode='inline',
+        )
+        self.toolchain.transpile_modname_source_target(
+            spec, 'dummy', source, 'target.js')
+        with open(join(build_dir, 'target.js')) as fd:
+            self.assertIn(
+                '//# sourceMappingURL=data:application/json;base64',
+                fd.read())
+        self.assertFalse(exists(join(build_dir, 'target.js.map')))
+
+    def test_compile_sourcemap_index(self):
+        build_dir = mkdtemp(self)
+        srcdir = mkdtemp(self)
+        sources = {}
+        for name, code in (
+                ('a', 'var a = function() {\n};\n'),
+                ('b', 'var b = 1;\n')):
+            sources[name] = join(srcdir, name + '.js')
+            with open(sources[name], 'w') as fd:
+                fd.write(code)
+
+        spec = Spec(
+            build_dir=build_dir,
+            compile_cache_dir=mkdtemp(self),
+            generate_source_map=True,
+            source_map_mode='index',
+            transpile_sourcepath=sources,
+        )
+        with pretty_logging(stream=StringIO()) as stream:
+            self.toolchain.compile(spec)
+        # the targets are assumed to be concatenated in the order of the
+        # export module names by default.
+        self.assertEqual(
+            ['a.js', 'b.js', 'index.js.map'], sorted(os.listdir(build_dir)))
+        self.assertEqual(2, len(spec['source_map_records']))
+        self.assertIn("wrote index source map with 2 section(s)", (
+            stream.getvalue()))
+        with open(join(build_dir, 'index.js.map')) as fd:
+            self.assertEqual(
+                [name + '.js' for name in spec['export_module_names']],
+                [section['map']['file'] for section in json.load(fd)[
+                    'sections']],
+            )
+
+        # the order may be unknown for subclasses.
+        os.unlink(join(build_dir, 'index.js.map'))
+        self.toolchain.source_map_index_targets = lambda spec: None
+        with pretty_logging(stream=StringIO()) as stream:
+            self.toolchain.compile(Spec(
+                build_dir=build_dir,
+                generate_source_map=True,
+                source_map_mode='index',
+                transpile_sourcepath=sources,
+            ))
+        self.assertIn("the order of the targets is unknown", (
+            stream.getvalue()))
+        self.assertEqual(['a.js', 'b.js'], sorted(os.listdir(build_dir)))
+
+        spec = Spec(
+            build_dir=build_dir,
+            generate_source_map=True,
+            source_map_mode='index',
+            transpile_sourcepath=sources,
+        )
+        self.toolchain.source_map_index_targets = lambda spec: [
+            'b.js', 'a.js']
+        self.toolchain.compile(spec)
+        self.assertEqual(
+            ['a.js', 'b.js', 'index.js.map'], sorted(os.listdir(build_dir)))
+        self.assertFalse(exists(join(build_dir, 'a.js.map')))
+        with open(join(build_dir, 'a.js')) as fd:
+            self.assertNotIn('sourceMappingURL', fd.read())
+
+        with open(join(build_dir, 'index.js.map')) as fd:
+            index = json.load(fd)
+        self.assertEqual(3, index['version'])
+        b, a = index['sections']
+        self.assertEqual({'line': 0, 'column': 0}, b['offset'])
+        self.assertEqual({'line': 1, 'column': 0}, a['offset'])
+        self.assertEqual('a.js', a['map']['file'])
+        self.assertEqual('AAAA;AACA;', a['map']['mappings'])
+        self.assertEqual(
+            basename(sources['b']), basename(b['map']['sources'][0]))
+
+        # a specific order may be generated for linkers, with the
+        # offsets derived from the contents of the targets.
+        index = self.toolchain.generate_source_map_index(
+            spec, ['b.js', 'a.js'], separator=';')
+        b, a = index['sections']
+        self.assertEqual({'line': 0, 'column': 0}, b['offset'])
+        self.assertEqual({'line': 1, 'column': 1}, a['offset'])
+        index = self.toolchain.generate_source_map_index(spec, ['b.js'])
+        self.assertEqual(1, len(index['sections']))
+
+    def test_compile_transpile_ast_cache(self):
+        srcdir = mkdtemp(self)
+        source = join(srcdir, 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var dummy = require("dummy/base");\n')
+
+        spec = Spec(
+            build_dir=mkdtemp(self),
+            transpile_sourcepath={'dummy': source},
+        )
+        ast_cache = self.toolchain.setup_ast_cache(spec)
+        tree = interrogate.parse_path(source, spec['ast_cache'])
+        self.toolchain.compile(spec)
+        # the tree from interrogation was reused by the transpile step.
+        self.assertIs(tree, ast_cache.parse(self.toolchain.parser, source))
+        self.assertEqual(1, ast_cache.misses)
+        self.assertEqual(2, ast_cache.hits)
+
+        # the cache provided for the build is released with it.
+        spec.handle(CLEANUP)
+        self.assertNotIn('ast_cache', spec)
+
+        # but not one that was provided.
+        spec = Spec(ast_cache=ast_cache)
+        self.assertIs(ast_cache, self.toolchain.setup_ast_cache(spec))
+        spec.handle(CLEANUP)
+        self.assertIs(ast_cache, spec['ast_cache'])
+
+    def test_compile_transpile_memory_build_fs(self):
+        srcdir = mkdtemp(self)
+        build_dir = mkdtemp(self)
+        js_code = 'var dummy = function() {\n};\n'
+        source = join(srcdir, 'source.js')
+        with open(source, 'w') as fd:
+            fd.write(js_code)
+
+        spec = Spec(
+            build_dir=build_dir,
+            build_fs='memory',
+            generate_source_map=True,
+            transpile_sourcepath={'dummy': source},
+        )
+        self.toolchain.compile(spec)
+        fs = spec['build_fs']
+        self.assertFalse(exists(join(build_dir, 'dummy.js')))
+        with fs.open(join(build_dir, 'dummy.js')) as fd:
+            self.assertIn(js_code, fd.read())
+
+        # the files are written out before the link step.
+        spec.handle(BEFORE_LINK)
+        self.assertEqual({}, fs.files)
+        with open(join(build_dir, 'dummy.js')) as fd:
+            self.assertIn('sourceMappingURL=dummy.js.map', fd.read())
+        with open(join(build_dir, 'dummy.js.map')) as fd:
+            self.assertEqual(json.load(fd)['file'], 'dummy.js')
+
+    def test_compile_transpile_memory_build_fs_spill(self):
+        srcdir = mkdtemp(self)
+        build_dir = mkdtemp(self)
+        source = join(srcdir, 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var dummy = 1;\n')
+
+        spec = Spec(
+            build_dir=build_dir,
+            build_fs='memory',
+            build_fs_spill_limit=0,
+            transpile_sourcepath={'dummy': source},
+        )
+        self.toolchain.compile(spec)
+        self.assertEqual({}, spec['build_fs'].files)
+        self.assertTrue(exists(join(build_dir, 'dummy.js')))
+
+    def test_compile_transpile_entry_compile_cache(self):
+        srcdir = mkdtemp(self)
+        cache_dir = mkdtemp(self)
+        js_code = 'var dummy = function() {\n};\n'
+        source = join(srcdir, 'source.js')
+        with open(source, 'w') as fd:
+            fd.write(js_code)
+
+        called = []
+        transpile = self.toolchain.transpile_modname_source_target
+
+        def counted(*a):
+            called.append(a[1:])
+            return transpile(*a)
+
+        self.toolchain.transpile_modname_source_target = counted
+
+        def run(code=js_code):
+            build_dir = mkdtemp(self)
+            spec = Spec(
+                build_dir=build_dir,
+                compile_cache_dir=cache_dir,
+                generate_source_map=True,
+                transpile_sourcepath={'dummy': source},
+            )
+            self.toolchain.compile(spec)
+            self.assertEqual(spec['transpiled_targetpaths'], {
+                'dummy': 'dummy.js'})
+            with open(join(build_dir, 'dummy.js')) as fd:
+                self.assertIn(code, fd.read())
+            self.assertTrue(exists(join(build_dir, 'dummy.js.map')))
+            return spec
+
+        spec = run()
+        self.assertEqual(1, len(called))
+        self.assertEqual(1, spec['compile_cache'].misses)
+        self.assertTrue(exists(join(cache_dir, 'manifest.json')))
+
+        # a fresh build restores from the cache.
+        spec = run()
+        self.assertEqual(1, len(called))
+        self.assertEqual(1, spec['compile_cache'].hits)
+
+        # modifying the source will invalidate the entry.
+        with open(source, 'w') as fd:
+            fd.write('var dummy = 1;\n')
+        spec = run('var dummy = 1;\n')
+        self.assertEqual(2, len(called))
+
+    def test_compile_transpile_entry_compile_cache_build_dir(self):
+        # the source maps refer to the sources relative to the build
+        # directory, so a build directory at a different depth must not
+        # reuse the cached outputs.
+        root = mkdtemp(self)
+        cache_dir = mkdtemp(self)
+        source = join(root, 'src', 'source.js')
+        os.makedirs(join(root, 'src'))
+        with open(source, 'w') as fd:
+            fd.write('var dummy = function() {\n};\n')
+
+        def run(*build_dir):
+            build_dir = join(root, *build_dir)
+            os.makedirs(build_dir)
+            spec = Spec(
+                build_dir=build_dir,
+                compile_cache_dir=cache_dir,
+                generate_source_map=True,
+                transpile_sourcepath={'dummy': source},
+            )
+            self.toolchain.compile(spec)
+            with open(join(build_dir, 'dummy.js.map')) as fd:
+                return spec, json.load(fd)['sources']
+
+        spec, sources = run('b1')
+        self.assertEqual(['../src/source.js'], sources)
+        self.assertEqual(1, spec['compile_cache'].misses)
+
+        spec, sources = run('deep', 'er', 'b2')
+        self.assertEqual(['../../../src/source.js'], sources)
+        self.assertEqual(0, spec['compile_cache'].hits)
+        self.assertEqual(1, spec['compile_cache'].misses)
+
+        # a build directory at the same depth will reuse them.
+        spec, sources = run('b3')
+        self.assertEqual(['../src/source.js'], sources)
+        self.assertEqual(1, spec['compile_cache'].hits)
+
+    def test_compile_bundle_entry_compile_cache(self):
+        srcdir = mkdtemp(self)
+        build_dir = mkdtemp(self)
+        cache_dir = mkdtemp(self)
+        source = join(srcdir, 'source.js')
+        with open(source, 'w') as fd:
+            fd.write('var dummy = 1;\n')
+
+        def run():
+            spec = Spec(
+                build_dir=build_dir,
+                compile_cache_dir=cache_dir,
+                bundle_sourcepath={'dummy': source},
+            )
+            self.toolchain.compile(spec)
+            self.assertEqual(spec['export_module_names'], ['dummy'])
+            return spec['compile_cache']
+
+        self.assertEqual(1, run().misses)
+        # the target in the same build directory is left untouched.
+        self.assertEqual(1, run().hits)
+        with open(join(build_dir, 'dummy.js'), 'w') as fd:
+            fd.write('var changed = 1;\n')
+        self.assertEqual(1, run().misses)
+        with open(join(build_dir, 'dummy.js')) as fd:
+            self.assertEqual('var dummy = 1;\n', fd.read())
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import threading
+from os.path import join
+
+from calmjs.trace import Tracer
+from calmjs.trace import trace_span
+
+from calmjs.testing.utils import mkdtemp
+
+
+class TracerTestCase(unittest.TestCase):
+
+    def test_span(self):
+        tracer = Tracer()
+        with tracer.span('outer', 'phase'):
+            with tracer.span('inner', 'advice', group='setup'):
+                pass
+        inner, outer = tracer.events
+        self.assertEqual('inner', inner['name'])
+        self.assertEqual({'group': 'setup'}, inner['args'])
+        self.assertNotIn('args', outer)
+        self.assertEqual(threading.current_thread().ident, outer['tid'])
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['dur'], inner['dur'])
+
+    def test_span_exception(self):
+        tracer = Tracer()
+        with self.assertRaises(ValueError):
+            with tracer.span('failed', 'phase'):
+                raise ValueError('failure')
+        self.assertEqual(1, len(tracer.events))
+
+    def test_dump(self):
+        tracer = Tracer()
+        with tracer.span('step', 'phase'):
+            pass
+        target = join(mkdtemp(self), 'trace.json')
+        tracer.dump(target)
+        with open(target) as fd:
+            result = json.load(fd)
+        self.assertEqual('ms', result['displayTimeUnit'])
+        self.assertEqual('step', result['traceEvents'][0]['name'])
+
+    def test_trace_span_no_tracer(self):
+        with trace_span(None, 'step', 'phase'):
+            pass
+        tracer = Tracer()
+        with trace_span(tracer, 'step', 'phase'):
+            pass
+        self.assertEqual(1, len(tracer.events))
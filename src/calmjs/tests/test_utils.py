@@ -2,6 +2,7 @@
 import unittest
 import errno
 import io
+import json
 import logging
 import os
 from os.path import join
@@ -17,6 +18,10 @@ from calmjs.utils import finalize_env
 from calmjs.utils import fork_exec
 from calmjs.utils import pretty_logging
 from calmjs.utils import raise_os_error
+from calmjs.utils import ensure_dir
+from calmjs.utils import materialize_file
+from calmjs.utils import sync_tree
+from calmjs.utils import unlink_shared
 
 from calmjs.testing.mocks import StringIO
 from calmjs.testing.utils import mkdtemp
@@ -57,6 +62,119 @@ class RequirementCommaListTestCase(unittest.TestCase):
         )
 
 
+class MaterializeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp(self)
+        self.source = join(self.tmpdir, 'source')
+        os.mkdir(self.source)
+        os.mkdir(join(self.source, 'sub'))
+        for name in ('a.js', join('sub', 'b.js')):
+            with open(join(self.source, name), 'w') as fd:
+                fd.write('/* %s */' % name)
+
+    def test_ensure_dir(self):
+        target = join(self.tmpdir, 'new', 'dir')
+        ensure_dir(target)
+        self.assertTrue(os.path.isdir(target))
+        # already exists.
+        ensure_dir(target)
+        with self.assertRaises(OSError):
+            ensure_dir(join(self.source, 'a.js'))
+
+    def test_materialize_file_copy(self):
+        target = join(self.tmpdir, 'a.js')
+        self.assertEqual('copy', materialize_file(
+            join(self.source, 'a.js'), target))
+        self.assertFalse(os.path.samefile(join(self.source, 'a.js'), target))
+        with open(target) as fd:
+            self.assertEqual('/* a.js */', fd.read())
+
+    def test_materialize_file_hardlink_replaces(self):
+        target = join(self.tmpdir, 'a.js')
+        with open(target, 'w') as fd:
+            fd.write('stale')
+        self.assertEqual('hardlink', materialize_file(
+            join(self.source, 'a.js'), target, ['hardlink']))
+        self.assertTrue(os.path.samefile(join(self.source, 'a.js'), target))
+
+    def test_materialize_file_fallback(self):
+        target = join(self.tmpdir, 'a.js')
+        with pretty_logging(stream=StringIO()) as s:
+            self.assertEqual('copy', materialize_file(
+                join(self.source, 'a.js'), target, ['no_such', 'copy']))
+        self.assertIn("unknown materialize strategy 'no_such'", s.getvalue())
+
+        # failure of a strategy will fall through to the next one.
+        os.remove(target)
+        with pretty_logging(stream=StringIO()):
+            self.assertIn(materialize_file(
+                join(self.source, 'a.js'), target, ['reflink']),
+                ('reflink', 'copy'))
+        with open(target) as fd:
+            self.assertEqual('/* a.js */', fd.read())
+
+    def test_sync_tree(self):
+        target = join(self.tmpdir, 'target')
+        self.assertEqual(sorted(sync_tree(self.source, target)), [
+            'a.js', join('sub', 'b.js')])
+        # nothing changed.
+        self.assertEqual(sync_tree(self.source, target), [])
+
+        with open(join(self.source, 'a.js'), 'w') as fd:
+            fd.write('/* a.js changed */')
+        os.mkdir(join(target, 'other'))
+        with open(join(target, 'other.js'), 'w') as fd:
+            fd.write('other')
+        self.assertEqual(sync_tree(self.source, target), ['a.js'])
+        # files not from the source are left untouched.
+        self.assertEqual(
+            sorted(os.listdir(target)), ['a.js', 'other', 'other.js', 'sub'])
+        with open(join(target, 'a.js')) as fd:
+            self.assertEqual('/* a.js changed */', fd.read())
+
+    def test_sync_tree_manifest(self):
+        target = join(self.tmpdir, 'target')
+        manifest = join(self.tmpdir, 'sync', 'manifest.json')
+        os.mkdir(target)
+        with open(join(target, 'other.js'), 'w') as fd:
+            fd.write('other')
+        self.assertEqual(sorted(sync_tree(
+            self.source, target, manifest=manifest)), [
+                'a.js', join('sub', 'b.js')])
+        with open(manifest) as fd:
+            self.assertEqual(['a.js', 'sub/b.js'], [
+                p.replace(os.sep, '/') for p in json.load(fd)])
+
+        # only the file previously synced is removed.
+        os.remove(join(self.source, 'sub', 'b.js'))
+        self.assertEqual(sync_tree(
+            self.source, target, manifest=manifest), [])
+        self.assertFalse(os.path.exists(join(target, 'sub', 'b.js')))
+        self.assertTrue(os.path.exists(join(target, 'other.js')))
+        with open(manifest) as fd:
+            self.assertEqual(['a.js'], json.load(fd))
+
+    def test_unlink_shared(self):
+        source = join(self.source, 'a.js')
+        self.assertFalse(unlink_shared(join(self.tmpdir, 'missing')))
+        self.assertFalse(unlink_shared(source))
+        target = join(self.tmpdir, 'a.js')
+        materialize_file(source, target, ['hardlink'])
+        self.assertTrue(unlink_shared(target))
+        self.assertFalse(os.path.exists(target))
+        # the source itself is no longer shared.
+        self.assertFalse(unlink_shared(source))
+        self.assertTrue(os.path.exists(source))
+
+    def test_sync_tree_symlink(self):
+        target = join(self.tmpdir, 'target')
+        sync_tree(self.source, target, ['symlink'])
+        self.assertTrue(os.path.samefile(
+            join(self.source, 'sub', 'b.js'), join(target, 'sub', 'b.js')))
+        self.assertEqual(sync_tree(self.source, target, ['symlink']), [])
+
+
 class WhichTestCase(unittest.TestCase):
     """
     Yeah, which?
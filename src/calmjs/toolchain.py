@@ -62,7 +62,9 @@ from __future__ import unicode_literals
 
 import codecs
 import errno
+import json
 import logging
+import posixpath
 import re
 import shutil
 import sys
@@ -70,9 +72,11 @@ import warnings
 from collections import namedtuple
 from functools import partial
 from inspect import currentframe
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 from traceback import format_stack
+from threading import Lock
 from os import mkdir
-from os import makedirs
 from os.path import basename
 from os.path import join
 from os.path import dirname
@@ -81,30 +85,56 @@ from os.path import isfile
 from os.path import isdir
 from os.path import normpath
 from os.path import realpath
+from os.path import relpath
+from os.path import sep
 from tempfile import mkdtemp
 
 from pkg_resources import Requirement
 from pkg_resources import working_set as default_working_set
 
+from calmjs.interrogate import extract_module_imports_path
+from calmjs.parse.exceptions import ECMASyntaxError
 from calmjs.parse.io import read
 from calmjs.parse.io import write
 from calmjs.parse.parsers.es5 import parse
 from calmjs.parse.unparsers.base import BaseUnparser
 from calmjs.parse.unparsers.es5 import pretty_printer
+from calmjs.parse.sourcemap import encode_mappings
 from calmjs.parse.sourcemap import encode_sourcemap
+from calmjs.parse.sourcemap import normrelpath
+from calmjs.parse.sourcemap import write as sourcemap_write
 
 from calmjs.base import BaseDriver
 from calmjs.base import BaseRegistry
 from calmjs.base import BaseLoaderPluginRegistry
 from calmjs.base import PackageKeyMapping
+from calmjs.buildfs import BuildFS
+from calmjs.buildfs import MemoryBuildFS
+from calmjs.cache import ASTCache
+from calmjs.cache import CompileCache
+from calmjs.cache import DigestCache
+from calmjs.cache import acquire_managed_build_dir
+from calmjs.cache import write_json_atomic
+from calmjs.cache import digest_values
+from calmjs.cache import file_digest
+from calmjs.dist import find_pkg_dist
 from calmjs.registry import get as get_registry
+from calmjs.resultstore import ResultStore
+from calmjs.resultstore import StoredMapping
 from calmjs.exc import AdviceAbort
 from calmjs.exc import AdviceCancel
 from calmjs.exc import ValueSkip
 from calmjs.exc import ToolchainAbort
 from calmjs.exc import ToolchainCancel
+from calmjs.utils import ensure_dir
+from calmjs.utils import materialize_file
 from calmjs.utils import raise_os_error
+from calmjs.utils import sync_tree
+from calmjs.utils import unlink_shared
 from calmjs.utils import pdb_set_trace
+from calmjs.taskgraph import TaskGraph
+from calmjs.trace import Tracer
+from calmjs.trace import trace_span
 from calmjs.vlqsm import SourceWriter
 
 logger = logging.getLogger(__name__)
@@ -114,6 +144,8 @@ __all__ = [
 
     'dict_setget', 'dict_setget_dict', 'dict_update_overwrite_check',
 
+    'default_advice_jobs',
+
     'spec_update_loaderplugin_registry',
     'spec_update_sourcepath_filter_loaderplugins',
 
@@ -129,17 +161,25 @@ __all__ = [
     'AFTER_ASSEMBLE', 'BEFORE_ASSEMBLE', 'AFTER_COMPILE', 'BEFORE_COMPILE',
     'AFTER_PREPARE', 'BEFORE_PREPARE', 'AFTER_TEST', 'BEFORE_TEST',
 
-    'ADVICE_PACKAGES', 'ARTIFACT_PATHS', 'BUILD_DIR',
+    'ADVICE_JOBS', 'ADVICE_PACKAGES', 'ARTIFACT_PATHS', 'AST_CACHE',
+    'BUILD_DIR',
+    'BUILD_FS', 'BUILD_FS_SPILL_LIMIT',
+    'BUILD_DIR_RETENTION', 'BUILD_DIR_ROOT', 'BUNDLE_MATERIALIZE',
     'CALMJS_MODULE_REGISTRY_NAMES',
+    'COMPILE_CACHE_DIR', 'COMPILE_JOBS', 'COMPILE_RESULT_STORE',
+    'COMPILE_TASK_JOBS',
     'CALMJS_LOADERPLUGIN_REGISTRY_NAME',
     'CALMJS_LOADERPLUGIN_REGISTRY',
     'CALMJS_TEST_REGISTRY_NAMES',
-    'CONFIG_JS_FILES', 'DEBUG',
-    'EXPORT_MODULE_NAMES', 'EXPORT_PACKAGE_NAMES',
+    'BUILD_PLAN', 'BUILD_PLAN_FILE',
+    'CHECKPOINT', 'CONFIG_JS_FILES', 'DEBUG', 'DIGEST_CACHE', 'DRY_RUN',
+    'ENTRY_MODULE_NAMES', 'EXPORT_MODULE_NAMES', 'EXPORT_PACKAGE_NAMES',
     'EXPORT_TARGET', 'EXPORT_TARGET_OVERWRITE',
+    'PRUNE_UNREACHABLE', 'RELEASE_SPEC_KEYS', 'RESUME_FROM',
+    'SOURCE_MAP_MODE', 'SOURCE_MAP_RECORDS',
     'SOURCE_MODULE_NAMES', 'SOURCE_PACKAGE_NAMES',
     'TEST_MODULE_NAMES', 'TEST_MODULE_PATHS_MAP', 'TEST_PACKAGE_NAMES',
-    'TOOLCHAIN_BIN_PATH',
+    'TOOLCHAIN_BIN_PATH', 'TRACE_FILE', 'TRACER',
     'WORKING_DIR',
 ]
 
@@ -168,6 +208,11 @@ BEFORE_PREPARE = 'before_prepare'
 
 # define these as reserved spec keys
 
+# the maximum number of workers to use for executing the advices that
+# have been added through Spec.advise_parallel; defaults to the number
+# of processors available, as reported by the default_advice_jobs
+# function.
+ADVICE_JOBS = 'advice_jobs'
 # packages that have extra _optional_ advices supplied that have to be
 # manually included.
 ADVICE_PACKAGES = 'advice_packages'
@@ -177,13 +222,59 @@ ADVICE_PACKAGES_APPLIED_REQUIREMENTS = 'advice_packages_applied_requirements'
 # listing of absolute locations on the file system where these bundled
 # artifact files are.
 ARTIFACT_PATHS = 'artifact_paths'
+# the ASTCache instance for sharing the parsed source files for the
+# duration of the build; one will be provided for each build if not
+# already specified.
+AST_CACHE = 'ast_cache'
 # build directory
 BUILD_DIR = 'build_dir'
+# the filesystem backend for the intermediate files written into the
+# build directory; either a BuildFS instance or 'memory' for one that
+# holds them in memory until the link step, and the size in bytes
+# beyond which the memory backend will write files directly to disk.
+BUILD_FS = 'build_fs'
+BUILD_FS_SPILL_LIMIT = 'build_fs_spill_limit'
+# the root directory for managed build directories, which are derived
+# from the inputs of the spec and are retained for reuse across runs if
+# no build directory was specified, and the number of these managed
+# build directories to be retained.
+BUILD_DIR_ROOT = 'build_dir_root'
+BUILD_DIR_RETENTION = 'build_dir_retention'
+# the strategies, in the order of preference, for materializing the
+# bundled sources into the build directory; may be any of 'hardlink',
+# 'reflink', 'symlink' or 'copy', where copy is the default and the
+# final fallback should the other strategies fail.
+BUNDLE_MATERIALIZE = 'bundle_materialize'
 # the key for overriding the advice registry to be use
 CALMJS_TOOLCHAIN_ADVICE_REGISTRY = 'calmjs_toolchain_advice_registry'
 # source registries that have been used
 CALMJS_MODULE_REGISTRY_NAMES = 'calmjs_module_registry_names'
 CALMJS_TEST_REGISTRY_NAMES = 'calmjs_test_registry_names'
+# the directory for the persistent cache of compiled outputs, and the
+# key for the resolved CompileCache instance based on that directory.
+COMPILE_CACHE_DIR = 'compile_cache_dir'
+COMPILE_CACHE = 'compile_cache'
+# the number of workers to use for processing the entries for each of
+# the compile entries; if unspecified or less than 2, entries will be
+# processed sequentially.
+COMPILE_JOBS = 'compile_jobs'
+# if 'sqlite' (or a calmjs.resultstore.ResultStore instance), the
+# modpaths and targetpaths produced by the compile entries will be
+# written to the store as they are produced and read back lazily, such
+# that they are not held in memory.  Unless a store instance was
+# provided, those values will be copied back into the spec as dicts at
+# cleanup, before the store is closed.
+COMPILE_RESULT_STORE = 'compile_result_store'
+# a mapping of advice names to lists of spec keys that will be removed
+# (and have their values released, if they support it) at that point
+# of the toolchain execution.
+RELEASE_SPEC_KEYS = 'release_spec_keys'
+# the number of workers to use for executing the task graph of the
+# compile step, such that the compile entries that are independent of
+# each other (i.e. the transpile, bundle and loaderplugin groups) may be
+# processed concurrently; if unspecified or less than 2, the tasks will
+# be executed sequentially.
+COMPILE_TASK_JOBS = 'compile_task_jobs'
 # loaderplugin registry related.
 CALMJS_LOADERPLUGIN_REGISTRY_NAME = 'calmjs_loaderplugin_registry_name'
 CALMJS_LOADERPLUGIN_REGISTRY = 'calmjs_loaderplugin_registry'
@@ -191,6 +282,28 @@ CALMJS_LOADERPLUGIN_REGISTRY = 'calmjs_loaderplugin_registry'
 CONFIG_JS_FILES = 'config_js_files'
 # for debug level
 DEBUG = 'debug'
+# the DigestCache instance for the digests of the source files, which
+# may be provided such that the digests are retained across builds.
+DIGEST_CACHE = 'digest_cache'
+# if true, only the prepare step and the naming of the compile entries
+# are done, producing the build plan without writing to the build
+# directory, and the key for the plan along with the file to write it
+# to.
+DRY_RUN = 'dry_run'
+BUILD_PLAN = 'build_plan'
+BUILD_PLAN_FILE = 'build_plan_file'
+# if true, the JSON serializable values of the spec will be written to
+# a checkpoint file inside the build directory after each of the steps
+# of the toolchain, such that a subsequent execution with the same
+# build directory may resume from the step named by RESUME_FROM.
+CHECKPOINT = 'checkpoint'
+RESUME_FROM = 'resume_from'
+# if true, the entries in the sourcepath maps that cannot be reached
+# through the imports of the entry module names (defaulting to the
+# export module names provided with the spec) will be removed after
+# the prepare step.
+PRUNE_UNREACHABLE = 'prune_unreachable'
+ENTRY_MODULE_NAMES = 'entry_module_names'
 # the module names that have been exported out
 EXPORT_MODULE_NAMES = 'export_module_names'
 # the package names that have been exported out; not currently supported
@@ -207,6 +320,14 @@ EXPORT_TARGET_OVERWRITE = 'export_target_overwrite'
 LOADERPLUGIN_SOURCEPATH_MAPS = 'loaderplugin_sourcepath_maps'
 # if true, generate source map
 GENERATE_SOURCE_MAP = 'generate_source_map'
+# the manner which the generated source maps are written; 'file' (the
+# default) for a map file for each target, 'inline' for embedding the
+# map into the target, or 'index' for a single index map file covering
+# all targets written after the compile step, and the key for the
+# records of the encoded mappings that are collected for the index map
+# by the compile tasks of the targets.
+SOURCE_MAP_MODE = 'source_map_mode'
+SOURCE_MAP_RECORDS = 'source_map_records'
 # source module names; currently not supported by any part of the
 # library, but reserved nonetheless
 SOURCE_MODULE_NAMES = 'source_module_names'
@@ -226,6 +347,11 @@ TEST_MODULE_PATHS_MAP = 'test_module_paths_map'
 TEST_PACKAGE_NAMES = 'test_package_names'
 # the binary that the toolchain encapsulates.
 TOOLCHAIN_BIN_PATH = 'toolchain_bin_path'
+# the path to write the timing trace of the toolchain execution to, in
+# the Chrome trace event format, and the key for the Tracer instance
+# that records the events.
+TRACE_FILE = 'trace_file'
+TRACER = 'tracer'
 # the working directory
 WORKING_DIR = 'working_dir'
 
@@ -235,13 +361,65 @@ def cls_to_name(cls):
 
 
 def _opener(*a):
+    if len(a) > 1 and 'w' in a[1]:
+        # the file may be a source materialized into the build directory
+        # through a link, where the original file must not be modified.
+        unlink_shared(a[0])
     return codecs.open(*a, encoding='utf-8')
 
 
+def _file_digest(spec, path):
+    # use the DigestCache provided by the spec, if any.
+    digest_cache = spec.get(DIGEST_CACHE)
+    if isinstance(digest_cache, DigestCache):
+        return digest_cache.digest(path)
+    return file_digest(path)
+
+
 def partial_open(*a):
     return partial(codecs.open, *a, encoding='utf-8')
 
 
+def _callable_name(f):
+    name = getattr(f, '__qualname__', None) or getattr(f, '__name__', None)
+    if name is None:
+        return repr(f)
+    return '%s:%s' % (getattr(f, '__module__', None), name)
+
+
+def _fingerprint_value(value):
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint_value(v) for v in value]
+    elif isinstance(value, dict):
+        return {str(k): _fingerprint_value(v) for k, v in value.items()}
+    elif value is not None:
+        return str(value)
+    return value
+
+
+def _package_version(name):
+    dist = find_pkg_dist(name)
+    return [str(name), dist.version if dist else None]
+
+
+class _CheckpointValue(str):
+    """
+    The serialized form of a value within a checkpoint snapshot.
+    """
+
+
+def default_advice_jobs():
+    """
+    Return the default number of workers for the handling of parallel
+    safe advices, which is the number of processors available.
+    """
+
+    try:
+        return cpu_count()
+    except NotImplementedError:
+        return 1
+
+
 def _check_key_exists(spec, keys):
     for key in keys:
         if key not in spec:
@@ -276,10 +454,12 @@ def dict_update_overwrite_check(base, fresh):
     identical values are omitted).
     """
 
+    # only the keys of fresh are checked, as base may be a very large
+    # or a lazily loaded mapping.
     result = [
         (key, base[key], fresh[key])
-        for key in set(base.keys()) & set(fresh.keys())
-        if base[key] != fresh[key]
+        for key in fresh.keys()
+        if key in base and base[key] != fresh[key]
     ]
     base.update(fresh)
     return result
@@ -513,6 +693,118 @@ def toolchain_spec_prepare_loaderplugins(
             )
 
 
+def _resolve_import(importer, name):
+    # resolve the relative module name (the final part of the loader
+    # plugin syntax, if used) with respect to the importing module.
+    prefix, sep, target = name.rpartition('!')
+    if not target.startswith('.'):
+        return name
+    return prefix + sep + posixpath.normpath(
+        posixpath.join(posixpath.dirname(importer), target))
+
+
+def toolchain_spec_prune_unreachable(
+        toolchain, spec, entry_module_names=None,
+        loaderplugin_sourcepath_map_key=LOADERPLUGIN_SOURCEPATH_MAPS):
+    """
+    Remove the entries from the sourcepath maps in the spec (including
+    the ones nested under loaderplugin_sourcepath_map_key) that cannot
+    be reached through the imports of the entry module names, which are
+    derived from the require and define calls as provided by
+    calmjs.interrogate.  Only the JavaScript sources (as determined by
+    the filename suffix of the toolchain) are interrogated for imports.
+
+    If entry_module_names are not provided, the values under the
+    ENTRY_MODULE_NAMES or EXPORT_MODULE_NAMES keys in the spec will be
+    used.  As those are typically not available before the compile
+    step, the module names of the sourcepath map for the transpile
+    compile entry (i.e. the sources provided by the source packages)
+    will be used otherwise, such that only the bundled modules and the
+    loader plugin resources may be pruned.  Returns the sorted list of
+    module names removed.
+    """
+
+    if entry_module_names is None:
+        entry_module_names = (
+            spec.get(ENTRY_MODULE_NAMES) or spec.get(EXPORT_MODULE_NAMES))
+        transpile_sourcepath = spec.get(
+            'transpile' + toolchain.sourcepath_suffix)
+        if not entry_module_names and isinstance(transpile_sourcepath, dict):
+            entry_module_names = sorted(transpile_sourcepath)
+            logger.info(
+                "no entry module names provided; using the %d module(s) to "
+                "be transpiled as the entry modules", len(entry_module_names)
+            )
+    if not entry_module_names:
+        logger.warning(
+            "no entry module names provided; not pruning unreachable modules")
+        return []
+
+    sourcepath_maps = [
+        value for key, value in spec.items()
+        if key.endswith(toolchain.sourcepath_suffix) and
+        isinstance(value, dict)
+    ]
+    sourcepath_maps.extend(
+        value for value in spec.get(
+            loaderplugin_sourcepath_map_key, {}).values()
+        if isinstance(value, dict)
+    )
+    sources = {}
+    for sourcepath_map in sourcepath_maps:
+        sources.update(sourcepath_map)
+
+    ast_cache = spec.get(AST_CACHE)
+    suffix = toolchain.filename_suffix
+    reachable = set()
+    pending = list(entry_module_names)
+    while pending:
+        modname = pending.pop()
+        if modname in reachable:
+            continue
+        if modname not in sources:
+            logger.debug(
+                "module '%s' is imported but not provided by the sourcepath "
+                "maps", modname
+            )
+            continue
+        reachable.add(modname)
+        source = sources[modname]
+        if not (isfile(source) and source.endswith(suffix)):
+            continue
+        try:
+            imports = list(extract_module_imports_path(source, ast_cache))
+        except ECMASyntaxError as e:
+            logger.warning(
+                "failed to interrogate the imports of '%s': %s", source, e)
+            continue
+        pending.extend(_resolve_import(modname, name) for name in imports)
+
+    removed = set(sources) - reachable
+    for sourcepath_map in sourcepath_maps:
+        for modname in removed.intersection(sourcepath_map):
+            del sourcepath_map[modname]
+    logger.info(
+        "pruned %d of %d module(s) unreachable from the entry modules",
+        len(removed), len(sources),
+    )
+    return sorted(removed)
+
+
+def spec_release_keys(spec, keys):
+    """
+    Remove the keys from the spec, releasing the values that provide a
+    release method.
+    """
+
+    for key in keys:
+        value = spec.pop(key, None)
+        release = getattr(value, 'release', None)
+        if callable(release):
+            release()
+        logger.debug("released spec key '%s'", key)
+
+
 def toolchain_spec_compile_entries(
         toolchain, spec, entries, process_name, overwrite_log=None):
     """
@@ -564,8 +856,13 @@ def process_compile_entries(
 
     # Contains a mapping of the module name to the compiled file's
     # relative path starting from the base build_dir.
-    all_modpaths = {}
-    all_targets = {}
+    store = spec.get(COMPILE_RESULT_STORE)
+    if isinstance(store, ResultStore):
+        all_modpaths = store.mapping()
+        all_targets = store.mapping()
+    else:
+        all_modpaths = {}
+        all_targets = {}
     # List of exported module names, should be equal to all keys of
     # the compiled and bundled sources.
     all_export_module_names = []
@@ -577,11 +874,42 @@ def process_compile_entries(
         else:
             base.update(fresh)
 
-    for entry in entries:
-        modpaths, targetpaths, export_module_names = processor(spec, entry)
-        update(all_modpaths, modpaths, modpath_logger)
-        update(all_targets, targetpaths, targetpath_logger)
-        all_export_module_names.extend(export_module_names)
+    tracer = spec.get(TRACER)
+    processor_name = getattr(processor, '__name__', None)
+
+    def process(entry):
+        with trace_span(
+                tracer, entry[0], 'compile',
+                processor=processor_name, source=entry[1]):
+            return processor(spec, entry)
+
+    jobs = spec.get(COMPILE_JOBS)
+    pool = None
+    if isinstance(jobs, int) and jobs > 1:
+        # the entries are fully generated first so that any naming
+        # related logging will happen in order from the calling thread.
+        entries = list(entries)
+        logger.debug(
+            "processing %d compile entries using %d workers",
+            len(entries), jobs,
+        )
+        pool = ThreadPool(jobs)
+        # imap will return the results in the same order as the entries
+        # provided, such that the merging done below will remain
+        # deterministic.
+        results = pool.imap(process, entries)
+    else:
+        results = (process(entry) for entry in entries)
+
+    try:
+        for modpaths, targetpaths, export_module_names in results:
+            update(all_modpaths, modpaths, modpath_logger)
+            update(all_targets, targetpaths, targetpath_logger)
+            all_export_module_names.extend(export_module_names)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
 
     return all_modpaths, all_targets, all_export_module_names
 
@@ -591,6 +919,10 @@ ToolchainSpecCompileEntry = namedtuple('ToolchainSpecCompileEntry', [
 ToolchainSpecCompileEntry.__new__.__defaults__ = (None, None)
 
 
+# the steps of the toolchain, in the order of execution.
+TOOLCHAIN_STEPS = ('prepare', 'compile', 'assemble', 'link', 'finalize')
+
+
 def debugger(spec, extras):
     if not spec.get(DEBUG):
         return
@@ -625,6 +957,7 @@ class Spec(dict):
         self._advices = {}
         self._frames = {}
         self._called = set()
+        self._parallel = set()
 
     def __process_deprecated_key(self, key):
         for patt, repl in self._deprecation_match_4_0:
@@ -673,6 +1006,66 @@ class Spec(dict):
 
         self.update({k: other[k] for k in selected})
 
+    def fingerprint(
+            self, toolchain=None, keys=None, sourcepath_suffix=None,
+            digest_files=True):
+        """
+        Produce a stable hex digest of the values under keys, such that
+        specs with identical fingerprints will produce the same build.
+
+        If keys are not provided, the advice packages, the module and
+        loaderplugin registry names, the export target, the source map
+        flag and the source package names will be used.  In either case,
+        all keys ending with the sourcepath_suffix (defaulting to the
+        one provided by the toolchain) will be included, with the digest
+        of the files they reference if digest_files is true.  The source
+        package names will be recorded with their versions, and the
+        toolchain will be identified by its classes along with the
+        versions of the packages that provided them.
+        """
+
+        # circular import.
+        from calmjs.artifact import trace_toolchain
+
+        if keys is None:
+            keys = [
+                ADVICE_PACKAGES,
+                CALMJS_LOADERPLUGIN_REGISTRY_NAME,
+                CALMJS_MODULE_REGISTRY_NAMES,
+                EXPORT_TARGET,
+                GENERATE_SOURCE_MAP,
+                SOURCE_PACKAGE_NAMES,
+            ]
+        keys = set(keys)
+        if sourcepath_suffix is None:
+            sourcepath_suffix = getattr(
+                toolchain, 'sourcepath_suffix', '_sourcepath')
+        sourcepath_keys = set(
+            key for key in self if key.endswith(sourcepath_suffix))
+
+        values = {}
+        for key in sorted(keys | sourcepath_keys):
+            value = self.get(key)
+            if key in sourcepath_keys and isinstance(value, dict):
+                value = {
+                    str(modname): [
+                        str(path),
+                        _file_digest(self, path)
+                        if digest_files and isfile(path) else None,
+                    ]
+                    for modname, path in value.items()
+                }
+            elif key == SOURCE_PACKAGE_NAMES and isinstance(
+                    value, (list, tuple)):
+                value = [_package_version(name) for name in value]
+            else:
+                value = _fingerprint_value(value)
+            values[key] = value
+
+        identity = (
+            trace_toolchain(toolchain) if toolchain is not None else None)
+        return digest_values(identity, values)
+
     def __advice_stack_frame_protection(self, frame):
         """
         Overriding of this is only permitted if and only if your name is
@@ -684,9 +1077,12 @@ class Spec(dict):
                 'currentframe() returned None; frame protection disabled')
             return
 
+        # advices executed by workers will not have handle in their
+        # stack, so the method that invokes each advice is also checked.
+        codes = (self.handle.__code__, self.__handle_advice.__code__)
         f_back = frame.f_back
         while f_back:
-            if f_back.f_code is self.handle.__code__:
+            if f_back.f_code in codes:
                 raise RuntimeError(
                     "indirect invocation of '%s' by 'handle' is forbidden" %
                     frame.f_code.co_name,
@@ -735,6 +1131,22 @@ class Spec(dict):
         self._advices[name] = self._advices.get(name, [])
         self._advices[name].append(advice)
 
+    def advise_parallel(self, name, f, *a, **kw):
+        """
+        Add an advice like the advise method, but also mark it as safe
+        to be executed concurrently with other advices that have been
+        marked as such.  When the group is handled, the consecutive
+        advices that have been marked will be executed together using a
+        pool of workers, limited by ADVICE_JOBS if specified or by the
+        number of processors available otherwise; advices that have not
+        been marked will be executed in order as before.
+        """
+
+        if name is None:
+            return
+        self.advise(name, f, *a, **kw)
+        self._parallel.add(id(self._advices[name][-1]))
+
     def handle(self, name):
         """
         Call all advices at the provided name.
@@ -792,6 +1204,7 @@ class Spec(dict):
             logger.debug(
                 "handling %d advices in group '%s' ", len(advices), name)
 
+        batch = []
         while advices:
             try:
                 # advice processing is done lifo (last in first out)
@@ -806,59 +1219,122 @@ class Spec(dict):
             except TypeError:
                 logger.info('Spec advice malformed: got %s', values)
             else:
-                try:
-                    try:
-                        advice(*a, **kw)
-                    except Exception as e:
-                        # get that back by the id.
-                        frame = self._frames.get(id(values))
-                        if frame:
-                            logger.info('Spec advice exception: %r', e)
-                            logger.info(
-                                'Traceback for original advice:\n%s', frame)
-                        # continue on for the normal exception
-                        raise
-                except AdviceCancel as e:
-                    logger.info(
-                        "advice %s in group '%s' signaled its cancellation "
-                        "during its execution: %s", advice, name, e
-                    )
-                    if self.get(DEBUG):
-                        logger.debug(
-                            'showing traceback for cancellation', exc_info=1,
-                        )
-                except AdviceAbort as e:
-                    # this is a signaled error with a planned abortion
-                    logger.warning(
-                        "advice %s in group '%s' encountered a known error "
-                        "during its execution: %s; continuing with toolchain "
-                        "execution", advice, name, e
-                    )
-                    if self.get(DEBUG):
-                        logger.warning(
-                            'showing traceback for error', exc_info=1,
-                        )
-                except ToolchainCancel:
-                    # this is the safe cancel
-                    raise
-                except ToolchainAbort as e:
-                    logger.critical(
-                        "an advice in group '%s' triggered an abort: %s",
-                        name, str(e)
-                    )
-                    raise
-                except KeyboardInterrupt:
-                    raise ToolchainCancel('interrupted')
-                except Exception as e:
-                    # a completely unplanned failure
-                    logger.critical(
-                        "advice %s in group '%s' terminated due to an "
-                        "unexpected exception: %s", advice, name, e
+                if id(values) in self._parallel:
+                    # collect the consecutive parallel safe advices such
+                    # that they may be executed together.
+                    batch.append(values)
+                    if advices and id(advices[-1]) in self._parallel:
+                        continue
+                    self.__handle_parallel(name, batch)
+                    batch = []
+                else:
+                    self.__handle_advice(name, values)
+
+    def __handle_parallel(self, name, batch):
+        jobs = self.get(ADVICE_JOBS) or default_advice_jobs()
+        if len(batch) < 2 or not (isinstance(jobs, int) and jobs > 1):
+            for values in batch:
+                self.__handle_advice(name, values)
+            return
+
+        # the index of the earliest advice that stopped the handling, as
+        # with sequential handling the advices that follow it will not
+        # be started.
+        stopped = [len(batch)]
+        lock = Lock()
+
+        def execute(item):
+            idx, values = item
+            with lock:
+                if idx > stopped[0]:
+                    logger.debug(
+                        "skipping advice %s in group '%s' as an earlier "
+                        "advice stopped the handling",
+                        _callable_name(values[0]), name,
                     )
-                    if self.get(DEBUG):
-                        logger.critical(
-                            'showing traceback for error', exc_info=1,
-                        )
+                    return None
+            try:
+                self.__handle_advice(name, values)
+            except (ToolchainCancel, ToolchainAbort) as e:
+                with lock:
+                    stopped[0] = min(stopped[0], idx)
+                return e
+
+        logger.debug(
+            "handling %d parallel safe advices in group '%s' using %d "
+            "workers", len(batch), name, min(jobs, len(batch)),
+        )
+        pool = ThreadPool(min(jobs, len(batch)))
+        try:
+            # the exception from the earliest advice in the order of
+            # handling takes precedence, as with sequential handling;
+            # the advices are dispatched one at a time such that the
+            # ones queued after it will be skipped.
+            for e in pool.map(execute, list(enumerate(batch)), 1):
+                if e is not None:
+                    raise e
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def __handle_advice(self, name, values):
+        advice, a, kw = values
+        try:
+            try:
+                with trace_span(
+                        self.get(TRACER), _callable_name(advice),
+                        'advice', group=name):
+                    advice(*a, **kw)
+            except Exception as e:
+                # get that back by the id.
+                frame = self._frames.get(id(values))
+                if frame:
+                    logger.info('Spec advice exception: %r', e)
+                    logger.info(
+                        'Traceback for original advice:\n%s', frame)
+                # continue on for the normal exception
+                raise
+        except AdviceCancel as e:
+            logger.info(
+                "advice %s in group '%s' signaled its cancellation "
+                "during its execution: %s", advice, name, e
+            )
+            if self.get(DEBUG):
+                logger.debug(
+                    'showing traceback for cancellation', exc_info=1,
+                )
+        except AdviceAbort as e:
+            # this is a signaled error with a planned abortion
+            logger.warning(
+                "advice %s in group '%s' encountered a known error "
+                "during its execution: %s; continuing with toolchain "
+                "execution", advice, name, e
+            )
+            if self.get(DEBUG):
+                logger.warning(
+                    'showing traceback for error', exc_info=1,
+                )
+        except ToolchainCancel:
+            # this is the safe cancel
+            raise
+        except ToolchainAbort as e:
+            logger.critical(
+                "an advice in group '%s' triggered an abort: %s",
+                name, str(e)
+            )
+            raise
+        except KeyboardInterrupt:
+            raise ToolchainCancel('interrupted')
+        except Exception as e:
+            # a completely unplanned failure
+            logger.critical(
+                "advice %s in group '%s' terminated due to an "
+                "unexpected exception: %s", advice, name, e
+            )
+            if self.get(DEBUG):
+                logger.critical(
+                    'showing traceback for error', exc_info=1,
+                )
 
 
 class AdviceRegistry(BaseRegistry):
@@ -1203,6 +1679,14 @@ class Toolchain(BaseDriver):
     # subclasses may assign an identifier or instance of a compatible
     # loaderplugin registry for use with the encapsulated framework.
     loaderplugin_registry = None
+    # the name of the index source map file inside the build directory.
+    source_map_index_name = 'index.js.map'
+    # the name of the checkpoint file inside the build directory.
+    checkpoint_filename = '.calmjs_checkpoint.json'
+    # the keys with values that cannot be serialized into a checkpoint,
+    # but will be derived again by derive_checkpoint_values on resume.
+    checkpoint_derived_keys = (
+        CALMJS_LOADERPLUGIN_REGISTRY, COMPILE_CACHE, BUILD_FS)
 
     def __init__(self, *a, **kw):
         """
@@ -1376,7 +1860,7 @@ class Toolchain(BaseDriver):
         self._validate_build_target(spec, bd_target)
         if not exists(dirname(bd_target)):
             logger.debug("creating dir '%s'", dirname(bd_target))
-            makedirs(dirname(bd_target))
+            ensure_dir(dirname(bd_target))
 
         return bd_target
 
@@ -1408,15 +1892,32 @@ class Toolchain(BaseDriver):
     def _transpile_modname_source_target(self, spec, modname, source, target):
         bd_target = self._generate_transpile_target(spec, target)
         logger.info('Transpiling %s to %s', source, bd_target)
-        reader = partial_open(source, 'r')
-        writer_main = partial_open(bd_target, 'w')
-        writer_map = (
-            partial_open(bd_target + '.map', 'w')
-            if spec.get(GENERATE_SOURCE_MAP) else
-            None
-        )
-        write(self.transpiler, [
-            read(self.parser, reader)], writer_main, writer_map)
+        opener = self.build_opener(spec)
+        reader = partial(opener, source, 'r')
+        ast_cache = spec.get(AST_CACHE)
+        tree = ast_cache.parse(
+            self.parser, source, opener=opener,
+        ) if isinstance(ast_cache, ASTCache) else read(self.parser, reader)
+        writer_main = partial(opener, bd_target, 'w')
+        mode = spec.get(SOURCE_MAP_MODE)
+        if not spec.get(GENERATE_SOURCE_MAP):
+            writer_map = None
+        elif mode == 'inline':
+            # the identical writer will have the map be embedded.
+            writer_map = writer_main
+        elif mode == 'index':
+            # only the mappings are recorded, encoded here as part of
+            # the compile task for the target, such that the index map
+            # only has to be assembled from them after compilation.
+            with writer_main() as stream:
+                mappings, sources, names = sourcemap_write(
+                    self.transpiler(tree), stream)
+            spec[SOURCE_MAP_RECORDS].append(
+                (target, encode_mappings(mappings), sources, names))
+            return
+        else:
+            writer_map = partial(opener, bd_target + '.map', 'w')
+        write(self.transpiler, [tree], writer_main, writer_map)
 
     def simple_transpile_modname_source_target(
             self, spec, modname, source, target):
@@ -1425,7 +1926,7 @@ class Toolchain(BaseDriver):
         on each target.
         """
 
-        opener = self.opener
+        opener = self.build_opener(spec)
         bd_target = self._generate_transpile_target(spec, target)
         logger.info('Transpiling %s to %s', source, bd_target)
         with opener(source, 'r') as reader, opener(bd_target, 'w') as _writer:
@@ -1433,7 +1934,7 @@ class Toolchain(BaseDriver):
             self.transpiler(spec, reader, writer)
             if writer.mappings and spec.get(GENERATE_SOURCE_MAP):
                 source_map_path = bd_target + '.map'
-                with open(source_map_path, 'w') as sm_fd:
+                with opener(source_map_path, 'w') as sm_fd:
                     self.dump(encode_sourcemap(
                         filename=bd_target,
                         mappings=writer.mappings,
@@ -1446,43 +1947,244 @@ class Toolchain(BaseDriver):
                 _writer.write(source_map_url)
                 _writer.write('\n')
 
+    def source_map_index_targets(self, spec):
+        """
+        Return the targets in the order that they are concatenated
+        together by the assemble or link step of this toolchain, for the
+        index source map to be written at the end of the compile step.
+        Returning None will skip the writing of the index source map.
+
+        As the link step is not implemented here, the default
+        implementation assumes that the targets are concatenated in the
+        order of EXPORT_MODULE_NAMES, followed by any other targets with
+        recorded mappings in the order they were compiled.  Subclasses
+        that link the targets in a different order must override this,
+        or generate the index through generate_source_map_index in their
+        link step.  In either case, the link step is responsible for
+        referencing the index source map from the linked artifact (e.g.
+        through a sourceMappingURL comment), as the targets themselves
+        will not reference it.
+        """
+
+        recorded = [record[0] for record in spec.get(SOURCE_MAP_RECORDS, [])]
+        targetpaths = {}
+        for key, value in spec.items():
+            if key.endswith(self.targetpath_suffix) and isinstance(
+                    value, (dict, StoredMapping)):
+                for modname, target in value.items():
+                    targetpaths.setdefault(modname, target)
+        targets = []
+        for modname in spec.get(EXPORT_MODULE_NAMES, []):
+            target = targetpaths.get(modname)
+            if target in recorded and target not in targets:
+                targets.append(target)
+        targets.extend(target for target in recorded if target not in targets)
+        return targets
+
+    def generate_source_map_index(
+            self, spec, targets, path=None, separator=''):
+        """
+        Generate the index source map from the mappings recorded for the
+        transpiled targets, with a section for each of the targets in
+        the order provided, which must reflect the order of which they
+        are concatenated together (joined by the separator).  The offset
+        of each section is derived from the contents of the targets in
+        the build directory.  The source paths will be relative to path,
+        which defaults to the location of the index source map inside
+        the build directory.
+        """
+
+        records = {
+            record[0]: record for record in spec.get(SOURCE_MAP_RECORDS, [])}
+        if path is None:
+            path = join(spec[BUILD_DIR], self.source_map_index_name)
+
+        opener = self.build_opener(spec)
+        sections = []
+        line = column = 0
+        for idx, target in enumerate(targets):
+            if target not in records:
+                logger.warning(
+                    "no source map recorded for target '%s'; skipping", target)
+            else:
+                _, mappings, sources, names = records[target]
+                sections.append({
+                    'offset': {'line': line, 'column': column},
+                    'map': {
+                        'version': 3,
+                        'sources': [
+                            '/'.join(normrelpath(path, src).split(sep))
+                            for src in sources
+                        ],
+                        'names': names,
+                        'mappings': mappings,
+                        'file': '/'.join(target.split(sep)),
+                    },
+                })
+            with opener(join(spec[BUILD_DIR], target), 'r') as fd:
+                text = fd.read()
+            if idx < len(targets) - 1:
+                text += separator
+            newlines = text.count('\n')
+            if newlines:
+                line += newlines
+                column = len(text) - text.rfind('\n') - 1
+            else:
+                column += len(text)
+        return {'version': 3, 'sections': sections}
+
+    def write_source_map_index(self, spec, targets):
+        """
+        Write out the index source map for the targets to the build
+        directory.
+        """
+
+        path = join(spec[BUILD_DIR], self.source_map_index_name)
+        index = self.generate_source_map_index(spec, targets, path=path)
+        with self.build_opener(spec)(path, 'w') as fd:
+            self.dump(index, fd)
+        logger.info(
+            "wrote index source map with %d section(s) to '%s'",
+            len(index['sections']), path,
+        )
+
+    def _transpiler_identity(self):
+        transpiler = self.transpiler
+        if isinstance(transpiler, BaseUnparser):
+            return cls_to_name(type(transpiler))
+        return '%s:%s' % (
+            getattr(transpiler, '__module__', None),
+            getattr(transpiler, '__name__', type(transpiler).__name__),
+        )
+
+    def generate_compile_cache_key(
+            self, spec, process_name, modname, source, target):
+        """
+        Generate the key for the compile cache for the output of the
+        named compile process on the provided entry.  The default
+        implementation is derived from the contents of the source file,
+        the names of the classes of this toolchain and its transpiler,
+        the entry itself and whether source maps are to be generated.
+        As the paths to the sources recorded by the source maps are
+        relative to the build directory, the path to the source relative
+        to the build directory will also be included if source maps are
+        to be generated.
+
+        Subclasses that generate outputs that depend on other values
+        should override this and include those values.
+        """
+
+        generate_source_map = bool(spec.get(GENERATE_SOURCE_MAP))
+        source_location = None
+        if generate_source_map:
+            try:
+                source_location = relpath(source, spec[BUILD_DIR])
+            except ValueError:
+                # not on the same drive.
+                source_location = source
+        return digest_values(
+            process_name,
+            cls_to_name(type(self)),
+            self._transpiler_identity(),
+            generate_source_map,
+            spec.get(SOURCE_MAP_MODE),
+            modname, source, target,
+            source_location,
+            _file_digest(spec, source),
+        )
+
     def compile_transpile_entry(self, spec, entry):
         """
         Handler for each entry for the transpile method of the compile
         process.  This invokes the transpiler that was set up to
         transpile the input files into the build directory.
+
+        If a compile cache is available for the spec, the outputs will
+        be restored from there if the source was transpiled previously.
         """
 
         modname, source, target, modpath = entry
         transpiled_modpath = {modname: modpath}
         transpiled_target = {modname: target}
         export_module_name = [modname]
-        self.transpile_modname_source_target(spec, modname, source, target)
+        cache = spec.get(COMPILE_CACHE)
+        if not isinstance(cache, CompileCache) or (
+                SOURCE_MAP_RECORDS in spec):
+            # the cache does not retain the records for the index map.
+            self.transpile_modname_source_target(spec, modname, source, target)
+            return transpiled_modpath, transpiled_target, export_module_name
+
+        key = self.generate_compile_cache_key(
+            spec, 'transpile', modname, source, target)
+        if cache.restore(key, spec[BUILD_DIR]):
+            logger.info('Reusing cached %s for %s', target, source)
+        else:
+            self.transpile_modname_source_target(spec, modname, source, target)
+            fs = spec.get(BUILD_FS)
+            if isinstance(fs, BuildFS):
+                # the cache can only record the outputs present on disk.
+                fs.flush([target, target + '.map'])
+            cache.store(key, spec[BUILD_DIR], [
+                path for path in (target, target + '.map')
+                if isfile(join(spec[BUILD_DIR], normpath(path)))
+            ])
         return transpiled_modpath, transpiled_target, export_module_name
 
     def compile_bundle_entry(self, spec, entry):
         """
         Handler for each entry for the bundle method of the compile
-        process.  This copies the source file or directory into the
-        build directory.
+        process.  This materializes the source file or directory into
+        the build directory, using the strategies specified by the
+        BUNDLE_MATERIALIZE key of the spec.
         """
 
         modname, source, target, modpath = entry
+        strategies = spec.get(BUNDLE_MATERIALIZE) or ('copy',)
         bundled_modpath = {modname: modpath}
         bundled_target = {modname: target}
         export_module_name = []
         if isfile(source):
             export_module_name.append(modname)
+            cache = spec.get(COMPILE_CACHE)
+            key = self.generate_compile_cache_key(
+                spec, 'bundle', modname, source, target,
+            ) if isinstance(cache, CompileCache) else None
+            if key and cache.restore(key, spec[BUILD_DIR]):
+                logger.debug("bundled target '%s' is up to date", target)
+                return bundled_modpath, bundled_target, export_module_name
             copy_target = join(spec[BUILD_DIR], target)
             if not exists(dirname(copy_target)):
-                makedirs(dirname(copy_target))
-            shutil.copy(source, copy_target)
+                ensure_dir(dirname(copy_target))
+            materialize_file(source, copy_target, strategies)
+            if key:
+                # only the record is needed as the source is the copy.
+                cache.store(key, spec[BUILD_DIR], [target], blobs=False)
         elif isdir(source):
             copy_target = join(spec[BUILD_DIR], modname)
-            shutil.copytree(source, copy_target)
+            # only the files that differ will be materialized, which
+            # avoids the repeated work for reused build directories.
+            sync_tree(source, copy_target, strategies, manifest=(
+                self.bundle_sync_manifest(spec, modname)))
 
         return bundled_modpath, bundled_target, export_module_name
 
+    def bundle_sync_manifest(self, spec, modname):
+        """
+        Return the path to the manifest of the files synced into the
+        build directory for the bundled directory of modname, such that
+        the files removed from the source directory will also be removed
+        from a reused managed build directory.  Returns None for build
+        directories that are not managed, where no files will be
+        removed as other entries may have written into the directory.
+        """
+
+        root = spec.get(BUILD_DIR_ROOT)
+        base = dirname(spec[BUILD_DIR])
+        if not root or dirname(base) != realpath(
+                join(spec.get(WORKING_DIR, ''), root)):
+            return None
+        return join(base, 'sync', digest_values(modname)[:32] + '.json')
+
     def compile_loaderplugin_entry(self, spec, entry):
         """
         Generic loader plugin entry handler.
@@ -1624,11 +2326,15 @@ class Toolchain(BaseDriver):
 
     # Generator methods
 
-    def _gen_modname_source_target_modpath(self, spec, d):
+    def _gen_modname_source_target_modpath(self, spec, d, skipped=None):
         """
         Private generator that will consume those above functions.  This
         should NOT be overridden.
 
+        If a list is provided for skipped, a 4-tuple of the name of the
+        naming method that failed, the exception, the modname and source
+        will be appended to it for each of the skipped entries.
+
         Produces the following 4-tuple on iteration with the input dict;
         the definition is written at the module level documention for
         calmjs.toolchain, but in brief:
@@ -1677,9 +2383,226 @@ class Toolchain(BaseDriver):
                     )
 
                 log(f_name, e, *modname_source)
+                if skipped is not None:
+                    skipped.append((f_name, e) + tuple(modname_source))
                 continue
             yield modname, source, target, modpath
 
+    def _iter_compile_entries(self):
+        # yield the process name, read key and store key for each of the
+        # compile entries.
+        for entry in self.compile_entries:
+            if isinstance(entry, ToolchainSpecCompileEntry):
+                yield entry.process_name, entry.read_key, entry.store_key
+                continue
+            m, read_key, store_key = entry
+            yield (
+                m if not callable(m) else _callable_name(m),
+                read_key, store_key,
+            )
+
+    def plan(self, spec):
+        """
+        Produce the build plan for the spec, which lists the modname,
+        source, target and modpath of every entry for each of the
+        compile entries, along with the entries that were skipped and
+        the reason.  The loaderplugin handler for the entries of the
+        loaderplugin process are also included.  This only invokes the
+        naming methods, such that no files will be read or written, so
+        it is typically used after the prepare step.
+        """
+
+        registry = spec.get(CALMJS_LOADERPLUGIN_REGISTRY)
+        entries = []
+        skipped = []
+        for process_name, read_key, store_key in self._iter_compile_entries():
+            sourcepath_dict = spec.get(read_key + self.sourcepath_suffix, {})
+            failures = []
+            for modname, source, target, modpath in (
+                    self._gen_modname_source_target_modpath(
+                        spec, sourcepath_dict, skipped=failures)):
+                entry = {
+                    'process': process_name,
+                    'store_key': store_key,
+                    'modname': modname,
+                    'source': source,
+                    'target': target,
+                    'modpath': modpath,
+                }
+                if process_name == 'loaderplugin':
+                    handler = registry.get(modname) if isinstance(
+                        registry, BaseLoaderPluginRegistry) else None
+                    entry['loaderplugin'] = (
+                        cls_to_name(type(handler)) if handler else None)
+                entries.append(entry)
+            for f_name, e, modname, source in failures:
+                skipped.append({
+                    'process': process_name,
+                    'modname': modname,
+                    'source': source,
+                    'method': f_name,
+                    'reason': str(e),
+                    'skip': isinstance(e, ValueSkip),
+                })
+
+        return {
+            'toolchain': cls_to_name(type(self)),
+            'entries': entries,
+            'skipped': skipped,
+        }
+
+    def setup_compile_cache(self, spec):
+        """
+        Resolve the compile cache for the spec, which may either be an
+        instance provided under COMPILE_CACHE, or one constructed from
+        the directory provided under COMPILE_CACHE_DIR.  Returns None if
+        neither are provided.
+        """
+
+        cache = spec.get(COMPILE_CACHE)
+        if isinstance(cache, CompileCache):
+            return cache
+        cache_dir = spec.get(COMPILE_CACHE_DIR)
+        if not cache_dir:
+            return None
+        logger.debug("using compile cache at '%s'", cache_dir)
+        spec[COMPILE_CACHE] = cache = CompileCache(
+            realpath(join(spec.get(WORKING_DIR, ''), cache_dir)))
+        return cache
+
+    def setup_ast_cache(self, spec):
+        """
+        Ensure that an ASTCache is available for the duration of the
+        build, such that the source files will not be parsed more than
+        once by the steps of the build.  One that is provided through
+        the spec will be used and retained as is.
+        """
+
+        if isinstance(spec.get(AST_CACHE), ASTCache):
+            return spec[AST_CACHE]
+        spec[AST_CACHE] = ast_cache = ASTCache()
+        spec.advise(CLEANUP, spec.pop, AST_CACHE, None)
+        return ast_cache
+
+    def setup_tracer(self, spec):
+        """
+        Set up the Tracer for recording the time taken by the steps,
+        advices and compile entries, if a TRACER or a TRACE_FILE was
+        specified.  The trace will be written to the TRACE_FILE during
+        the cleanup of the build.
+        """
+
+        tracer = spec.get(TRACER)
+        trace_file = spec.get(TRACE_FILE)
+        if not isinstance(tracer, Tracer):
+            if not trace_file:
+                return None
+            spec[TRACER] = tracer = Tracer()
+        if trace_file:
+            self.realpath(spec, TRACE_FILE)
+            spec.advise(CLEANUP, tracer.dump, spec[TRACE_FILE])
+        return tracer
+
+    def setup_compile_result_store(self, spec):
+        """
+        Set up the ResultStore for the compile results as specified by
+        the spec, returning it if one is available.  A store created
+        here will be closed at cleanup, after the stored values that
+        remain in the spec are copied back into it as dicts, such that
+        they remain available to the caller.
+        """
+
+        store = spec.get(COMPILE_RESULT_STORE)
+        if isinstance(store, ResultStore):
+            return store
+        if not store:
+            return None
+        if store != 'sqlite':
+            logger.warning(
+                "unsupported value for '%s': %r; compile results will be "
+                "held in memory", COMPILE_RESULT_STORE, store,
+            )
+            spec.pop(COMPILE_RESULT_STORE)
+            return None
+
+        spec[COMPILE_RESULT_STORE] = store = ResultStore()
+        logger.debug("compile results will be stored in %r", store)
+
+        def cleanup():
+            for key, value in list(spec.items()):
+                if isinstance(value, StoredMapping) and value.store is store:
+                    spec[key] = dict(value)
+            spec.pop(COMPILE_RESULT_STORE, None)
+            store.close()
+
+        spec.advise(CLEANUP, cleanup)
+        return store
+
+    def setup_build_fs(self, spec):
+        """
+        Resolve the filesystem backend for the build directory, which
+        may either be a BuildFS instance provided under BUILD_FS, or the
+        value 'memory' for a MemoryBuildFS limited by the value provided
+        under BUILD_FS_SPILL_LIMIT.  If a backend is used, the flushing
+        of its files to disk will be advised before the link step.
+        Returns None if no backend was specified.
+        """
+
+        fs = spec.get(BUILD_FS)
+        if fs is None:
+            return None
+        if fs == 'memory':
+            logger.debug("using in-memory build filesystem")
+            spec[BUILD_FS] = fs = MemoryBuildFS(
+                spec[BUILD_DIR], spill_limit=spec.get(BUILD_FS_SPILL_LIMIT))
+        elif not isinstance(fs, BuildFS):
+            logger.warning(
+                "spec provided an unsupported '%s' value of %r; ignoring",
+                BUILD_FS, fs,
+            )
+            return None
+        spec.advise(BEFORE_LINK, self.flush_build_fs, spec)
+        return fs
+
+    def build_opener(self, spec):
+        """
+        Return the opener for the files written into the build
+        directory, which is provided by the build filesystem backend of
+        the spec if one is available.
+        """
+
+        fs = spec.get(BUILD_FS)
+        if isinstance(fs, BuildFS):
+            return fs.open
+        return self.opener
+
+    def build_fs_flush_paths(self, spec):
+        """
+        Return the paths inside the build directory that must be written
+        to disk by the build filesystem backend before the link step, or
+        None for all of them.  As the link step is not implemented here,
+        the default is all of them, such that the memory backend merely
+        defers the writes; subclasses with a link step that will not
+        read all the intermediate files from disk should narrow this
+        down to only the ones that are needed, as only the files that
+        are never flushed avoid being written to disk.  Note that the
+        outputs stored into the compile cache are always flushed.
+        """
+
+        return None
+
+    def flush_build_fs(self, spec):
+        """
+        Write the files held by the build filesystem backend that are
+        required by the link step out to disk.
+        """
+
+        fs = spec.get(BUILD_FS)
+        if not isinstance(fs, BuildFS):
+            return
+        flushed = fs.flush(self.build_fs_flush_paths(spec))
+        logger.debug("flushed %d file(s) in build filesystem", len(flushed))
+
     # The core functions to be implemented for the toolchain.
 
     def prepare(self, spec):
@@ -1707,35 +2630,87 @@ class Toolchain(BaseDriver):
                 "(got %r instead)" % (EXPORT_MODULE_NAMES, export_module_names)
             )
 
-        def compile_entry(method, read_key, store_key):
-            spec_read_key = read_key + self.sourcepath_suffix
-            spec_modpath_key = store_key + self.modpath_suffix
-            spec_target_key = store_key + self.targetpath_suffix
+        cache = self.setup_compile_cache(spec)
+        self.setup_build_fs(spec)
+        index_source_map = (
+            spec.get(GENERATE_SOURCE_MAP) and
+            spec.get(SOURCE_MAP_MODE) == 'index'
+        )
+        if index_source_map:
+            spec[SOURCE_MAP_RECORDS] = []
+
+        graph = self.build_compile_task_graph(spec, export_module_names)
+        graph.run(spec.get(COMPILE_TASK_JOBS))
 
-            if _check_key_exists(spec, [spec_modpath_key, spec_target_key]):
-                logger.error(
-                    "aborting compile step %r due to existing key", entry,
+        if index_source_map:
+            targets = self.source_map_index_targets(spec)
+            if targets is None:
+                logger.warning(
+                    "the order of the targets is unknown; the index source "
+                    "map is left for the link step to generate"
                 )
-                return
+            else:
+                self.write_source_map_index(spec, targets)
 
-            sourcepath_dict = spec.get(spec_read_key, {})
-            entries = self._gen_modname_source_target_modpath(
-                spec, sourcepath_dict)
-            (spec[spec_modpath_key], spec[spec_target_key],
-                new_module_names) = method(spec, entries)
-            logger.debug(
-                "entry %r "
-                "wrote %d entries to spec[%r], "
-                "wrote %d entries to spec[%r], "
-                "added %d export_module_names",
-                entry,
-                len(spec[spec_modpath_key]), spec_modpath_key,
-                len(spec[spec_target_key]), spec_target_key,
-                len(new_module_names),
+        if cache:
+            cache.save()
+
+    def _compile_task(self, spec, entry, method, read_key, store_key):
+        spec_read_key = read_key + self.sourcepath_suffix
+        spec_modpath_key = store_key + self.modpath_suffix
+        spec_target_key = store_key + self.targetpath_suffix
+
+        if _check_key_exists(spec, [spec_modpath_key, spec_target_key]):
+            logger.error(
+                "aborting compile step %r due to existing key", entry,
             )
-            export_module_names.extend(new_module_names)
+            return []
 
-        for entry in self.compile_entries:
+        sourcepath_dict = spec.get(spec_read_key, {})
+        entries = self._gen_modname_source_target_modpath(
+            spec, sourcepath_dict)
+        (spec[spec_modpath_key], spec[spec_target_key],
+            new_module_names) = method(spec, entries)
+        logger.debug(
+            "entry %r "
+            "wrote %d entries to spec[%r], "
+            "wrote %d entries to spec[%r], "
+            "added %d export_module_names",
+            entry,
+            len(spec[spec_modpath_key]), spec_modpath_key,
+            len(spec[spec_target_key]), spec_target_key,
+            len(new_module_names),
+        )
+        return new_module_names
+
+    def build_compile_task_graph(self, spec, export_module_names):
+        """
+        Build the task graph for the compile step, with a task for each
+        of the compile entries named after their store key, prefixed
+        with 'entry:' such that they will not collide with other tasks.
+        Entries that share a store key with an earlier entry will require
+        that entry.  The final task, named 'compile', requires all the
+        entry tasks and extends export_module_names with the module names
+        they produced in the order of the compile entries.
+
+        Subclasses may add further tasks to the returned graph, such as
+        ones that make use of the results of specific entries before
+        the remaining entries have completed.
+        """
+
+        graph = TaskGraph(tracer=spec.get(TRACER))
+        store_tasks = {}
+        entry_tasks = []
+        collected = {}
+
+        def compile_task(name, *a):
+            collected[name] = self._compile_task(spec, *a)
+
+        def merge():
+            for name in entry_tasks:
+                export_module_names.extend(collected[name])
+
+        for idx, entry in enumerate(self.compile_entries):
             if isinstance(entry, ToolchainSpecCompileEntry):
                 log = partial(
                     logging.getLogger(entry.logger).log,
@@ -1745,26 +2720,39 @@ class Toolchain(BaseDriver):
                         "'%s' to '%s'; configuration may now be invalid"
                     ),
                 ) if entry.logger else None
-                compile_entry(partial(
+                method = partial(
                     toolchain_spec_compile_entries, self,
                     process_name=entry.process_name,
                     overwrite_log=log,
-                ), entry.read_key, entry.store_key)
-                continue
-
-            m, read_key, store_key = entry
-            if callable(m):
-                method = m
+                )
+                read_key, store_key = entry.read_key, entry.store_key
             else:
-                method = getattr(self, self.compile_prefix + m, None)
-                if not callable(method):
-                    logger.error(
-                        "'%s' not a callable attribute for %r from "
-                        "compile_entries entry %r; skipping", m, self, entry
-                    )
-                    continue
-
-            compile_entry(method, read_key, store_key)
+                m, read_key, store_key = entry
+                if callable(m):
+                    method = m
+                else:
+                    method = getattr(self, self.compile_prefix + m, None)
+                    if not callable(method):
+                        logger.error(
+                            "'%s' not a callable attribute for %r from "
+                            "compile_entries entry %r; skipping",
+                            m, self, entry
+                        )
+                        continue
+
+            name = 'entry:%s' % store_key
+            requires = ()
+            if store_key in store_tasks:
+                name = 'entry:%s:%d' % (store_key, idx)
+                requires = (store_tasks[store_key],)
+            store_tasks[store_key] = name
+            graph.add(name, partial(
+                compile_task, name, entry, method, read_key, store_key,
+            ), requires=requires)
+            entry_tasks.append(name)
+
+        graph.add('compile', merge, requires=entry_tasks)
+        return graph
 
     def assemble(self, spec):
         """
@@ -1811,6 +2799,184 @@ class Toolchain(BaseDriver):
         self.link(spec)
         self.finalize(spec)
 
+    def checkpoint_path(self, spec):
+        """
+        Return the path to the checkpoint file for the spec.
+        """
+
+        return join(spec[BUILD_DIR], self.checkpoint_filename)
+
+    def checkpoint_snapshot(self, spec):
+        """
+        Return a snapshot of the spec for the tracking of the keys that
+        were written by the steps of the toolchain, mapping each key to
+        the serialized form of its value, or to the value itself if it
+        cannot be serialized.  Mappings (such as those provided by the
+        compile result store) are serialized as dicts.
+        """
+
+        snapshot = {}
+        for key, value in spec.items():
+            if key in (CHECKPOINT, RESUME_FROM):
+                continue
+            if isinstance(value, StoredMapping):
+                value = dict(value)
+            try:
+                snapshot[key] = _CheckpointValue(json.dumps(
+                    value, sort_keys=True))
+            except (TypeError, ValueError):
+                snapshot[key] = value
+        return snapshot
+
+    def write_checkpoint(self, spec, step, fingerprint, initial=None):
+        """
+        Write the JSON serializable values of the spec, along with the
+        step that was completed and the fingerprint of the spec, to the
+        checkpoint file in the build directory.  The keys with values
+        that differ from the initial snapshot of the spec (as produced
+        by checkpoint_snapshot before the first step) will be recorded
+        as written, such that their values take precedence when resumed;
+        the keys listed in checkpoint_derived_keys are recorded such
+        that their values may be derived again.
+
+        If any of the written values cannot be serialized, the
+        checkpoint will not be written as the execution could not be
+        resumed from it; a warning will be logged and False returned.
+        """
+
+        if initial is None:
+            initial = {}
+        snapshot = self.checkpoint_snapshot(spec)
+        values = {}
+        written = []
+        derived = []
+        unserializable = []
+        for key, value in snapshot.items():
+            if isinstance(value, _CheckpointValue):
+                values[key] = json.loads(value)
+                if initial.get(key) != value:
+                    written.append(key)
+            elif key in self.checkpoint_derived_keys:
+                derived.append(key)
+            elif initial.get(key) is not value:
+                unserializable.append(key)
+
+        if unserializable:
+            logger.warning(
+                "unable to write checkpoint for step '%s' as the values "
+                "for the keys %s cannot be serialized",
+                step, sorted(unserializable),
+            )
+            return False
+
+        # the build directory must be complete on disk for the steps
+        # that follow to be resumed.
+        fs = spec.get(BUILD_FS)
+        if isinstance(fs, BuildFS):
+            fs.flush()
+        path = self.checkpoint_path(spec)
+        write_json_atomic(path, {
+            'step': step,
+            'fingerprint': fingerprint,
+            'spec': values,
+            'written': sorted(written),
+            'derived': sorted(derived),
+        })
+        logger.debug("wrote checkpoint for step '%s' to '%s'", step, path)
+        return True
+
+    def resume_checkpoint(self, spec, fingerprint):
+        """
+        Restore the values from the checkpoint file, such that the
+        execution may resume from the step named by RESUME_FROM.  The
+        values for the keys written by the completed steps take
+        precedence over the values in the spec, while the others only
+        fill in the keys that are not already present.  Stored compile
+        results are restored into the mappings of the compile result
+        store assigned to the spec.  Returns the steps that remain to
+        be executed.
+
+        A ToolchainAbort will be raised if the checkpoint is missing,
+        is for a different spec, or if the steps before the requested
+        step were not completed.
+        """
+
+        step = spec[RESUME_FROM]
+        if step not in TOOLCHAIN_STEPS:
+            raise ValueError(
+                "'%s' must be one of %s" % (RESUME_FROM, TOOLCHAIN_STEPS))
+        idx = TOOLCHAIN_STEPS.index(step)
+        if idx == 0:
+            return TOOLCHAIN_STEPS
+
+        path = self.checkpoint_path(spec)
+        try:
+            with open(path) as fd:
+                checkpoint = json.load(fd)
+        except (IOError, OSError, ValueError) as e:
+            raise ToolchainAbort(
+                "cannot resume from step '%s' as the checkpoint '%s' could "
+                "not be read: %s" % (step, path, e))
+
+        if checkpoint.get('fingerprint') != fingerprint:
+            raise ToolchainAbort(
+                "cannot resume from step '%s' as the checkpoint '%s' was "
+                "produced for a different spec or sources" % (step, path))
+        completed = checkpoint.get('step')
+        if (completed not in TOOLCHAIN_STEPS or
+                TOOLCHAIN_STEPS.index(completed) < idx - 1):
+            raise ToolchainAbort(
+                "cannot resume from step '%s' as the checkpoint '%s' only "
+                "completed the step '%s'" % (step, path, completed))
+
+        written = set(checkpoint.get('written', ()))
+        for key, value in checkpoint.get('spec', {}).items():
+            current = spec.get(key)
+            if isinstance(current, StoredMapping) and isinstance(
+                    value, dict):
+                current.clear()
+                current.update(value)
+            elif key in written or key not in spec:
+                spec[key] = value
+        self.derive_checkpoint_values(spec, checkpoint.get('derived', ()))
+        logger.info(
+            "resuming from step '%s' using checkpoint '%s'", step, path)
+        return TOOLCHAIN_STEPS[idx:]
+
+    def derive_checkpoint_values(self, spec, keys):
+        """
+        Derive the values for the keys listed in checkpoint_derived_keys
+        that were present in the spec when the checkpoint was written.
+        As the compile cache and the build filesystem are set up by the
+        compile step, they are set up again here from the values that
+        were originally provided by the spec.
+        """
+
+        if CALMJS_LOADERPLUGIN_REGISTRY in keys:
+            spec_update_loaderplugin_registry(
+                spec, default=self.loaderplugin_registry)
+        if COMPILE_CACHE in keys:
+            self.setup_compile_cache(spec)
+        if BUILD_FS in keys:
+            self.setup_build_fs(spec)
+
+    def write_plan(self, spec):
+        """
+        Produce the build plan for the spec into BUILD_PLAN, and write
+        it out to BUILD_PLAN_FILE if specified.
+        """
+
+        spec[BUILD_PLAN] = plan = self.plan(spec)
+        if spec.get(BUILD_PLAN_FILE):
+            self.realpath(spec, BUILD_PLAN_FILE)
+            with open(spec[BUILD_PLAN_FILE], 'w') as fd:
+                self.dump(plan, fd)
+            logger.info(
+                "wrote build plan with %d entries to '%s'",
+                len(plan['entries']), spec[BUILD_PLAN_FILE],
+            )
+        return plan
+
     def setup_apply_advice_packages(
             self, spec, default_advice_registry=CALMJS_TOOLCHAIN_ADVICE):
         """
@@ -1834,6 +3000,44 @@ class Toolchain(BaseDriver):
         )
         advice_registry.apply_toolchain_spec(self, spec)
 
+    def build_dir_fingerprint(self, spec):
+        """
+        Produce the fingerprint that identifies the managed build
+        directory for the spec, derived from the toolchain and the
+        values that determine what will be written to the build
+        directory, through Spec.fingerprint.
+        """
+
+        # as the build directory is retained to be reused by subsequent
+        # builds, the contents of the source files must not be included.
+        return spec.fingerprint(self, digest_files=False)[:32]
+
+    def setup_managed_build_dir(self, spec):
+        """
+        Assign a managed build directory to the spec, located inside the
+        directory specified by BUILD_DIR_ROOT.  The directory is locked
+        for the duration of the run and will be retained afterwards,
+        such that subsequent runs with the same inputs may reuse the
+        contents.  Returns the build directory if one was assigned.
+        """
+
+        root = realpath(join(spec.get(WORKING_DIR, ''), spec[BUILD_DIR_ROOT]))
+        result = acquire_managed_build_dir(
+            root, self.build_dir_fingerprint(spec),
+            retention=spec.get(BUILD_DIR_RETENTION),
+        )
+        if result is None:
+            logger.warning(
+                "falling back to a temporary build directory as a managed "
+                "build directory could not be acquired inside '%s'", root
+            )
+            return None
+        build_dir, lock = result
+        logger.info("using managed build directory '%s'", build_dir)
+        spec.advise(CLEANUP, lock.release)
+        spec[BUILD_DIR] = build_dir
+        return build_dir
+
     def calf(self, spec):
         """
         Typical safe usage is this, which sets everything that could be
@@ -1851,40 +3055,87 @@ class Toolchain(BaseDriver):
         # BEFORE_SETUP and have the following ensure step be part of the
         # default setup.
 
-        # ensure build directory is defined and sane.
-        if not spec.get(BUILD_DIR):
-            tempdir = realpath(mkdtemp())
-            spec.advise(CLEANUP, shutil.rmtree, tempdir)
-            build_dir = join(tempdir, 'build')
-            mkdir(build_dir)
-            spec[BUILD_DIR] = build_dir
-        else:
-            build_dir = self.realpath(spec, BUILD_DIR)
-            if not isdir(build_dir):
-                logger.error("build_dir '%s' is not a directory", build_dir)
-                raise_os_error(errno.ENOTDIR, build_dir)
-
-        # ensure export target is sane
-        self.realpath(spec, EXPORT_TARGET)
+        # everything from the acquisition of the build directory onwards
+        # is protected such that the CLEANUP advices (e.g. the release
+        # of the lock of a managed build directory) are always handled.
+        try:
+            # a dry run only plans the build, which must not create or
+            # lock any build directories.
+            dry_run = spec.get(DRY_RUN)
+
+            # ensure build directory is defined and sane.
+            if dry_run and not spec.get(BUILD_DIR):
+                logger.debug("no build directory is created for a dry run")
+            elif not spec.get(BUILD_DIR) and spec.get(BUILD_DIR_ROOT):
+                self.setup_managed_build_dir(spec)
+
+            if not spec.get(BUILD_DIR) and not dry_run:
+                tempdir = realpath(mkdtemp())
+                spec.advise(CLEANUP, shutil.rmtree, tempdir)
+                build_dir = join(tempdir, 'build')
+                mkdir(build_dir)
+                spec[BUILD_DIR] = build_dir
+            elif spec.get(BUILD_DIR):
+                build_dir = self.realpath(spec, BUILD_DIR)
+                if not isdir(build_dir):
+                    logger.error(
+                        "build_dir '%s' is not a directory", build_dir)
+                    raise_os_error(errno.ENOTDIR, build_dir)
+
+            # ensure export target is sane
+            self.realpath(spec, EXPORT_TARGET)
+
+            self.setup_ast_cache(spec)
+            self.setup_tracer(spec)
+            if not dry_run:
+                self.setup_compile_result_store(spec)
+
+            # derived before anything is done such that the same value
+            # will be produced for the execution that resumes from a
+            # checkpoint.
+            fingerprint = spec.fingerprint(self) if not dry_run and (
+                spec.get(CHECKPOINT) or spec.get(RESUME_FROM)) else None
+
+            for name, keys in (spec.get(RELEASE_SPEC_KEYS) or {}).items():
+                spec.advise(name, spec_release_keys, spec, keys)
+
+            if spec.get(PRUNE_UNREACHABLE):
+                spec.advise(
+                    AFTER_PREPARE, toolchain_spec_prune_unreachable,
+                    self, spec,
+                )
 
-        # ensure advices specific to packages are applied, and applied
-        # using the advice to maintain the feature as it was when
-        # initially implemented as part of the runtime.  This also allow
-        # advice setup exceptions be handled as expected.
-        spec.advise(SETUP, self.setup_apply_advice_packages, spec)
+            # ensure advices specific to packages are applied, and
+            # applied using the advice to maintain the feature as it was
+            # when initially implemented as part of the runtime.  This
+            # also allow advice setup exceptions be handled as expected.
+            spec.advise(SETUP, self.setup_apply_advice_packages, spec)
 
-        try:
             # Finally, handle setup which may set up the deferred
             # advices, as all the toolchain (and its runtime and/or its
             # parent runtime and related toolchains) spec advises should
             # have been done.
-            spec.handle(SETUP)
-
-            process = ('prepare', 'compile', 'assemble', 'link', 'finalize')
+            tracer = spec.get(TRACER)
+            with trace_span(tracer, SETUP, 'phase'):
+                spec.handle(SETUP)
+
+            # the snapshot of the spec before any step, for tracking the
+            # keys written by the steps for the checkpoints.
+            initial = self.checkpoint_snapshot(spec) if fingerprint else None
+            process = TOOLCHAIN_STEPS
+            if dry_run:
+                process = ('prepare',)
+            elif spec.get(RESUME_FROM):
+                process = self.resume_checkpoint(spec, fingerprint)
             for p in process:
-                spec.handle('before_' + p)
-                getattr(self, p)(spec)
-                spec.handle('after_' + p)
+                with trace_span(tracer, p, 'phase'):
+                    spec.handle('before_' + p)
+                    getattr(self, p)(spec)
+                    spec.handle('after_' + p)
+                if fingerprint:
+                    self.write_checkpoint(spec, p, fingerprint, initial)
+            if dry_run:
+                self.write_plan(spec)
             spec.handle(SUCCESS)
         except ToolchainCancel:
             if spec.get(DEBUG):
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Timing instrumentation for the calmjs framework.
+
+The events recorded by the tracer may be written out in the trace event
+format as understood by the Chrome tracing tools (chrome://tracing) or
+compatible viewers, such that the time spent by the steps of toolchain
+execution, the advices and the compile entries may be inspected.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+_wall_clock = getattr(time, 'perf_counter', time.time)
+_cpu_clock = (
+    getattr(time, 'thread_time', None) or
+    getattr(time, 'process_time', None) or
+    time.clock
+)
+
+
+def _us(seconds):
+    return int(round(seconds * 1000000))
+
+
+class Tracer(object):
+    """
+    Records the spans of time taken for the named units of work, for
+    both the wall clock and the CPU time of the executing thread.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.origin = _wall_clock()
+        self.events = []
+        self._lock = Lock()
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """
+        Record the time taken for the execution of the context.
+        """
+
+        wall_start = _wall_clock()
+        cpu_start = _cpu_clock()
+        try:
+            yield
+        finally:
+            cpu_end = _cpu_clock()
+            wall_end = _wall_clock()
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'pid': self.pid,
+                'tid': threading.current_thread().ident,
+                'ts': _us(wall_start - self.origin),
+                'dur': _us(wall_end - wall_start),
+                'tts': _us(cpu_start),
+                'tdur': _us(cpu_end - cpu_start),
+            }
+            if args:
+                event['args'] = args
+            with self._lock:
+                self.events.append(event)
+
+    def to_dict(self):
+        with self._lock:
+            events = list(self.events)
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+        }
+
+    def dump(self, path):
+        """
+        Write the recorded events to path as a trace event JSON file.
+        """
+
+        with open(path, 'w') as fd:
+            json.dump(self.to_dict(), fd)
+        logger.info("wrote %d trace event(s) to '%s'", len(self.events), path)
+
+
+@contextmanager
+def _null_span():
+    yield
+
+
+def trace_span(tracer, name, category, **args):
+    """
+    Return the span context from the tracer, or one that does nothing
+    if tracer is not a Tracer, such that the callers may be instrumented
+    unconditionally.
+    """
+
+    if isinstance(tracer, Tracer):
+        return tracer.span(name, category, **args)
+    return _null_span()
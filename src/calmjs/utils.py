@@ -5,14 +5,18 @@ Assortment of utility functions.
 
 from __future__ import absolute_import
 
+import errno
 import logging
 import os
 import re
+import shutil
+import stat
 import sys
 from contextlib import contextmanager
 from functools import partial
 from json import dump
 from json import dumps
+from json import load
 from locale import getpreferredencoding
 from os import strerror
 from os.path import curdir
@@ -24,7 +28,16 @@ from pdb import Pdb
 from subprocess import Popen
 from subprocess import PIPE
 
+try:  # pragma: no cover
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
 locale = getpreferredencoding()
+logger = logging.getLogger(__name__)
+
+# the ioctl request code for FICLONE under Linux.
+_FICLONE = 0x40049409
 
 # sys.platform have required keys for environment variables for Popen
 _PLATFORM_ENV_KEYS = {
@@ -173,9 +186,239 @@ def which(cmd, mode=os.F_OK | os.X_OK, path=None):
     return None
 
 
+def ensure_dir(path):
+    """
+    Create the directory at path along with any missing parents, without
+    failing if it already exists, such as when it was created by another
+    process or thread between the check and the creation.
+    """
+
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
 def pdb_post_mortem(*a, **kw):
     post_mortem(*a, **kw)
 
 
 def pdb_set_trace(*a, **kw):
     Pdb(skip=[__name__], *a, **kw).set_trace()
+
+
+def _materialize_copy(source, target):
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    if copy_file_range is None:
+        shutil.copyfile(source, target)
+    else:
+        # allows the filesystem to share the underlying data or do the
+        # copy without it passing through userspace where supported.
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            remaining = os.fstat(src.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = copy_file_range(
+                        src.fileno(), dst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+            except OSError:
+                remaining = -1
+        if remaining:
+            shutil.copyfile(source, target)
+    shutil.copystat(source, target)
+
+
+def _materialize_hardlink(source, target):
+    os.link(source, target)
+
+
+def _materialize_symlink(source, target):
+    os.symlink(os.path.abspath(source), target)
+
+
+def _materialize_reflink(source, target):
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, 'reflink not supported')
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except (IOError, OSError):
+            dst.close()
+            os.remove(target)
+            raise
+    shutil.copystat(source, target)
+
+
+materialize_strategies = {
+    'copy': _materialize_copy,
+    'hardlink': _materialize_hardlink,
+    'reflink': _materialize_reflink,
+    'symlink': _materialize_symlink,
+}
+
+
+def unlink_shared(path):
+    """
+    Remove the file at path if it is a symlink, or a hardlink with the
+    contents shared with other paths, such that the file it is linked to
+    will not be modified by a subsequent write to path.  Returns True if
+    the file was removed.
+    """
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not (stat.S_ISLNK(st.st_mode) or (
+            stat.S_ISREG(st.st_mode) and st.st_nlink > 1)):
+        return False
+    os.remove(path)
+    return True
+
+
+def materialize_file(source, target, strategies=('copy',)):
+    """
+    Materialize the file at source at the target location using the
+    first of the named strategies that succeed, falling back to a copy
+    should all of them fail.  Any existing file at target is replaced.
+
+    The available strategies are 'hardlink', 'reflink' (only available
+    for filesystems that support them under Linux), 'symlink' and
+    'copy'.  Returns the name of the strategy that was used.
+
+    Note that the 'hardlink' and 'symlink' strategies produce a target
+    that shares its contents with the source, such that any write done
+    to the target in place will modify the source (which may be a file
+    of an installed package).  Anything that write to these targets
+    must first remove them, e.g. through unlink_shared, hence 'copy' is
+    the default.
+    """
+
+    if not isinstance(strategies, (list, tuple)):
+        strategies = (strategies,)
+
+    if os.path.lexists(target):
+        os.remove(target)
+
+    for name in strategies:
+        f = materialize_strategies.get(name)
+        if f is None:
+            logger.warning("unknown materialize strategy '%s'", name)
+            continue
+        try:
+            f(source, target)
+        except (IOError, OSError) as e:
+            logger.debug(
+                "materialize strategy '%s' failed for '%s': %s",
+                name, target, e,
+            )
+            continue
+        return name
+
+    _materialize_copy(source, target)
+    return 'copy'
+
+
+def _is_materialized(source, target):
+    try:
+        if os.path.samefile(source, target):
+            return True
+        src = os.stat(source)
+        dst = os.stat(target)
+    except OSError:
+        return False
+    return (
+        not os.path.islink(target) and
+        src.st_size == dst.st_size and src.st_mtime == dst.st_mtime
+    )
+
+
+def sync_tree(source, target, strategies=('copy',), manifest=None):
+    """
+    Incrementally synchronize the directory tree at source to target,
+    where only the files that are missing or differ by size or
+    modification time (or are not linked to the source for the link
+    based strategies) are materialized using materialize_file with the
+    provided strategies.
+
+    As other files may be written into target by other means, files in
+    target that are not present in source are left untouched, unless
+    they were materialized by a previous sync as recorded by manifest,
+    the path to a JSON file that records the files materialized by this
+    function, which will be updated.
+
+    Returns a list of the relative paths of the files materialized.
+    """
+
+    previous = set()
+    if manifest:
+        try:
+            with open(manifest) as fd:
+                previous = set(
+                    os.path.normpath(path) for path in load(fd))
+        except (IOError, OSError, ValueError, TypeError):
+            pass
+
+    synced = set()
+    materialized = []
+    for root, dirnames, filenames in os.walk(source):
+        rel = os.path.relpath(root, source)
+        target_root = os.path.normpath(os.path.join(target, rel))
+        if not os.path.isdir(target_root):
+            if os.path.normpath(rel) in previous:
+                os.remove(target_root)
+            os.makedirs(target_root)
+
+        for filename in filenames:
+            path = os.path.normpath(os.path.join(rel, filename))
+            src = os.path.join(root, filename)
+            dst = os.path.join(target_root, filename)
+            synced.add(path)
+            if _is_materialized(src, dst):
+                continue
+            materialize_file(src, dst, strategies)
+            materialized.append(path)
+
+    for path in sorted(previous - synced):
+        stale = os.path.join(target, path)
+        if os.path.isfile(stale) or os.path.islink(stale):
+            logger.debug("removing previously synced file '%s'", stale)
+            os.remove(stale)
+
+    if manifest:
+        ensure_dir(os.path.dirname(manifest))
+        with open(manifest, 'w') as fd:
+            dump(sorted(synced), fd)
+    return materialized
+
+
+def stat_snapshot(paths, dirs=()):
+    """
+    Return a mapping of every file at or beneath the provided paths to
+    their size and modification time, for the detection of changes.
+    The directories provided through dirs are included without their
+    contents, such that the addition or removal of files within them
+    may be detected.  Paths that do not exist are omitted.
+    """
+
+    def record(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        result[path] = (st.st_size, st.st_mtime)
+
+    result = {}
+    for path in dirs:
+        record(path)
+    for path in paths:
+        if not os.path.isdir(path):
+            record(path)
+            continue
+        for root, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                record(os.path.join(root, filename))
+    return result